@@ -0,0 +1,189 @@
+"""
+Cache of loaded chunks, so loading the same datasets onto the same grid again doesn't read and warp them again.
+
+Chunks are kept in memory up to ``OPTIONS['chunk_cache_bytes']``, and the least recently used are dropped
+first. With ``OPTIONS['chunk_cache_dir']`` set, chunks dropped from memory are spilled to files there instead,
+up to ``OPTIONS['chunk_cache_disk_bytes']``, and read back on the next miss in memory.
+
+A chunk is keyed by a hash of the ids and locations of its datasets, in the order they are fused, the grid
+(CRS, affine and shape), the measurement definition and the fuser, so it is only found again when loading it
+would give the same pixels.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import io
+import json
+import os
+import threading
+
+import cachetools
+import numpy
+
+from ..compat import string_types
+from ..config import OPTIONS
+from ..storage.block_cache import write_atomically, evict_least_recently_used
+
+
+def _fuser_name(fuse_func):
+    """
+    Stable name of a fuser, or None if it has none, like a lambda
+
+    >>> _fuser_name(None), _fuser_name('max'), _fuser_name(_fuser_name)
+    ('first', 'max', 'datacube.api.chunk_cache._fuser_name')
+    >>> _fuser_name(lambda dest, src: None) is None
+    True
+    """
+    if fuse_func is None:
+        return 'first'
+    if isinstance(fuse_func, string_types):
+        return fuse_func
+    name = getattr(fuse_func, '__qualname__', getattr(fuse_func, '__name__', None))
+    if name is None or '<' in name:
+        return None
+    return '%s.%s' % (fuse_func.__module__, name)
+
+
+class _SpillingLRUCache(cachetools.LRUCache):
+    """LRU cache of arrays by size, which hands the items it evicts to `spill`"""
+    def __init__(self, maxsize, spill):
+        super(_SpillingLRUCache, self).__init__(maxsize=maxsize, getsizeof=lambda array: array.nbytes)
+        self._spill = spill
+
+    def popitem(self):
+        key, value = super(_SpillingLRUCache, self).popitem()
+        self._spill(key, value)
+        return key, value
+
+
+class ChunkCache(object):
+    """
+    Two level cache of arrays: in memory, and optionally spilled to disk
+
+    :param int max_bytes: Memory for the cache
+    :param str directory: Where to spill chunks evicted from memory, or None to drop them
+    :param int disk_bytes: Disk space for the spilled chunks
+    """
+    def __init__(self, max_bytes, directory=None, disk_bytes=0):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_bytes = disk_bytes
+        self._lock = threading.Lock()
+        self._spilled = []
+        self._memory = _SpillingLRUCache(max_bytes, lambda key, array: self._spilled.append((key, array)))
+        self._written = 0
+
+    def get(self, key):
+        """The cached chunk, not to be modified, or None"""
+        with self._lock:
+            array = self._memory.get(key)
+        if array is None and self.directory:
+            array = self._load(key)
+            if array is not None:
+                array.setflags(write=False)
+                self._remember(key, array)
+        return array
+
+    def put(self, key, array):
+        """Cache a copy of `array`"""
+        array = numpy.array(array)
+        array.setflags(write=False)
+        self._remember(key, array)
+
+    def _remember(self, key, array):
+        with self._lock:
+            if array.nbytes <= self.max_bytes:
+                self._memory[key] = array
+            else:
+                self._spilled.append((key, array))
+            spilled, self._spilled = self._spilled, []
+        for spilled_key, spilled_array in spilled:
+            self._spill(spilled_key, spilled_array)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.npy')
+
+    def _load(self, key):
+        path = self._path(key)
+        try:
+            array = numpy.load(path)
+            # reading counts as use, for evicting the least recently used chunks
+            os.utime(path, None)
+        except (IOError, OSError):
+            # not cached, or just evicted by another process
+            return None
+        return array
+
+    def _spill(self, key, array):
+        if not self.directory or array.nbytes > self.disk_bytes:
+            return
+        buf = io.BytesIO()
+        numpy.save(buf, array)
+        write_atomically(self._path(key), buf.getvalue())
+        with self._lock:
+            self._written += array.nbytes
+            evict = self._written > self.disk_bytes // 16
+            if evict:
+                self._written = 0
+        if evict:
+            evict_least_recently_used(self.directory, self.disk_bytes)
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def _current_cache():
+    """The cache for the current options, or None when caching is off"""
+    global _CACHE  # pylint: disable=global-statement
+    settings = (OPTIONS.get('chunk_cache_bytes', 0), OPTIONS.get('chunk_cache_dir'),
+                OPTIONS.get('chunk_cache_disk_bytes', 0))
+    if not settings[0] and not (settings[1] and settings[2]):
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None or (_CACHE.max_bytes, _CACHE.directory, _CACHE.disk_bytes) != settings:
+            _CACHE = ChunkCache(*settings)
+        return _CACHE
+
+
+def chunk_key(datasets, geobox, measurement, fuse_func=None):
+    """
+    Key of the chunk of `measurement` loaded from `datasets` onto `geobox`
+
+    :return: the key, or None when caching is off or the chunk can't be cached, eg. when fusing with a lambda
+    """
+    if _current_cache() is None:
+        return None
+    fuser = _fuser_name(fuse_func)
+    if fuser is None:
+        return None
+
+    digest = hashlib.sha1()
+    for dataset in datasets:
+        digest.update(('%s %s\n' % (dataset.id, dataset.local_uri)).encode('utf-8'))
+    digest.update(repr((geobox.crs.crs_str, tuple(geobox.affine)[:6], tuple(geobox.shape), fuser)).encode('utf-8'))
+    digest.update(json.dumps(measurement, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_chunk(key, dest):
+    """
+    Copy the cached chunk of `key` into `dest`
+
+    :return: whether it was cached
+    """
+    cache = _current_cache()
+    if key is None or cache is None:
+        return False
+    array = cache.get(key)
+    if array is None:
+        return False
+    numpy.copyto(dest, array)
+    return True
+
+
+def save_chunk(key, data):
+    """Cache a copy of the loaded chunk `data` as `key`"""
+    cache = _current_cache()
+    if key is not None and cache is not None:
+        cache.put(key, data)
@@ -1,6 +1,7 @@
 from __future__ import absolute_import, division, print_function
 
 import logging
+from functools import partial
 from itertools import groupby
 from collections import namedtuple, OrderedDict
 from math import ceil
@@ -12,12 +13,16 @@ import xarray
 from affine import Affine
 from dask import array as da
 
-from ..config import LocalConfig
-from ..compat import string_types
+from ..config import LocalConfig, OPTIONS
+from ..compat import string_types, integer_types
+from ..executor import get_thread_executor
 from ..index import index_connect
-from ..storage.storage import DatasetSource, reproject_and_fuse
+from ..storage.storage import DatasetSource, reproject_and_fuse, reproject_and_fuse_bands, write_dataset_to_netcdf
 from ..utils import geometry, intersects, data_resolution_and_offset
+from . import chunk_cache
 from .query import Query, query_group_by, query_geopolygon
+from .reductions import DEFAULT_STATISTICS, accumulate_statistics, statistics_to_dataset
+from .reductions import blocked_quantiles, approximate_quantiles
 
 _LOG = logging.getLogger(__name__)
 
@@ -134,7 +139,7 @@ class Datacube(object):
 
     #: pylint: disable=too-many-arguments, too-many-locals
     def load(self, product=None, measurements=None, output_crs=None, resolution=None, resampling=None, stack=False,
-             dask_chunks=None, like=None, fuse_func=None, align=None, datasets=None, **query):
+             dask_chunks=None, like=None, fuse_func=None, align=None, datasets=None, workers=None, **query):
         """
         Load data as an ``xarray`` object.  Each measurement will be a data variable in the :class:`xarray.Dataset`.
 
@@ -276,18 +281,130 @@ class Datacube(object):
             data is simply copied over the top of each other, in a relatively undefined manner. This function can
             perform a specific combining step, eg. for combining GA PQ data.
 
+            May also be the name of a built-in fuser: ``'first', 'last', 'min', 'max', 'mean', 'and', 'or'``
+            or ``'ga_pq'``. See :mod:`datacube.storage.fusers`.
+
         :param datasets:
             Optional. If this is a non-empty list of :class:`datacube.model.Dataset` objects, these will be loaded
             instead of performing a database lookup.
 
+        :param workers:
+            Optional. Number of threads to load the data with, see :meth:`load_data`.
+
         :return: Requested data in a :class:`xarray.Dataset`.
             As a :class:`xarray.DataArray` if the ``stack`` variable is supplied.
 
         :rtype: :class:`xarray.Dataset` or :class:`xarray.DataArray`
         """
+        grouped, geobox, measurements = self._prepare_load(product, measurements, output_crs, resolution, resampling,
+                                                           like, align, datasets, **query)
+        if grouped is None:
+            return None if stack else xarray.Dataset()
+
+        result = self.load_data(grouped, geobox, measurements,
+                                fuse_func=fuse_func, dask_chunks=dask_chunks, workers=workers)
+        if not stack:
+            return result
+        else:
+            if not isinstance(stack, string_types):
+                stack = 'measurement'
+            return result.to_array(dim=stack)
+
+    def load_iter(self, product=None, measurements=None, output_crs=None, resolution=None, resampling=None,
+                  like=None, fuse_func=None, align=None, datasets=None, batch_size=1, workers=None, **query):
+        """
+        Load data one time slice, or `batch_size` time slices, at a time.
+
+        Takes the same arguments as :meth:`load`, and yields an :class:`xarray.Dataset` for each batch of time
+        slices instead of loading them all at once. See :meth:`load_data_iter`.
+
+        :param int batch_size: Number of time slices in each :class:`xarray.Dataset`.
+        """
+        grouped, geobox, measurements = self._prepare_load(product, measurements, output_crs, resolution, resampling,
+                                                           like, align, datasets, **query)
+        if grouped is None:
+            return iter([])
+
+        return self.load_data_iter(grouped, geobox, measurements, batch_size=batch_size, fuse_func=fuse_func,
+                                   workers=workers)
+
+    def load_statistics(self, product=None, measurements=None, statistics=DEFAULT_STATISTICS, output_crs=None,
+                        resolution=None, resampling=None, like=None, fuse_func=None, align=None, datasets=None,
+                        batch_size=1, workers=None, **query):
+        """
+        Per-pixel statistics over time of the valid observations, without loading the whole time series at once.
+
+        Takes the same arguments as :meth:`load`. See :meth:`reduce_data`.
+
+        :param statistics: names of the statistics to compute, see :data:`datacube.api.reductions.STATISTICS`
+        :param int batch_size: Number of time slices to load at a time.
+        :return: dataset with a ``<measurement>_<statistic>`` variable for each measurement and statistic
+        :rtype: :class:`xarray.Dataset`
+        """
+        grouped, geobox, measurements = self._prepare_load(product, measurements, output_crs, resolution, resampling,
+                                                           like, align, datasets, **query)
+        if grouped is None:
+            return xarray.Dataset()
+
+        return self.reduce_data(grouped, geobox, measurements, statistics=statistics, batch_size=batch_size,
+                                fuse_func=fuse_func, workers=workers)
+
+    def load_quantiles(self, product=None, measurements=None, quantiles=(0.5,), approximate=False, output_crs=None,
+                       resolution=None, resampling=None, like=None, fuse_func=None, align=None, datasets=None,
+                       workers=None, **query):
+        """
+        Per-pixel quantiles over time, eg. median composites, of the valid observations.
+
+        Takes the same arguments as :meth:`load`. See :meth:`quantile_data`.
+
+        :param quantiles: quantiles to compute, between 0 and 1
+        :param bool approximate: Estimate the quantiles in a single streaming pass instead
+        :return: dataset with a ``<measurement>_q<percent>`` variable for each measurement and quantile,
+            eg. ``red_q50`` for the median
+        :rtype: :class:`xarray.Dataset`
+        """
+        grouped, geobox, measurements = self._prepare_load(product, measurements, output_crs, resolution, resampling,
+                                                           like, align, datasets, **query)
+        if grouped is None:
+            return xarray.Dataset()
+
+        return self.quantile_data(grouped, geobox, measurements, quantiles=quantiles, approximate=approximate,
+                                  fuse_func=fuse_func, workers=workers)
+
+    def load_to_netcdf(self, filename, product=None, measurements=None, global_attributes=None,
+                       variable_params=None, dask_chunks=None, **load_kwargs):
+        """
+        Load data straight into a NetCDF file, without holding it all in memory.
+
+        Takes the same arguments as :meth:`load`. The data is loaded lazily and written a block of NetCDF chunks
+        at a time, see :func:`datacube.storage.storage.write_dataset_to_netcdf`.
+
+        :param filename: Output file, which must not exist yet
+        :param dict global_attributes: Global file attributes
+        :param dict variable_params: Per variable creation parameters, eg. ``{'red': {'chunksizes': [1, 200, 200],
+            'zlib': True}}``
+        :param dict dask_chunks: How to split the loading up, one time slice at a time by default
+        :return: Whether anything was found to write
+        :rtype: bool
+        """
+        data = self.load(product=product, measurements=measurements, dask_chunks=dask_chunks or {'time': 1},
+                         **load_kwargs)
+        if not data:
+            return False
+
+        write_dataset_to_netcdf(data, filename, global_attributes, variable_params)
+        return True
+
+    def _prepare_load(self, product, measurements, output_crs, resolution, resampling, like, align, datasets,
+                      **query):
+        """
+        Find and group the datasets to load, and work out the geobox and measurements to load them into.
+
+        :return: (grouped datasets, geobox, measurements), or (None, None, None) if there is nothing to load
+        """
         observations = datasets or self.find_datasets(product=product, like=like, **query)
         if not observations:
-            return None if stack else xarray.Dataset()
+            return None, None, None
 
         if like:
             assert output_crs is None, "'like' and 'output_crs' are not supported together"
@@ -318,14 +435,7 @@ class Datacube(object):
         measurements = self.index.products.get_by_name(product).lookup_measurements(measurements)
         measurements = set_resampling_method(measurements, resampling)
 
-        result = self.load_data(grouped, geobox, measurements.values(),
-                                fuse_func=fuse_func, dask_chunks=dask_chunks)
-        if not stack:
-            return result
-        else:
-            if not isinstance(stack, string_types):
-                stack = 'measurement'
-            return result.to_array(dim=stack)
+        return grouped, geobox, list(measurements.values())
 
     def product_observations(self, **kwargs):
         warnings.warn("product_observations() has been renamed to find_datasets() and will eventually be removed",
@@ -452,7 +562,8 @@ class Datacube(object):
         return Datacube.load_data(*args, **kwargs)
 
     @staticmethod
-    def load_data(sources, geobox, measurements, fuse_func=None, dask_chunks=None, skip_broken_datasets=False):
+    def load_data(sources, geobox, measurements, fuse_func=None, dask_chunks=None, skip_broken_datasets=False,
+                  workers=None):
         """
         Load data from :meth:`group_datasets` into an :class:`xarray.Dataset`.
 
@@ -466,7 +577,8 @@ class Datacube(object):
             list of measurement dicts with keys: {'name', 'dtype', 'nodata', 'units'}
 
         :param fuse_func:
-            function to merge successive arrays as an output
+            function to merge successive arrays as an output, or the name of a built-in fuser
+            (see :mod:`datacube.storage.fusers`)
 
         :param dict dask_chunks:
             If provided, the data will be loaded on demand using using :class:`dask.array.Array`.
@@ -475,17 +587,33 @@ class Datacube(object):
             See the documentation on using `xarray with dask <http://xarray.pydata.org/en/stable/dask.html>`_
             for more information.
 
+        :param workers:
+            Number of threads to load with, or a thread based executor from :mod:`datacube.executor`.
+            Measurements, and time slices of each measurement, are then loaded concurrently.
+            Ignored when loading with dask.
+
         :rtype: xarray.Dataset
 
         .. seealso:: :meth:`find_datasets` :meth:`group_datasets`
         """
         if dask_chunks is None:
+            loaded = OrderedDict((measurement['name'], numpy.full(sources.shape + geobox.shape, measurement['nodata'],
+                                                                  dtype=measurement['dtype']))
+                                 for measurement in measurements)
+            if OPTIONS.get('group_bands_by_file'):
+                tasks = _bands_by_file_tasks(loaded, sources, geobox, measurements, fuse_func=fuse_func,
+                                             skip_broken_datasets=skip_broken_datasets)
+            else:
+                intersecting = _intersecting_sources(sources, geobox)
+                tasks = [task
+                         for measurement in measurements
+                         for task in _measurement_series_tasks(loaded[measurement['name']], intersecting, geobox,
+                                                               measurement, fuse_func=fuse_func,
+                                                               skip_broken_datasets=skip_broken_datasets)]
+            _run_tasks(tasks, workers)
+
             def data_func(measurement):
-                data = numpy.full(sources.shape + geobox.shape, measurement['nodata'], dtype=measurement['dtype'])
-                for index, datasets in numpy.ndenumerate(sources.values):
-                    _fuse_measurement(data[index], datasets, geobox, measurement, fuse_func=fuse_func,
-                                      skip_broken_datasets=skip_broken_datasets)
-                return data
+                return loaded[measurement['name']]
         else:
             def data_func(measurement):
                 return _make_dask_array(sources, geobox, measurement, fuse_func, dask_chunks)
@@ -493,6 +621,130 @@ class Datacube(object):
         return Datacube.create_storage(OrderedDict((dim, sources.coords[dim]) for dim in sources.dims),
                                        geobox, measurements, data_func)
 
+    @staticmethod
+    def load_data_iter(sources, geobox, measurements, batch_size=1, fuse_func=None, skip_broken_datasets=False,
+                       workers=None):
+        """
+        Load data from :meth:`group_datasets` one batch of time slices at a time.
+
+        The next batch is loaded in the background while the current one is being used. Only two batches are
+        held in memory, and their arrays are reused: copy any data that must outlive the next iteration.
+
+        :param xarray.DataArray sources:
+            DataArray holding a list of :class:`datacube.model.Dataset`, grouped along the time dimension
+
+        :param GeoBox geobox:
+            A GeoBox defining the output spatial projection and resolution
+
+        :param measurements:
+            list of measurement dicts with keys: {'name', 'dtype', 'nodata', 'units'}
+
+        :param int batch_size: Number of time slices to load at a time
+
+        See :meth:`load_data` for the other parameters.
+
+        :return: iterator of :class:`xarray.Dataset`, one per batch of time slices
+        """
+        measurements = list(measurements)
+
+        def make_buffers():
+            return OrderedDict((measurement['name'], numpy.empty((batch_size,) + sources.shape[1:] + geobox.shape,
+                                                                 dtype=measurement['dtype']))
+                               for measurement in measurements)
+
+        def load_batch(buffers, start):
+            batch = sources[start:start + batch_size]
+            data = OrderedDict((name, buffer_[:batch.shape[0]]) for name, buffer_ in buffers.items())
+            for measurement in measurements:
+                data[measurement['name']].fill(measurement['nodata'])
+            if OPTIONS.get('group_bands_by_file'):
+                tasks = _bands_by_file_tasks(data, batch, geobox, measurements, fuse_func=fuse_func,
+                                             skip_broken_datasets=skip_broken_datasets)
+            else:
+                intersecting = _intersecting_sources(batch, geobox)
+                tasks = [task
+                         for measurement in measurements
+                         for task in _measurement_series_tasks(data[measurement['name']], intersecting, geobox,
+                                                               measurement, fuse_func=fuse_func,
+                                                               skip_broken_datasets=skip_broken_datasets)]
+            _run_tasks(tasks, workers)
+            return Datacube.create_storage(OrderedDict((dim, batch.coords[dim]) for dim in batch.dims),
+                                           geobox, measurements, lambda measurement: data[measurement['name']])
+
+        starts = list(range(0, sources.shape[0], batch_size))
+        if not starts:
+            return
+
+        buffers = [make_buffers(), make_buffers() if len(starts) > 1 else None]
+        prefetch = get_thread_executor(1, shared=False)
+        try:
+            pending = prefetch.submit(load_batch, buffers[0], starts[0])
+            for i in range(len(starts)):
+                loaded = prefetch.result(pending)
+                if i + 1 < len(starts):
+                    # the consumer is done with the batch before this one, so its buffers are free again
+                    pending = prefetch.submit(load_batch, buffers[(i + 1) % 2], starts[i + 1])
+                yield loaded
+        finally:
+            # also when the consumer stops early
+            prefetch.shutdown()
+
+    @staticmethod
+    def reduce_data(sources, geobox, measurements, statistics=DEFAULT_STATISTICS, batch_size=1, fuse_func=None,
+                    skip_broken_datasets=False, workers=None):
+        """
+        Per-pixel statistics over time of data from :meth:`group_datasets`.
+
+        Time slices are loaded `batch_size` at a time and folded into running per-pixel accumulators, so memory
+        use doesn't grow with the length of the time series. To split the work over blocks of time, use
+        :func:`datacube.api.reductions.accumulate_statistics` on each block and merge the results.
+
+        :param statistics: names of the statistics to compute, see :data:`datacube.api.reductions.STATISTICS`
+
+        See :meth:`load_data_iter` for the other parameters.
+
+        :return: dataset with a ``<measurement>_<statistic>`` variable for each measurement and statistic
+        :rtype: :class:`xarray.Dataset`
+        """
+        measurements = list(measurements)
+        batches = Datacube.load_data_iter(sources, geobox, measurements, batch_size=batch_size, fuse_func=fuse_func,
+                                          skip_broken_datasets=skip_broken_datasets, workers=workers)
+        return statistics_to_dataset(accumulate_statistics(batches, measurements), geobox, statistics)
+
+    @staticmethod
+    def quantile_data(sources, geobox, measurements, quantiles=(0.5,), approximate=False, fuse_func=None,
+                      skip_broken_datasets=False, workers=None, batch_size=1):
+        """
+        Per-pixel quantiles over time of data from :meth:`group_datasets`.
+
+        Exact quantiles are computed one spatial block at a time, loading the whole time series of each block.
+        Blocks are sized to fit the ``quantile_block_bytes`` option (see :class:`datacube.set_options`).
+
+        With `approximate`, the quantiles are instead estimated in a single pass over the time slices, loading
+        `batch_size` of them at a time. See :class:`datacube.api.reductions.P2Quantile`.
+
+        :param quantiles: quantiles to compute, between 0 and 1
+        :param bool approximate: Estimate the quantiles in a single streaming pass
+
+        See :meth:`load_data` for the other parameters.
+
+        :return: dataset with a ``<measurement>_q<percent>`` variable for each measurement and quantile,
+            eg. ``red_q50`` for the median
+        :rtype: :class:`xarray.Dataset`
+        """
+        measurements = list(measurements)
+        if approximate:
+            batches = Datacube.load_data_iter(sources, geobox, measurements, batch_size=batch_size,
+                                              fuse_func=fuse_func, skip_broken_datasets=skip_broken_datasets,
+                                              workers=workers)
+            return approximate_quantiles(batches, geobox, measurements, quantiles)
+
+        def load_block(block_geobox):
+            return Datacube.load_data(sources, block_geobox, measurements, fuse_func=fuse_func,
+                                      skip_broken_datasets=skip_broken_datasets, workers=workers)
+
+        return blocked_quantiles(load_block, geobox, sources.shape[0], measurements, quantiles)
+
     @staticmethod
     def measurement_data(sources, geobox, measurement, fuse_func=None, dask_chunks=None):
         """
@@ -538,11 +790,80 @@ class Datacube(object):
 def fuse_lazy(datasets, geobox, measurement, fuse_func=None, prepend_dims=0):
     prepend_shape = (1,) * prepend_dims
     data = numpy.full(geobox.shape, measurement['nodata'], dtype=measurement['dtype'])
-    _fuse_measurement(data, datasets, geobox, measurement, fuse_func)
+    _fuse_measurement(data, _intersecting(datasets, geobox), geobox, measurement, fuse_func=fuse_func)
     return data.reshape(prepend_shape + geobox.shape)
 
 
-def _fuse_measurement(dest, datasets, geobox, measurement, skip_broken_datasets=False, fuse_func=None):
+def _dataset_footprint(dataset, crs):
+    """
+    Extent of `dataset` in `crs`, or None if it has no extent.
+
+    Repeated chunks don't reproject it again, as the extent of a dataset keeps its last few reprojections.
+    """
+    extent = dataset.extent
+    return None if extent is None else extent.to_crs(crs)
+
+
+def _intersecting(datasets, geobox):
+    """
+    Drop datasets whose footprint doesn't intersect `geobox`, without opening any files.
+
+    Datasets without an extent are kept, and read to find out.
+    """
+    extent = geobox.extent
+
+    def may_intersect(dataset):
+        footprint = _dataset_footprint(dataset, geobox.crs)
+        return footprint is None or intersects(footprint, extent)
+
+    return [dataset for dataset in datasets if may_intersect(dataset)]
+
+
+def _intersecting_sources(sources, geobox):
+    """
+    The datasets of each group of `sources` that may intersect `geobox`, see :func:`_intersecting`.
+
+    :param xarray.DataArray sources: Groups of datasets, from :meth:`Datacube.group_datasets`
+    :return: numpy object array the shape of `sources`, holding a list of datasets per group
+    """
+    intersecting = numpy.empty(sources.shape, dtype=object)
+    for index, datasets in numpy.ndenumerate(sources.values):
+        intersecting[index] = _intersecting(datasets, geobox)
+    return intersecting
+
+
+def _order_by_overlap(datasets, geobox):
+    """
+    Sort datasets by how much of `geobox` they cover, largest first.
+
+    Datasets with the same overlap keep their original order.
+    """
+    extent = geobox.extent
+
+    def overlap(dataset):
+        footprint = _dataset_footprint(dataset, geobox.crs)
+        return 0 if footprint is None else footprint.intersection(extent).area
+
+    return sorted(datasets, key=overlap, reverse=True)
+
+
+def _fuse_measurement(dest, datasets, geobox, measurement, skip_broken_datasets=False, fuse_func=None,
+                      stop_when_covered=None):
+    """
+    Load `measurement` from `datasets` into `dest`.
+
+    :param datasets: Datasets that may intersect `geobox`, see :func:`_intersecting`
+    """
+    if len(datasets) > 1 and OPTIONS.get('sort_sources_by_overlap'):
+        datasets = _order_by_overlap(datasets, geobox)
+
+    key = None
+    if datasets and not skip_broken_datasets:
+        # chunks missing datasets that failed to load aren't kept
+        key = chunk_cache.chunk_key(datasets, geobox, measurement, fuse_func)
+    if chunk_cache.load_chunk(key, dest):
+        return
+
     reproject_and_fuse([DatasetSource(dataset, measurement['name']) for dataset in datasets],
                        dest,
                        geobox.affine,
@@ -550,14 +871,146 @@ def _fuse_measurement(dest, datasets, geobox, measurement, skip_broken_datasets=
                        dest.dtype.type(measurement['nodata']),
                        resampling=measurement.get('resampling_method', 'nearest'),
                        fuse_func=fuse_func,
-                       skip_broken_datasets=skip_broken_datasets)
+                       skip_broken_datasets=skip_broken_datasets,
+                       stop_when_covered=stop_when_covered)
+    chunk_cache.save_chunk(key, dest)
+
+
+def _plan_reads(intersecting, measurement):
+    """
+    Plan the reads of `measurement` along a 1D series of groups of datasets, batching consecutive time slices
+    stored in one file.
+
+    A time slice can join a batch when it has a single dataset, like the time slices of a stacked NetCDF file.
+
+    :param intersecting: The datasets of each group that intersect the geobox, see :func:`_intersecting_sources`
+
+    :return: list of (start, stop, batch) where batch is a list of `DatasetSource` for each index in
+             [start, stop), or None if the slices are to be fused one at a time
+    """
+    plan = []
+
+    def add_slice(index, source):
+        if plan and source is not None:
+            start, stop, batch = plan[-1]
+            if batch is not None and stop == index and batch[0].filename == source.filename:
+                batch.append(source)
+                plan[-1] = (start, stop + 1, batch)
+                return
+        plan.append((index, index + 1, None if source is None else [source]))
+
+    for index, datasets in enumerate(intersecting):
+        add_slice(index, DatasetSource(datasets[0], measurement['name']) if len(datasets) == 1 else None)
+
+    # a batch of one is no better than a normal read
+    return [(start, stop, batch if batch is None or len(batch) > 1 else None) for start, stop, batch in plan]
+
+
+def _run_tasks(tasks, workers=None):
+    """
+    Run independent `tasks`, functions without arguments, in the calling thread or concurrently.
+
+    :param workers: Number of threads, or a thread based executor
+    """
+    if isinstance(workers, integer_types):
+        workers = get_thread_executor(workers) if workers > 1 else None
+    if workers is None or len(tasks) < 2:
+        for task in tasks:
+            task()
+        return
+    workers.results([workers.submit(task) for task in tasks])
+
+
+def _measurement_series_tasks(data, intersecting, geobox, measurement, fuse_func=None,
+                              skip_broken_datasets=False):
+    """
+    Independent tasks loading `measurement` for every group of datasets into `data`, already filled with nodata.
+
+    Consecutive time slices stored in the same file, like those of a stacked NetCDF file, are read with one open
+    and one read.
+
+    :param intersecting: The datasets of each group that intersect `geobox`, see :func:`_intersecting_sources`
+    """
+    if intersecting.ndim != 1:
+        return [partial(_fuse_measurement, data[index], datasets, geobox, measurement, fuse_func=fuse_func,
+                        skip_broken_datasets=skip_broken_datasets)
+                for index, datasets in numpy.ndenumerate(intersecting) if datasets]
+
+    tasks = []
+    for start, stop, batch in _plan_reads(intersecting, measurement):
+        if batch is None:
+            tasks.extend(partial(_fuse_measurement, data[index], intersecting[index], geobox, measurement,
+                                 fuse_func=fuse_func, skip_broken_datasets=skip_broken_datasets)
+                         for index in range(start, stop) if intersecting[index])
+        else:
+            tasks.append(partial(reproject_and_fuse_bands,
+                                 [batch],
+                                 data[start:stop],
+                                 geobox.affine,
+                                 geobox.crs,
+                                 data.dtype.type(measurement['nodata']),
+                                 resampling=measurement.get('resampling_method', 'nearest'),
+                                 skip_broken_datasets=skip_broken_datasets))
+    return tasks
+
+
+def _group_by_file(datasets, measurements):
+    """
+    Group `measurements` that can be read together from `datasets`.
+
+    Measurements are grouped when they have the same data type, nodata and resampling and are stored in the same
+    file in every dataset.
+
+    :return: list of (measurements, sources) pairs, where sources has a list of `DatasetSource` per dataset,
+             one per measurement
+    """
+    groups = OrderedDict()
+    for measurement in measurements:
+        sources = [DatasetSource(dataset, measurement['name']) for dataset in datasets]
+        key = (numpy.dtype(measurement['dtype']), str(measurement['nodata']),
+               measurement.get('resampling_method', 'nearest'), tuple(source.filename for source in sources))
+        groups.setdefault(key, []).append((measurement, sources))
+
+    return [([measurement for measurement, _ in group], [list(bands) for bands in zip(*[s for _, s in group])])
+            for group in groups.values()]
+
+
+def _bands_by_file_tasks(data, sources, geobox, measurements, fuse_func=None, skip_broken_datasets=False):
+    """
+    Independent tasks loading all `measurements` into `data`, a dict of measurement name to numpy array,
+    opening each file once per time slice for all of its bands.
+    """
+    def load_slice(index, datasets):
+        if len(datasets) > 1 and OPTIONS.get('sort_sources_by_overlap'):
+            datasets = _order_by_overlap(datasets, geobox)
+
+        for group, group_sources in _group_by_file(datasets, measurements):
+            dest = numpy.empty((len(group),) + geobox.shape, dtype=group[0]['dtype'])
+            reproject_and_fuse_bands(group_sources,
+                                     dest,
+                                     geobox.affine,
+                                     geobox.crs,
+                                     dest.dtype.type(group[0]['nodata']),
+                                     resampling=group[0].get('resampling_method', 'nearest'),
+                                     fuse_func=fuse_func,
+                                     skip_broken_datasets=skip_broken_datasets)
+            for measurement, band in zip(group, dest):
+                data[measurement['name']][index] = band
+
+    tasks = []
+    for index, datasets in numpy.ndenumerate(sources.values):
+        datasets = _intersecting(datasets, geobox)
+        if datasets:
+            tasks.append(partial(load_slice, index, datasets))
+    return tasks
 
 
 def get_bounds(datasets, crs):
-    left = min([d.extent.to_crs(crs).boundingbox.left for d in datasets])
-    right = max([d.extent.to_crs(crs).boundingbox.right for d in datasets])
-    top = max([d.extent.to_crs(crs).boundingbox.top for d in datasets])
-    bottom = min([d.extent.to_crs(crs).boundingbox.bottom for d in datasets])
+    bounds = [d.extent.to_crs(crs).boundingbox for d in datasets]
+    left = min(bound.left for bound in bounds)
+    right = max(bound.right for bound in bounds)
+    top = max(bound.top for bound in bounds)
+    bottom = min(bound.bottom for bound in bounds)
     return geometry.box(left, bottom, right, top, crs=crs)
 
 
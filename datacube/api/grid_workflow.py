@@ -10,6 +10,7 @@ import warnings
 from ..utils import intersects
 from .query import Query, query_group_by
 from .core import Datacube, set_resampling_method
+from .reductions import DEFAULT_STATISTICS
 
 _LOG = logging.getLogger(__name__)
 
@@ -160,9 +161,10 @@ class GridWorkflow(object):
             geobox = self.grid_spec.tile_geobox(cell_index)
             geobox = geobox.buffered(*tile_buffer) if tile_buffer else geobox
 
-            datasets, query = self._find_datasets(geobox.extent, indexers)
+            extent = geobox.extent
+            datasets, query = self._find_datasets(extent, indexers)
             for dataset in datasets:
-                if intersects(geobox.extent, dataset.extent.to_crs(self.grid_spec.crs)):
+                if intersects(extent, dataset.extent.to_crs(self.grid_spec.crs)):
                     add_dataset_to_cells(cell_index, geobox, dataset)
             return cells
         else:
@@ -304,7 +306,8 @@ class GridWorkflow(object):
         return self.tile_sources(observations, query_group_by(**query))
 
     @staticmethod
-    def load(tile, measurements=None, dask_chunks=None, fuse_func=None, resampling=None, skip_broken_datasets=False):
+    def load(tile, measurements=None, dask_chunks=None, fuse_func=None, resampling=None, skip_broken_datasets=False,
+             workers=None):
         """
         Load data for a cell/tile.
 
@@ -327,7 +330,8 @@ class GridWorkflow(object):
             for more information.
 
         :param fuse_func: Function to fuse together a tile that has been pre-grouped by calling
-            :meth:`list_cells` with a ``group_by`` parameter.
+            :meth:`list_cells` with a ``group_by`` parameter, or the name of a built-in fuser,
+            see :mod:`datacube.storage.fusers`.
 
         :param str resampling: The resampling method to use if re-projection is required.
 
@@ -335,6 +339,8 @@ class GridWorkflow(object):
 
             Defaults to ``'nearest'``.
 
+        :param workers: Number of threads to load the data with, see :meth:`.Datacube.load_data`.
+
         :rtype: :py:class:`xarray.Dataset`
 
         .. seealso::
@@ -348,10 +354,93 @@ class GridWorkflow(object):
         measurements = set_resampling_method(measurements, resampling)
 
         dataset = Datacube.load_data(tile.sources, tile.geobox, measurements.values(), dask_chunks=dask_chunks,
-                                     fuse_func=fuse_func, skip_broken_datasets=skip_broken_datasets)
+                                     fuse_func=fuse_func, skip_broken_datasets=skip_broken_datasets,
+                                     workers=workers)
 
         return dataset
 
+    @staticmethod
+    def load_iter(tile, measurements=None, batch_size=1, fuse_func=None, resampling=None, skip_broken_datasets=False,
+                  workers=None):
+        """
+        Load data for a cell/tile one time slice, or `batch_size` time slices, at a time.
+
+        The next batch is loaded in the background while the current one is being used. The arrays of the
+        yielded datasets are reused, so copy any data that must outlive the next iteration.
+
+        :param `.Tile` tile: The tile to load.
+
+        :param int batch_size: Number of time slices in each :class:`xarray.Dataset`.
+
+        See :meth:`load` for the other parameters.
+
+        :return: iterator of :py:class:`xarray.Dataset`
+
+        .. seealso::
+            :meth:`load` :meth:`.Datacube.load_data_iter`
+        """
+        measurements = tile.product.lookup_measurements(measurements)
+        measurements = set_resampling_method(measurements, resampling)
+
+        return Datacube.load_data_iter(tile.sources, tile.geobox, measurements.values(), batch_size=batch_size,
+                                       fuse_func=fuse_func, skip_broken_datasets=skip_broken_datasets,
+                                       workers=workers)
+
+    @staticmethod
+    def load_statistics(tile, measurements=None, statistics=DEFAULT_STATISTICS, batch_size=1, fuse_func=None,
+                        resampling=None, skip_broken_datasets=False, workers=None):
+        """
+        Per-pixel statistics over time of the valid observations of a cell/tile, streaming through the time slices.
+
+        :param `.Tile` tile: The tile to load.
+
+        :param statistics: names of the statistics to compute, see :data:`datacube.api.reductions.STATISTICS`
+
+        :param int batch_size: Number of time slices to load at a time.
+
+        See :meth:`load` for the other parameters.
+
+        :return: dataset with a ``<measurement>_<statistic>`` variable for each measurement and statistic
+        :rtype: :py:class:`xarray.Dataset`
+
+        .. seealso::
+            :meth:`.Datacube.reduce_data`
+        """
+        measurements = tile.product.lookup_measurements(measurements)
+        measurements = set_resampling_method(measurements, resampling)
+
+        return Datacube.reduce_data(tile.sources, tile.geobox, measurements.values(), statistics=statistics,
+                                    batch_size=batch_size, fuse_func=fuse_func,
+                                    skip_broken_datasets=skip_broken_datasets, workers=workers)
+
+    @staticmethod
+    def load_quantiles(tile, measurements=None, quantiles=(0.5,), approximate=False, fuse_func=None,
+                       resampling=None, skip_broken_datasets=False, workers=None):
+        """
+        Per-pixel quantiles over time, eg. median composites, of the valid observations of a cell/tile.
+
+        :param `.Tile` tile: The tile to load.
+
+        :param quantiles: quantiles to compute, between 0 and 1
+
+        :param bool approximate: Estimate the quantiles in a single streaming pass instead of exactly,
+            one spatial block at a time.
+
+        See :meth:`load` for the other parameters.
+
+        :return: dataset with a ``<measurement>_q<percent>`` variable for each measurement and quantile
+        :rtype: :py:class:`xarray.Dataset`
+
+        .. seealso::
+            :meth:`.Datacube.quantile_data`
+        """
+        measurements = tile.product.lookup_measurements(measurements)
+        measurements = set_resampling_method(measurements, resampling)
+
+        return Datacube.quantile_data(tile.sources, tile.geobox, measurements.values(), quantiles=quantiles,
+                                      approximate=approximate, fuse_func=fuse_func,
+                                      skip_broken_datasets=skip_broken_datasets, workers=workers)
+
     def update_tile_lineage(self, tile):
         for i in range(tile.sources.size):
             sources = tile.sources.values[i]
@@ -0,0 +1,363 @@
+"""
+Per-pixel statistics over time, accumulated while streaming through the time slices instead of loading them all.
+
+Accumulators can be built over separate blocks of time, eg. on different workers, and merged afterwards::
+
+    first = accumulate_statistics(Datacube.load_data_iter(sources[:100], geobox, measurements), measurements)
+    rest = accumulate_statistics(Datacube.load_data_iter(sources[100:], geobox, measurements), measurements)
+    merged = merge_statistics(first, rest)
+    dataset = statistics_to_dataset(merged, geobox)
+
+Quantiles can't be accumulated exactly like this. They are either computed exactly over spatial blocks small
+enough to hold their whole time series (:func:`blocked_quantiles`), or approximated in a single pass
+(:class:`P2Quantile`).
+"""
+from __future__ import absolute_import, division
+
+import warnings
+from collections import OrderedDict
+
+import numpy
+import xarray
+
+from ..config import OPTIONS
+from ..storage.fusers import MinFuser, MaxFuser, _nodata_mask
+
+STATISTICS = ('count', 'sum', 'mean', 'var', 'std', 'min', 'max')
+DEFAULT_STATISTICS = ('count', 'mean', 'std', 'min', 'max')
+
+
+class PixelStatistics(object):
+    """
+    Running per-pixel count, mean, variance, minimum and maximum of the valid (not `nodata`) observations
+
+    The mean and variance use Welford's/Chan's update, so they are stable over long time series.
+    """
+    def __init__(self, shape, dtype, nodata):
+        self.nodata = nodata
+        self.count = numpy.zeros(shape, dtype='uint32')
+        self.mean = numpy.zeros(shape, dtype='float64')
+        self.m2 = numpy.zeros(shape, dtype='float64')
+        self.min = numpy.full(shape, nodata, dtype=dtype)
+        self.max = numpy.full(shape, nodata, dtype=dtype)
+
+    def update(self, data):
+        """
+        Add observations
+
+        :param numpy.ndarray data: a (time, y, x) block of observations, or a single (y, x) one
+        """
+        data = numpy.asarray(data)
+        if data.ndim == self.count.ndim:
+            data = data[numpy.newaxis]
+        valid = ~_nodata_mask(data, self.nodata)
+        count = valid.sum(axis=0)
+        values = numpy.where(valid, data, 0).astype('float64')
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            mean = numpy.where(count > 0, values.sum(axis=0) / count, 0)
+        values -= mean
+        values *= valid
+        m2 = (values * values).sum(axis=0)
+        self._combine(count, mean, m2,
+                      MinFuser(self.nodata).reduce(data), MaxFuser(self.nodata).reduce(data))
+
+    def merge(self, other):
+        """
+        Add the observations accumulated by `other`, eg. over another block of time
+
+        :type other: PixelStatistics
+        :rtype: PixelStatistics
+        """
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        return self
+
+    def _combine(self, count, mean, m2, min_, max_):
+        total = self.count + count
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            ratio = numpy.where(total > 0, count / total, 0)
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * ratio
+        self.mean += delta * ratio
+        self.count[...] = total
+        MinFuser(self.nodata).fuse(self.min, min_)
+        MaxFuser(self.nodata).fuse(self.max, max_)
+
+    def result(self, statistic):
+        """
+        :param str statistic: one of `STATISTICS`
+        :return: per-pixel statistic, NaN (or `nodata` for min and max) where there were no valid observations
+        :rtype: numpy.ndarray
+        """
+        if statistic == 'count':
+            return self.count
+        if statistic in ('min', 'max'):
+            return getattr(self, statistic)
+
+        valid = self.count > 0
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            if statistic == 'sum':
+                values = self.mean * self.count
+            elif statistic == 'mean':
+                values = self.mean.copy()
+            elif statistic == 'var':
+                values = self.m2 / self.count
+            elif statistic == 'std':
+                values = numpy.sqrt(self.m2 / self.count)
+            else:
+                raise ValueError('Unknown statistic %r, expected one of: %s' % (statistic, ', '.join(STATISTICS)))
+        values[~valid] = numpy.nan
+        return values
+
+
+def accumulate_statistics(batches, measurements):
+    """
+    Accumulate per-pixel statistics of `measurements` over time
+
+    :param batches: iterable of :class:`xarray.Dataset` with the time slices, eg. from
+        :meth:`datacube.Datacube.load_data_iter`. Only one needs to be held in memory at a time.
+    :param measurements: list of measurement dicts with keys: {'name', 'dtype', 'nodata'}
+    :return: dict of measurement name to :class:`PixelStatistics`
+    """
+    accumulators = OrderedDict()
+    for batch in batches:
+        for measurement in measurements:
+            name = measurement['name']
+            data = batch[name].values
+            if name not in accumulators:
+                accumulators[name] = PixelStatistics(data.shape[1:], measurement['dtype'], measurement['nodata'])
+            accumulators[name].update(data)
+    return accumulators
+
+
+def merge_statistics(*accumulated):
+    """
+    Merge the output of several :func:`accumulate_statistics` calls, eg. over different blocks of time
+
+    The accumulators of the first call are updated in place.
+
+    :return: dict of measurement name to :class:`PixelStatistics`
+    """
+    merged = OrderedDict()
+    for accumulators in accumulated:
+        for name, accumulator in accumulators.items():
+            if name in merged:
+                merged[name].merge(accumulator)
+            else:
+                merged[name] = accumulator
+    return merged
+
+
+def statistics_to_dataset(accumulators, geobox, statistics=DEFAULT_STATISTICS):
+    """
+    :param accumulators: dict of measurement name to :class:`PixelStatistics`
+    :param GeoBox geobox: the geobox the statistics were accumulated over
+    :param statistics: names of the statistics to include, see `STATISTICS`
+    :return: dataset with a `<measurement>_<statistic>` variable for each measurement and statistic
+    :rtype: xarray.Dataset
+    """
+    result = _empty_dataset(geobox)
+    for name, accumulator in accumulators.items():
+        for statistic in statistics:
+            nodata = {'count': 0, 'min': accumulator.nodata, 'max': accumulator.nodata}.get(statistic, numpy.nan)
+            result['%s_%s' % (name, statistic)] = (geobox.dimensions, accumulator.result(statistic),
+                                                   {'nodata': nodata, 'crs': geobox.crs})
+    return result
+
+
+def _empty_dataset(geobox):
+    result = xarray.Dataset(attrs={'crs': geobox.crs})
+    for name, coord in geobox.coordinates.items():
+        result[name] = (name, coord.values, {'units': coord.units})
+    return result
+
+
+def quantile_name(measurement_name, quantile):
+    """
+    Name of the variable holding a quantile of a measurement
+
+    >>> quantile_name('red', 0.5), quantile_name('red', 0.025)
+    ('red_q50', 'red_q2.5')
+    """
+    return '%s_q%g' % (measurement_name, quantile * 100)
+
+
+def _nan_quantiles(data, nodata, quantiles):
+    """Quantiles over the first axis of `data`, ignoring `nodata`"""
+    values = data.astype('float64')
+    values[_nodata_mask(data, nodata)] = numpy.nan
+    with warnings.catch_warnings():
+        # pixels without any valid observations are NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return numpy.nanpercentile(values, [quantile * 100 for quantile in quantiles], axis=0)
+
+
+def _spatial_blocks(shape, depth, itemsize, block_bytes):
+    """
+    Split a (y, x) `shape` into blocks whose whole time series, and its float64 working copies, fit in
+    `block_bytes`
+
+    >>> list(_spatial_blocks((4, 6), 10, 2, 10 * 18 * 12))
+    [(slice(0, 2, None), slice(0, 6, None)), (slice(2, 4, None), slice(0, 6, None))]
+    """
+    pixel_bytes = depth * (itemsize + 2 * 8)
+    width = int(min(shape[1], max(1, block_bytes // pixel_bytes)))
+    height = int(min(shape[0], max(1, block_bytes // (pixel_bytes * width))))
+    for y in range(0, shape[0], height):
+        for x in range(0, shape[1], width):
+            yield slice(y, min(y + height, shape[0])), slice(x, min(x + width, shape[1]))
+
+
+def blocked_quantiles(load_block, geobox, depth, measurements, quantiles=(0.5,), block_bytes=None):
+    """
+    Exact per-pixel quantiles over time of the valid observations, computed one spatial block at a time
+
+    :param load_block: function(geobox) returning an :class:`xarray.Dataset` with the whole time series
+        of `measurements` over `geobox`
+    :param GeoBox geobox: the output geobox
+    :param int depth: number of time slices
+    :param measurements: list of measurement dicts with keys: {'name', 'dtype', 'nodata'}
+    :param quantiles: quantiles to compute, between 0 and 1
+    :param int block_bytes: memory budget for each block,
+        defaults to the `quantile_block_bytes` option (see :class:`datacube.set_options`)
+    :return: dataset with a variable for each measurement and quantile, named by :func:`quantile_name`
+    :rtype: xarray.Dataset
+    """
+    block_bytes = block_bytes or OPTIONS['quantile_block_bytes']
+    itemsize = sum(numpy.dtype(measurement['dtype']).itemsize for measurement in measurements)
+    output = OrderedDict((measurement['name'], numpy.empty((len(quantiles),) + geobox.shape, dtype='float64'))
+                         for measurement in measurements)
+
+    for block in _spatial_blocks(geobox.shape, depth, itemsize, block_bytes):
+        data = load_block(geobox[block])
+        for measurement in measurements:
+            name = measurement['name']
+            output[name][(slice(None),) + block] = _nan_quantiles(data[name].values, measurement['nodata'],
+                                                                  quantiles)
+
+    result = _empty_dataset(geobox)
+    for name, values in output.items():
+        for quantile, value in zip(quantiles, values):
+            result[quantile_name(name, quantile)] = (geobox.dimensions, value, {'nodata': numpy.nan,
+                                                                                'crs': geobox.crs})
+    return result
+
+
+class P2Quantile(object):
+    """
+    Single pass approximate per-pixel quantile of the valid (not `nodata`) observations
+
+    Uses the P-square algorithm (Jain and Chlamtac, 1985), which keeps five markers per pixel whatever the
+    number of observations. Pixels with fewer than five observations get the exact quantile.
+    """
+    def __init__(self, shape, quantile, nodata):
+        self.quantile = quantile
+        self.nodata = nodata
+        self.count = numpy.zeros(shape, dtype='uint32')
+        self.heights = numpy.zeros((5,) + tuple(shape), dtype='float64')
+        self._increments = numpy.array([0, quantile / 2, quantile, (1 + quantile) / 2, 1]).reshape((5, 1))
+        self.positions = numpy.zeros_like(self.heights)
+        self.positions.T[...] = numpy.arange(1, 6)
+        self.desired = numpy.zeros_like(self.heights)
+        self.desired.T[...] = 1 + 4 * self._increments[:, 0]
+
+    def update(self, data):
+        """
+        Add observations
+
+        :param numpy.ndarray data: a (time, y, x) block of observations, or a single (y, x) one
+        """
+        data = numpy.asarray(data)
+        if data.ndim == self.count.ndim:
+            data = data[numpy.newaxis]
+        for observation in data:
+            self._add(observation)
+
+    def _add(self, observation):
+        valid = ~_nodata_mask(observation, self.nodata)
+        update = valid & (self.count >= 5)
+
+        # the first five observations of a pixel become its markers
+        filling = numpy.nonzero(valid & (self.count < 5))
+        if filling[0].size:
+            self.heights[(self.count[filling],) + filling] = observation[filling]
+            self.count[filling] += 1
+            full = numpy.zeros_like(valid)
+            full[filling] = self.count[filling] == 5
+            self.heights[:, full] = numpy.sort(self.heights[:, full], axis=0)
+
+        if not update.any():
+            return
+        self.count[update] += 1
+        x = observation[update].astype('float64')
+        q = self.heights[:, update]
+        n = self.positions[:, update]
+        d = self.desired[:, update] + self._increments
+
+        q[0] = numpy.minimum(q[0], x)
+        q[4] = numpy.maximum(q[4], x)
+        cell = (x >= q[1:4]).sum(axis=0)
+        n[1:] += numpy.arange(1, 5).reshape((4, 1)) > cell
+
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            for i in (1, 2, 3):
+                offset = d[i] - n[i]
+                up = (offset >= 1) & (n[i + 1] - n[i] > 1)
+                down = (offset <= -1) & (n[i - 1] - n[i] < -1)
+                step = numpy.where(up, 1., -1.)
+                parabolic = q[i] + step / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                linear = q[i] + step * (numpy.where(up, q[i + 1], q[i - 1]) - q[i]) / (
+                    numpy.where(up, n[i + 1], n[i - 1]) - n[i])
+                adjusted = numpy.where((q[i - 1] < parabolic) & (parabolic < q[i + 1]), parabolic, linear)
+                move = up | down
+                q[i] = numpy.where(move, adjusted, q[i])
+                n[i] += numpy.where(move, step, 0)
+
+        self.heights[:, update] = q
+        self.positions[:, update] = n
+        self.desired[:, update] = d
+
+    def result(self):
+        """
+        :return: per-pixel quantile, NaN where there were no valid observations
+        :rtype: numpy.ndarray
+        """
+        result = self.heights[2].copy()
+        few = self.count < 5
+        if few.any():
+            values = self.heights[:, few]
+            values[numpy.arange(5).reshape((5, 1)) >= self.count[few]] = numpy.nan
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                result[few] = numpy.nanpercentile(values, self.quantile * 100, axis=0)
+        return result
+
+
+def approximate_quantiles(batches, geobox, measurements, quantiles=(0.5,)):
+    """
+    Approximate per-pixel quantiles over time in a single pass, see :class:`P2Quantile`
+
+    :param batches: iterable of :class:`xarray.Dataset` with the time slices, eg. from
+        :meth:`datacube.Datacube.load_data_iter`. Only one needs to be held in memory at a time.
+    :param GeoBox geobox: the geobox of the time slices
+    :param measurements: list of measurement dicts with keys: {'name', 'dtype', 'nodata'}
+    :param quantiles: quantiles to compute, between 0 and 1
+    :return: dataset with a variable for each measurement and quantile, named by :func:`quantile_name`
+    :rtype: xarray.Dataset
+    """
+    estimators = OrderedDict((measurement['name'], [P2Quantile(geobox.shape, quantile, measurement['nodata'])
+                                                    for quantile in quantiles])
+                             for measurement in measurements)
+    for batch in batches:
+        for name, quantile_estimators in estimators.items():
+            data = batch[name].values
+            for estimator in quantile_estimators:
+                estimator.update(data)
+
+    result = _empty_dataset(geobox)
+    for name, quantile_estimators in estimators.items():
+        for estimator in quantile_estimators:
+            result[quantile_name(name, estimator.quantile)] = (geobox.dimensions, estimator.result(),
+                                                               {'nodata': numpy.nan, 'crs': geobox.crs})
+    return result
@@ -31,8 +31,11 @@ if not PY2:
         return config
 
 
-    from urllib.parse import urlparse, urljoin
-    from urllib.request import url2pathname
+    from urllib.parse import urlparse, urljoin, quote, unquote
+    from urllib.request import url2pathname, urlopen, Request
+    from urllib.error import HTTPError
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
     from itertools import zip_longest
 else:
     text_type = unicode
@@ -55,7 +58,10 @@ else:
         return config
 
     from urlparse import urlparse, urljoin
-    from urllib import url2pathname
+    from urllib import url2pathname, quote, unquote
+    from urllib2 import urlopen, Request, HTTPError
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
     from itertools import izip_longest as zip_longest
 
 
@@ -118,15 +118,52 @@ class LocalConfig(object):
         return self.__str__()
 
 
-OPTIONS = {'reproject_threads': 4}
+OPTIONS = {
+    'reproject_threads': 4,
+    'max_open_files': 64,
+    'source_read_threads': 1,
+    'sort_sources_by_overlap': False,
+    'group_bands_by_file': False,
+    'reproject_map_cache_bytes': 0,
+    'quantile_block_bytes': 256 * 1024 ** 2,
+    'netcdf_compress_threads': 1,
+    'block_cache_bytes': 0,
+    'block_cache_dir': None,
+    'chunk_cache_bytes': 0,
+    'chunk_cache_dir': None,
+    'chunk_cache_disk_bytes': 1024 ** 3,
+}
 
 
 #: pylint: disable=invalid-name
 class set_options(object):
     """Set global state within a controlled context
 
-    Currently, the only supported options are:
+    Currently supported options are:
     * reproject_threads: The number of threads to use when reprojecting
+    * max_open_files: The number of raster files to keep open for reuse between reads.
+      Set to 0 to close files as soon as they have been read
+    * source_read_threads: The number of sources to read and reproject concurrently when
+      fusing several datasets into one time slice. Sources are still fused in order
+    * sort_sources_by_overlap: Fuse the datasets that cover most of the output first, so reading can stop
+      sooner once every pixel has data. This changes which dataset wins where datasets overlap
+    * group_bands_by_file: When loading without dask, read all the requested bands that share a file
+      (and data type, nodata and resampling) with one open and one read or warp per dataset
+    * reproject_map_cache_bytes: Memory to spend on caching nearest neighbour reprojections between pairs of
+      grids, so warping another dataset on the same grid becomes an array lookup. 0 disables the cache
+    * quantile_block_bytes: Memory budget for each spatial block when computing exact quantiles over time.
+      Smaller blocks use less memory but read each file more times
+    * netcdf_compress_threads: The number of threads to compress chunks with when writing zlib compressed NetCDF
+      variables, or 0 for one per CPU. Needs ``h5py`` for more than one thread. The file written is the same
+    * block_cache_bytes: Local disk to spend on caching the blocks of files read over http(s), so loading the
+      same area again doesn't fetch it again. 0 disables the cache
+    * block_cache_dir: Directory for the block cache, which the user's processes can share. It must belong to
+      the user and not be writable by others. Defaults to ``datacube-block-cache-<uid>`` in the temporary directory
+    * chunk_cache_bytes: Memory to spend on caching loaded time slices (or dask chunks) of a measurement, by their
+      datasets, grid, measurement and fuser, so loading them again doesn't read and warp them again.
+      0 disables the cache. Only time slices fused one at a time are cached
+    * chunk_cache_dir: Directory to spill chunks evicted from memory to, or None to drop them
+    * chunk_cache_disk_bytes: Disk space for the spilled chunks
 
     You can use ``set_options`` either as a context manager::
 
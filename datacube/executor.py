@@ -15,6 +15,8 @@
 from __future__ import absolute_import, division
 
 import sys
+import threading
+from multiprocessing import cpu_count
 import six
 
 _REMOTE_LOG_FORMAT_STRING = '%(asctime)s {} %(process)d %(name)s %(levelname)s %(message)s'
@@ -65,6 +67,10 @@ class SerialExecutor(object):
     def release(future):
         pass
 
+    @staticmethod
+    def shutdown(wait=True):
+        pass
+
 
 def setup_logging():
     import logging
@@ -143,9 +149,9 @@ def _get_distributed_executor(scheduler):
         return None
 
 
-def _get_concurrent_executor(workers):
+def _get_concurrent_executor(workers, use_threads=False):
     try:
-        from concurrent.futures import ProcessPoolExecutor, as_completed
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
     except ImportError:
         return None
 
@@ -199,9 +205,38 @@ def _get_concurrent_executor(workers):
         def release(future):
             pass
 
+        def shutdown(self, wait=True):
+            self._pool.shutdown(wait)
+
+    if use_threads:
+        return MultiprocessingExecutor(ThreadPoolExecutor(workers if workers > 0 else cpu_count()))
     return MultiprocessingExecutor(ProcessPoolExecutor(workers if workers > 0 else None))
 
 
+_THREAD_EXECUTORS = {}
+_THREAD_EXECUTORS_LOCK = threading.Lock()
+
+
+def get_thread_executor(workers, shared=True):
+    """
+    Return a task executor running tasks in a shared pool of threads, falling back to serial execution.
+
+    Unlike the process and distributed executors, tasks share memory with the caller, so they can
+    fill in preallocated arrays.
+
+    :param int workers: Number of threads, or 0 for one per CPU
+    :param bool shared: Whether to use the pool shared by all callers asking for the same number of threads,
+        or start a new one, eg. for long running background tasks that shouldn't hold up others.
+        The caller must ``shutdown()`` a pool that isn't shared once done with it
+    """
+    if not shared:
+        return _get_concurrent_executor(workers, use_threads=True) or SerialExecutor()
+    with _THREAD_EXECUTORS_LOCK:
+        if workers not in _THREAD_EXECUTORS:
+            _THREAD_EXECUTORS[workers] = _get_concurrent_executor(workers, use_threads=True) or SerialExecutor()
+        return _THREAD_EXECUTORS[workers]
+
+
 def get_executor(scheduler, workers):
     """
     Return a task executor based on input parameters. Falling back as required.
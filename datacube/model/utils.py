@@ -164,7 +164,7 @@ def xr_apply(data_array, func, dtype):
     return xarray.DataArray(data, coords=data_array.coords, dims=data_array.dims)
 
 
-def make_dataset(product, sources, extent, center_time, valid_data=None, uri=None, app_info=None):
+def make_dataset(product, sources, extent, center_time, valid_data=None, uri=None, app_info=None, bands=None):
     """
     Create :class:`datacube.model.Dataset` for the data
 
@@ -175,13 +175,14 @@ def make_dataset(product, sources, extent, center_time, valid_data=None, uri=Non
     :param center_time: time of the central point of the dataset
     :param str uri: The uri of the dataset
     :param dict app_info: Additional metadata to be stored about the generation of the product
+    :param dict bands: ``image: bands:`` document, defaults to a variable per measurement in the file at `uri`
     :rtype: class:`Dataset`
     """
     document = {}
     merge(document, product.metadata_doc)
     merge(document, new_dataset_info())
     merge(document, machine_info())
-    merge(document, band_info(product.measurements.keys()))
+    merge(document, {'image': {'bands': bands}} if bands else band_info(product.measurements.keys()))
     merge(document, source_info(sources))
     merge(document, geobox_info(extent, valid_data))
     merge(document, time_info(center_time))
@@ -18,7 +18,8 @@ import datacube
 from datacube.api.core import Datacube
 from datacube.model import DatasetType, Range, GeoPolygon
 from datacube.model.utils import make_dataset, xr_apply, datasets_to_doc
-from datacube.storage.storage import write_dataset_to_netcdf
+from datacube.storage.drivers import writer_driver, WRITER_DRIVERS, DEFAULT_WRITER_DRIVER
+from datacube.storage.fusers import FUSERS
 from datacube.ui import click as ui
 from datacube.utils import read_documents
 from datacube.ui.task_app import check_existing_files, load_tasks as load_tasks_, save_tasks as save_tasks_
@@ -28,6 +29,7 @@ from datacube.ui.click import cli
 _LOG = logging.getLogger('agdc-ingest')
 
 FUSER_KEY = 'fuse_data'
+COMPRESS_THREADS_KEY = 'compress_threads'
 
 
 def find_diff(input_type, output_type, index, **query):
@@ -47,7 +49,7 @@ def morph_dataset_type(source_type, config):
     output_type.definition['managed'] = True
     output_type.definition['description'] = config['description']
     output_type.definition['storage'] = config['storage']
-    output_type.metadata_doc['format'] = {'name': 'NetCDF'}
+    output_type.metadata_doc['format'] = {'name': writer_driver(config['storage'].get('driver')).format}
 
     def merge_measurement(measurement, spec):
         measurement.update({k: spec.get(k, measurement[k]) for k in ('name', 'nodata', 'dtype')})
@@ -119,6 +121,11 @@ def make_output_type(index, config):
         click.echo("Source DatasetType %s does not exist" % config['source_type'])
         click.get_current_context().exit(1)
 
+    if config['storage'].get('driver', DEFAULT_WRITER_DRIVER) not in WRITER_DRIVERS:
+        click.echo('Unknown storage driver: %s, expected one of: %s'
+                   % (config['storage']['driver'], ', '.join(sorted(WRITER_DRIVERS))))
+        click.get_current_context().exit(1)
+
     output_type = morph_dataset_type(source_type, config)
     _LOG.info('Created DatasetType %s', output_type.name)
     output_type = index.products.add(output_type)
@@ -150,6 +157,10 @@ def create_task_list(index, output_type, year, source_type, config):
         query['x'] = Range(bounds['left'], bounds['right'])
         query['y'] = Range(bounds['bottom'], bounds['top'])
 
+    if config.get(FUSER_KEY, 'copy') not in FUSERS:
+        click.echo('Unknown "%s": %s, expected one of: %s' % (FUSER_KEY, config[FUSER_KEY], ', '.join(sorted(FUSERS))))
+        click.get_current_context().exit(1)
+
     tasks = find_diff(source_type, output_type, index, **query)
     _LOG.info('%s tasks discovered', len(tasks))
 
@@ -182,26 +193,29 @@ def ingest_work(config, source_type, output_type, tile, tile_index):
     measurements = get_measurements(source_type, config)
     variable_params = get_variable_params(config)
     global_attributes = config['global_attributes']
+    driver = writer_driver(config['storage'].get('driver'))
 
-    with datacube.set_options(reproject_threads=1):
-        fuse_func = {'copy': None}[config.get(FUSER_KEY, 'copy')]
-        data = Datacube.load_data(tile.sources, tile.geobox, measurements, fuse_func=fuse_func)
+    with datacube.set_options(reproject_threads=1, reproject_map_cache_bytes=256 * 1024 ** 2):
+        data = Datacube.load_data(tile.sources, tile.geobox, measurements, fuse_func=config.get(FUSER_KEY, 'copy'))
     nudata = data.rename(namemap)
     file_path = get_filename(config, tile_index, tile.sources, version=config['taskfile_version'])
 
     def _make_dataset(labels, sources):
+        location = driver.dataset_location(file_path, labels['time'], output_type.measurements.keys())
         return make_dataset(product=output_type,
                             sources=sources,
                             extent=tile.geobox.extent,
                             center_time=labels['time'],
-                            uri=file_path.absolute().as_uri(),
+                            uri=location.absolute().as_uri(),
                             app_info=get_app_metadata(config, config['filename']),
-                            valid_data=GeoPolygon.from_sources_extents(sources, tile.geobox))
+                            valid_data=GeoPolygon.from_sources_extents(sources, tile.geobox),
+                            bands=driver.band_documents(file_path, labels['time'], output_type.measurements.keys()))
 
     datasets = xr_apply(tile.sources, _make_dataset, dtype='O')  # Store in Dataarray to associate Time -> Dataset
     nudata['dataset'] = datasets_to_doc(datasets)
 
-    write_dataset_to_netcdf(nudata, file_path, global_attributes, variable_params)
+    driver.write_dataset_to_storage(nudata, file_path, global_attributes, variable_params,
+                                    compress_threads=config.get(COMPRESS_THREADS_KEY))
     _LOG.info('Finished task %s', tile_index)
 
     return datasets
@@ -0,0 +1,384 @@
+"""
+Local disk cache of the bytes of remote files, for reading datasets over HTTP.
+
+GDAL reads a remote file with a range request for each piece it needs, and forgets them once the file is
+closed, so loading the same area again fetches the same bytes again. When ``OPTIONS['block_cache_bytes']``
+is set, http(s) URLs are read through a small local HTTP server instead (see :func:`cached_url`), which
+serves ranges out of a cache of fixed size blocks on local disk. Requests are widened to whole blocks, and
+the missing blocks of a request are fetched with one range request, so a GeoTIFF tile or NetCDF chunk is
+always fetched whole, along with its neighbours in the file. The server runs in a child process, as GDAL
+holds on to the Python interpreter while it opens files. It only answers requests carrying a random token
+shared with its parent over a pipe, and only fetches http(s) URLs, so other local users can't use it to read
+files or reach hosts on our behalf.
+
+Blocks are files named after a hash of the URL, the version of the remote file (its ETag or Last-Modified
+header) and the block number. They are written atomically, so processes can share a cache directory.
+The directory must belong to the user and not be writable by anyone else, as its blocks are served as the
+contents of the remote files. The least recently used blocks are deleted once the cache grows past its size.
+"""
+from __future__ import absolute_import, division
+
+import binascii
+import errno
+import getpass
+import hashlib
+import hmac
+import logging
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+
+import cachetools
+
+from datacube.compat import urlparse, quote, unquote, urlopen, Request, HTTPError
+from datacube.compat import BaseHTTPRequestHandler, HTTPServer, ThreadingMixIn
+from datacube.config import OPTIONS
+
+_LOG = logging.getLogger(__name__)
+
+#: Size of the blocks remote files are fetched and cached in
+BLOCK_BYTES = 256 * 1024
+
+#: Seconds to trust the size and version of a remote file for before asking again
+STAT_SECONDS = 60
+
+
+class _Request(Request):
+    def __init__(self, url, method, headers=None):
+        Request.__init__(self, url, headers=headers or {})
+        self._method = method
+
+    def get_method(self):
+        return self._method
+
+
+def _runs(indexes):
+    """
+    Split sorted `indexes` into runs of consecutive numbers
+
+    >>> _runs([1, 2, 3, 7, 9, 10])
+    [[1, 2, 3], [7], [9, 10]]
+    """
+    runs = []
+    for index in indexes:
+        if runs and runs[-1][-1] == index - 1:
+            runs[-1].append(index)
+        else:
+            runs.append([index])
+    return runs
+
+
+def _private_directory(directory):
+    """
+    Create `directory` for only the user to use, or check an existing one is
+
+    :raises IOError: if it belongs to another user, or others can write to it
+    """
+    try:
+        os.makedirs(directory, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    stat = os.stat(directory)
+    if hasattr(os, 'getuid') and stat.st_uid != os.getuid():
+        raise IOError('Block cache directory %s belongs to another user' % directory)
+    if stat.st_mode & 0o022:
+        raise IOError('Block cache directory %s is writable by other users' % directory)
+
+
+class BlockCache(object):
+    """
+    Cache of blocks of remote files in a local directory
+
+    :param str directory: Where to keep the blocks, can be shared between the user's processes
+    :param int max_bytes: Size of the cache. Each process checks it every sixteenth of that written
+    :param int block_bytes: Size of the blocks files are fetched and cached in
+    :raises IOError: if the directory isn't private to the user
+    """
+    def __init__(self, directory, max_bytes, block_bytes=BLOCK_BYTES):
+        self.directory = str(directory)
+        _private_directory(self.directory)
+        self.max_bytes = max_bytes
+        self.block_bytes = block_bytes
+        self._lock = threading.Lock()
+        self._stats = cachetools.TTLCache(maxsize=1024, ttl=STAT_SECONDS)
+        self._written = 0
+
+    def stat(self, url):
+        """
+        Size and version of a remote file
+
+        :raises HTTPError: if the server can't give it
+        """
+        with self._lock:
+            stat = self._stats.get(url)
+        if stat is None:
+            response = urlopen(_Request(url, 'HEAD'), timeout=60)
+            try:
+                headers = response.info()
+                size = int(headers.get('Content-Length'))
+                stat = size, headers.get('ETag') or headers.get('Last-Modified') or str(size)
+            finally:
+                response.close()
+            with self._lock:
+                self._stats[url] = stat
+        return stat
+
+    def read(self, url, start, stop):
+        """
+        Bytes `start` to `stop` of a remote file, or to its end
+
+        :raises IOError: if the server sends fewer bytes than asked for
+        """
+        size, version = self.stat(url)
+        stop = min(stop, size)
+        if start >= stop:
+            return b''
+
+        def block_size(index):
+            # the last block stops at the end of the file
+            return min(self.block_bytes, size - index * self.block_bytes)
+
+        first, last = start // self.block_bytes, (stop - 1) // self.block_bytes
+        blocks = {}
+        for index in range(first, last + 1):
+            data = self._load(self._block_path(url, version, index))
+            if data is not None and len(data) == block_size(index):
+                blocks[index] = data
+
+        for run in _runs([index for index in range(first, last + 1) if index not in blocks]):
+            offset = run[0] * self.block_bytes
+            data = self._fetch(url, offset, min((run[-1] + 1) * self.block_bytes, size))
+            for index in run:
+                block = data[(index - run[0]) * self.block_bytes:(index - run[0] + 1) * self.block_bytes]
+                if len(block) != block_size(index):
+                    raise IOError('Short read of %s: %d bytes from %d' % (url, len(data), offset))
+                self._store(self._block_path(url, version, index), block)
+                blocks[index] = block
+
+        data = b''.join(blocks[index] for index in range(first, last + 1))
+        return data[start - first * self.block_bytes:stop - first * self.block_bytes]
+
+    def _block_path(self, url, version, index):
+        key = hashlib.sha1(('%s\n%s\n%d' % (url, version, index)).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key[:2], key)
+
+    def _fetch(self, url, start, stop):
+        _LOG.debug('fetching %s bytes %d-%d', url, start, stop - 1)
+        response = urlopen(_Request(url, 'GET', {'Range': 'bytes=%d-%d' % (start, stop - 1)}), timeout=60)
+        try:
+            data = response.read()
+            if response.getcode() != 206:
+                # the server ignored the range and sent the whole file
+                data = data[start:stop]
+        finally:
+            response.close()
+        return data
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # reading counts as use, for evicting the least recently used blocks
+            os.utime(path, None)
+        except (IOError, OSError):
+            # not cached, or just evicted by another process
+            return None
+        return data
+
+    def _store(self, path, data):
+        write_atomically(path, data)
+        with self._lock:
+            self._written += len(data)
+            evict = self._written > self.max_bytes // 16
+            if evict:
+                self._written = 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Delete the least recently used blocks until the cache fits in its size"""
+        evict_least_recently_used(self.directory, self.max_bytes)
+
+
+def write_atomically(path, data):
+    """Write the bytes `data` to `path`, so other processes see the whole file or none of it"""
+    try:
+        os.makedirs(os.path.dirname(path))
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    handle, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+    with os.fdopen(handle, 'wb') as f:
+        f.write(data)
+    os.rename(tmp, path)
+
+
+def evict_least_recently_used(directory, max_bytes):
+    """
+    Delete the least recently modified files under `directory` until they add up to `max_bytes` at most
+
+    Files being written by :func:`write_atomically` are left alone.
+    """
+    files = []
+    for parent, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.startswith('.tmp'):
+                continue
+            path = os.path.join(parent, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+_RANGE = re.compile(r'bytes=(\d*)-(\d*)$')
+
+#: Schemes of the URLs read through the cache
+_SCHEMES = ('http', 'https')
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    """Serves the remote file quoted in the request path, out of the server's `BlockCache`"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        self._serve(body=False)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self._serve(body=True)
+
+    def _serve(self, body):
+        cache = self.server.cache
+        token, _, url = self.path.lstrip('/').partition('/')
+        url = unquote(url)
+        if not hmac.compare_digest(token.encode('ascii', 'replace'), self.server.token.encode('ascii')) \
+                or urlparse(url).scheme not in _SCHEMES:
+            self._send_error(403)
+            return
+        try:
+            size, _ = cache.stat(url)
+        except HTTPError as e:
+            self._send_error(e.code)
+            return
+        except Exception:  # pylint: disable=broad-except
+            _LOG.exception('Failed to read %s', url)
+            self._send_error(502)
+            return
+
+        start, stop, status = 0, size, 200
+        match = _RANGE.match(self.headers.get('Range', ''))
+        if match and any(match.groups()):
+            first, last = match.groups()
+            if first:
+                start, stop = int(first), min(int(last) + 1, size) if last else size
+            else:
+                start, stop = max(size - int(last), 0), size
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%d' % size)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+
+        try:
+            data = cache.read(url, start, stop) if body else None
+        except Exception:  # pylint: disable=broad-except
+            _LOG.exception('Failed to read %s', url)
+            self._send_error(502)
+            return
+
+        self.send_response(status)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(stop - start))
+        if status == 206:
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, stop - 1, size))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def _send_error(self, code):
+        self.send_response(code)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        _LOG.debug(format, *args)
+
+
+class _ProxyServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+_PROXIES = {}
+_PROXIES_LOCK = threading.Lock()
+
+
+def _default_directory():
+    user = os.getuid() if hasattr(os, 'getuid') else getpass.getuser()
+    return os.path.join(tempfile.gettempdir(), 'datacube-block-cache-%s' % user)
+
+
+def _proxy_address(directory, max_bytes):
+    """Port and token of the block cache server for `directory`, started on first use"""
+    with _PROXIES_LOCK:
+        process = _PROXIES.get((directory, max_bytes))
+        if process is None or process.poll() is not None:
+            # checked here too, to fail in the caller rather than in the server
+            _private_directory(directory)
+            # it exits when its stdin is closed, ie. with this process
+            process = subprocess.Popen([sys.executable, '-m', __name__, directory, str(max_bytes)],
+                                       stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            # sent over the pipe rather than the command line, where other users could see it
+            process.token = binascii.hexlify(os.urandom(16)).decode('ascii')
+            process.stdin.write(('%s\n' % process.token).encode('ascii'))
+            process.stdin.flush()
+            process.port = int(process.stdout.readline())
+            _PROXIES[(directory, max_bytes)] = process
+    return process.port, process.token
+
+
+def cached_url(url):
+    """
+    URL to read the remote file at `url` from through the block cache
+
+    Other URLs, and all URLs when ``OPTIONS['block_cache_bytes']`` is 0, are returned unchanged.
+    """
+    if not OPTIONS.get('block_cache_bytes') or urlparse(url).scheme not in _SCHEMES:
+        return url
+    port, token = _proxy_address(OPTIONS.get('block_cache_dir') or _default_directory(),
+                                 OPTIONS['block_cache_bytes'])
+    return 'http://127.0.0.1:%d/%s/%s' % (port, token, quote(url, safe=''))
+
+
+def _serve(directory, max_bytes):
+    server = _ProxyServer(('127.0.0.1', 0), _ProxyHandler)
+    server.cache = BlockCache(directory, max_bytes)
+    server.token = sys.stdin.readline().strip()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    sys.stdout.write('%d\n' % server.server_address[1])
+    sys.stdout.flush()
+    sys.stdin.read()
+
+
+if __name__ == '__main__':
+    _serve(sys.argv[1], int(sys.argv[2]))
@@ -0,0 +1,139 @@
+"""
+Compress NetCDF chunks concurrently, and write them straight into the file.
+
+NetCDF compresses each chunk with zlib in the writing thread, one chunk at a time. Compressing the chunks
+in a pool of threads instead, and then writing them in order, gives the same file: the same chunking,
+shuffle filter and compression level, readable by anything that reads NetCDF.
+
+Requires the optional `h5py` package, version 2.10 or later, to write the compressed chunks.
+"""
+from __future__ import absolute_import
+
+import itertools
+import zlib
+
+import numpy
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+
+def _can_check_chunks():
+    """Whether h5py can tell what is stored for a chunk, to check the chunks written"""
+    return any(hasattr(h5py.h5d.DatasetID, method) for method in ('get_chunk_info_by_coord', 'read_direct_chunk'))
+
+
+def can_precompress(variable):
+    """
+    Whether the chunks of a NetCDF variable can be compressed outside of the NetCDF library
+
+    :param netCDF4.Variable variable:
+    """
+    if h5py is None or not _can_check_chunks() or not variable.group().data_model.startswith('NETCDF4'):
+        return False
+    if variable.chunking() == 'contiguous' or numpy.dtype(variable.dtype).kind not in 'iuf':
+        return False
+    filters = variable.filters() or {}
+    return bool(filters.get('zlib')) and not filters.get('fletcher32')
+
+
+def compress_chunk(data, shuffle, complevel):
+    """
+    Apply the HDF5 shuffle and deflate filters to a chunk
+
+    >>> zlib.decompress(compress_chunk(numpy.array([1, 2], dtype='<i2'), True, 4)) == b'\\x01\\x02\\x00\\x00'
+    True
+
+    :param numpy.ndarray data: the whole chunk
+    :param bool shuffle: whether to group the bytes by significance first, like the HDF5 shuffle filter
+    :param int complevel: zlib compression level
+    :rtype: bytes
+    """
+    data = numpy.ascontiguousarray(data)
+    if shuffle and data.dtype.itemsize > 1:
+        data = data.view('u1').reshape((-1, data.dtype.itemsize)).T
+    return zlib.compress(data.tobytes(), complevel)
+
+
+def open_file(filename, mode='r+'):
+    """Open a closed NetCDF4 file for writing chunks into, with :class:`ChunkWriter`"""
+    return h5py.File(str(filename), mode)
+
+
+def _stored_chunk_size(dataset_id, offset):
+    """Compressed size of the chunk at `offset` in the file, or None if it isn't stored"""
+    try:
+        if hasattr(dataset_id, 'get_chunk_info_by_coord'):
+            info = dataset_id.get_chunk_info_by_coord(offset)
+            return None if info.byte_offset is None else info.size
+        return len(dataset_id.read_direct_chunk(offset)[1])
+    except (OSError, RuntimeError, ValueError, KeyError):
+        return None
+
+
+def unwritten(filename, written):
+    """
+    Names of the variables with chunks that aren't in the file as written
+
+    When h5py and netCDF4 each come with their own copy of the HDF5 library, h5py can end up writing
+    chunks through the wrong one, which fails without raising an error. Every chunk is checked when h5py
+    can look up the chunk index, otherwise the first and last chunks of each variable are read back.
+
+    :param dict written: the :attr:`ChunkWriter.written` chunks of each variable
+    """
+    with open_file(filename, 'r') as h5file:
+        failed = []
+        for name, chunks in written.items():
+            dataset_id = h5file[name].id
+            offsets = sorted(chunks)
+            if not hasattr(dataset_id, 'get_chunk_info_by_coord'):
+                offsets = offsets[:1] + offsets[-1:]
+            if any(_stored_chunk_size(dataset_id, offset) != chunks[offset] for offset in offsets):
+                failed.append(name)
+        return failed
+
+
+class ChunkWriter(object):
+    """
+    Write blocks of whole chunks into a variable, compressing the chunks concurrently
+
+    :param h5py.Dataset dataset: The variable, as opened with :func:`open_file`
+    :param executor: Task executor to compress the chunks with, eg. :func:`datacube.executor.get_thread_executor`
+    """
+    def __init__(self, dataset, executor):
+        if dataset.compression != 'gzip' or dataset.fletcher32 or dataset.scaleoffset is not None:
+            raise ValueError('Unsupported filters on %s' % dataset.name)
+        self.dataset = dataset
+        self.executor = executor
+        self.chunks = dataset.chunks
+        self.shuffle = bool(dataset.shuffle)
+        self.complevel = dataset.compression_opts
+        #: Compressed size of each chunk written so far, by chunk offset
+        self.written = {}
+
+    def write(self, block, values):
+        """
+        Write `values` into `block`, a tuple of slices starting on chunk boundaries,
+        and ending on chunk boundaries or the edge of the variable
+        """
+        values = numpy.asarray(values, dtype=self.dataset.dtype)
+        offsets = list(itertools.product(*[range(index.start, index.stop, size)
+                                           for index, size in zip(block, self.chunks)]))
+
+        def compress(offset):
+            chunk = values[tuple(slice(start - index.start, start - index.start + size)
+                                 for start, index, size in zip(offset, block, self.chunks))]
+            if chunk.shape != self.chunks:
+                # edge chunks are stored whole
+                padded = numpy.full(self.chunks, self.dataset.fillvalue, dtype=chunk.dtype)
+                padded[tuple(slice(0, size) for size in chunk.shape)] = chunk
+                chunk = padded
+            return compress_chunk(chunk, self.shuffle, self.complevel)
+
+        futures = [self.executor.submit(compress, offset) for offset in offsets]
+        for offset, future in zip(offsets, futures):
+            chunk = self.executor.result(future)
+            self.dataset.id.write_direct_chunk(offset, chunk)
+            self.written[offset] = len(chunk)
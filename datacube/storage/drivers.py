@@ -0,0 +1,374 @@
+"""
+Storage drivers, for writing ingested data into storage units, and for reading the bands of datasets.
+
+An ingestion configuration picks a writer driver by name with ``storage: driver:``, see `WRITER_DRIVERS`.
+The driver's `format` is recorded in the output product, so the data is read back the right way.
+
+Datasets are read by the read driver registered for their format and the scheme of their URL, see
+`READ_DRIVER_FORMATS`, or the one a product picks by name with ``storage: read_driver:``, see `READ_DRIVERS`.
+GDAL reads everything else.
+"""
+from __future__ import absolute_import
+
+import os
+from pathlib import Path
+
+import numpy
+import rasterio
+from rasterio.enums import Resampling
+from pandas import to_datetime
+
+from datacube.compat import string_types
+from datacube.storage import storage
+from datacube.storage.storage import write_dataset_to_netcdf, NetCDFDataSource
+from datacube.storage.zarr_storage import write_dataset_to_zarr, append_dataset_to_zarr
+from datacube.storage.zarr_storage import open_storage_unit, ZarrDataSource
+from datacube.utils import uri_to_local_path
+
+try:
+    from rasterio.shutil import copy as _rasterio_copy
+except ImportError:
+    from rasterio import copy as _rasterio_copy
+
+DEFAULT_WRITER_DRIVER = 'NetCDF CF'
+
+
+def _spatial_variables(dataset):
+    """Names of the variables of `dataset` with the spatial dimensions"""
+    dims = tuple(dataset.crs.dimensions)
+    return [name for name, variable in dataset.data_vars.items() if tuple(variable.dims[-2:]) == dims]
+
+
+class WriterDriver(object):
+    """
+    Writes Data Cube style xarray Datasets, with a time slice per dataset, into storage units
+    """
+    #: Format of the storage units written, recorded in the ``format`` of the output product
+    format = None
+
+    #: Whether time slices can be added to an existing storage unit with :meth:`append_dataset_to_storage`
+    can_append = False
+
+    def dataset_location(self, filename, time, band_names):
+        """
+        File recorded as the location of the dataset for one time slice of a storage unit
+
+        :param filename: The storage unit
+        :param time: The time of the slice
+        :param band_names: Names of the bands
+        :rtype: pathlib.Path
+        """
+        return Path(filename)
+
+    def band_documents(self, filename, time, band_names):
+        """
+        ``image: bands:`` document of the dataset for one time slice of a storage unit
+
+        :param filename: The storage unit, band paths are relative to its :meth:`dataset_location`
+        :param time: The time of the slice
+        :param band_names: Names of the bands
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def write_dataset_to_storage(self, dataset, filename, global_attributes=None, variable_params=None,
+                                 **kwargs):
+        """
+        Write a storage unit
+
+        :param xarray.Dataset dataset: Data to write, with a ``time`` dimension
+        :param filename: The storage unit, must not exist yet
+        :param dict global_attributes: Global attributes of the storage unit
+        :param dict variable_params: Per variable storage parameters, eg. ``chunksizes``, ``zlib`` and ``complevel``
+        """
+        raise NotImplementedError
+
+    def append_dataset_to_storage(self, dataset, filename, **kwargs):
+        """
+        Add later time slices to an existing storage unit, without rewriting it
+
+        :param xarray.Dataset dataset: Data to write, with a ``time`` dimension
+        :param filename: The storage unit
+        """
+        raise NotImplementedError
+
+
+class NetCDFWriterDriver(WriterDriver):
+    """A NetCDF file per storage unit, with a variable per band, see :func:`write_dataset_to_netcdf`"""
+    format = 'NetCDF'
+
+    def band_documents(self, filename, time, band_names):
+        return {name: {'path': '', 'layer': name} for name in band_names}
+
+    def write_dataset_to_storage(self, dataset, filename, global_attributes=None, variable_params=None,
+                                 **kwargs):
+        write_dataset_to_netcdf(dataset, filename, global_attributes, variable_params, **kwargs)
+
+
+def _tile_size(size, length):
+    """
+    GeoTIFF tiles are multiples of 16 pixels, round chunk sizes up to one
+
+    >>> _tile_size(200, 4000), _tile_size(256, 4000), _tile_size(200, 100)
+    (208, 256, 112)
+    """
+    return 16 * int(-(-min(size, length) // 16))
+
+
+def _overview_levels(shape, tile_shape):
+    """
+    Decimation factors of the overviews, halving the resolution until the image fits in a tile
+
+    >>> _overview_levels((4000, 4000), (256, 256))
+    [2, 4, 8, 16]
+    >>> _overview_levels((100, 100), (256, 256))
+    []
+    """
+    levels = []
+    factor = 2
+    while any(size > tile * factor // 2 for size, tile in zip(shape, tile_shape)):
+        levels.append(factor)
+        factor *= 2
+    return levels
+
+
+class COGWriterDriver(WriterDriver):
+    """
+    A Cloud Optimized GeoTIFF per band and time slice of a storage unit
+
+    Files are named after the storage unit, the time and the band, eg. ``<unit>_20170101000000000000_red.tif``,
+    and sit beside where the storage unit would be. The file of the first band is the location of the dataset,
+    so it exists on disk, and the other bands are found beside it. They are tiled like the ``chunksizes`` of the band
+    (rounded up to multiples of 16 pixels), have overviews down to a single tile, and are compressed with
+    ``DEFLATE`` across all CPUs when the band has ``zlib`` set.
+    """
+    format = 'GeoTIFF'
+
+    #: Resampling used for the overviews
+    overview_resampling = 'nearest'
+
+    @staticmethod
+    def _band_filename(filename, time, band_name):
+        filename = Path(filename)
+        time = to_datetime(time).strftime('%Y%m%d%H%M%S%f')
+        return filename.parent / ('%s_%s_%s.tif' % (filename.stem, time, band_name))
+
+    def dataset_location(self, filename, time, band_names):
+        return self._band_filename(filename, time, next(iter(band_names)))
+
+    def band_documents(self, filename, time, band_names):
+        return {name: {'path': self._band_filename(filename, time, name).name, 'layer': 1} for name in band_names}
+
+    def write_dataset_to_storage(self, dataset, filename, global_attributes=None, variable_params=None,
+                                 **kwargs):
+        global_attributes = global_attributes or {}
+        variable_params = variable_params or {}
+        try:
+            Path(filename).parent.mkdir(parents=True)
+        except OSError:
+            pass
+
+        for name in _spatial_variables(dataset):
+            variable = dataset[name]
+            params = variable_params.get(name, {})
+            for index, time in enumerate(dataset.time.values):
+                band_filename = self._band_filename(filename, time, name)
+                if band_filename.exists():
+                    raise RuntimeError('Storage Unit already exists: %s' % band_filename)
+                self._write_cog(band_filename, variable.isel(time=index), dataset, params, global_attributes)
+
+    def _write_cog(self, filename, data, dataset, params, global_attributes):
+        height, width = data.shape
+        chunksizes = params.get('chunksizes') or (1, 256, 256)
+        tile_shape = (_tile_size(chunksizes[-2], height), _tile_size(chunksizes[-1], width))
+        tiling = {'tiled': True, 'blockysize': tile_shape[0], 'blockxsize': tile_shape[1]}
+        compression = {}
+        if params.get('zlib'):
+            compression = {'compress': 'deflate', 'zlevel': params.get('complevel', 4), 'num_threads': 'ALL_CPUS'}
+            if data.dtype.kind in 'iu':
+                compression['predictor'] = 2
+
+        # overviews go before the full resolution data in a COG, so they are built in a scratch file first
+        scratch = str(filename) + '.tmp'
+        try:
+            with rasterio.open(scratch, 'w', driver='GTiff', width=width, height=height, count=1,
+                               dtype=str(data.dtype), crs=dataset.crs.crs_str, transform=dataset.affine,
+                               nodata=data.attrs.get('nodata'), **tiling) as tmp:
+                tmp.write(numpy.asarray(data.values), 1)
+                tmp.update_tags(**{key: str(value) for key, value in global_attributes.items()})
+                if 'units' in data.attrs:
+                    tmp.update_tags(1, units=str(data.attrs['units']))
+                levels = _overview_levels((height, width), tile_shape)
+                if levels:
+                    tmp.build_overviews(levels, getattr(Resampling, self.overview_resampling))
+            _rasterio_copy(scratch, str(filename), driver='GTiff', copy_src_overviews=True,
+                           **dict(tiling, **compression))
+        finally:
+            if os.path.exists(scratch):
+                os.remove(scratch)
+
+
+class ZarrWriterDriver(WriterDriver):
+    """
+    A Zarr directory per storage unit, with an array per band, see :func:`write_dataset_to_zarr`
+
+    Chunks are written in parallel without a lock, and time slices can be appended.
+    """
+    format = 'Zarr'
+    can_append = True
+
+    def band_documents(self, filename, time, band_names):
+        return {name: {'path': '', 'layer': name} for name in band_names}
+
+    def write_dataset_to_storage(self, dataset, filename, global_attributes=None, variable_params=None,
+                                 **kwargs):
+        write_dataset_to_zarr(dataset, filename, global_attributes, variable_params, **kwargs)
+
+    def append_dataset_to_storage(self, dataset, filename, **kwargs):
+        append_dataset_to_zarr(dataset, filename, **kwargs)
+
+
+WRITER_DRIVERS = {
+    'NetCDF CF': NetCDFWriterDriver,
+    'NetCDF': NetCDFWriterDriver,
+    'COG': COGWriterDriver,
+    'Zarr': ZarrWriterDriver,
+}
+
+
+def writer_driver(name):
+    """
+    Storage driver by name, see `WRITER_DRIVERS`
+
+    :param str name: Name of the driver, or None for NetCDF
+    :rtype: WriterDriver
+    """
+    if name is None:
+        name = DEFAULT_WRITER_DRIVER
+    if not isinstance(name, string_types) or name not in WRITER_DRIVERS:
+        raise ValueError('Unknown storage driver %r, expected one of: %s' % (name, ', '.join(sorted(WRITER_DRIVERS))))
+    return WRITER_DRIVERS[name]()
+
+
+class ReadDriver(object):
+    """
+    Reads the bands of datasets, for :class:`datacube.storage.storage.DatasetSource`
+
+    The band data sources it returns have ``crs``, ``transform``, ``dtype``, ``shape``, ``nodata``,
+    ``chunking`` (the native chunk shape, or None), ``overviews``,
+    ``read(window=None, out_shape=None, resampling=None, out=None)`` and
+    ``reproject(dest, dst_transform, dst_crs, dst_nodata, resampling, **kwargs)``.
+    """
+    def filename(self, url, fmt, layer):
+        """
+        What to open for a band
+
+        :param str url: URL of the file
+        :param str fmt: Format of the dataset
+        :param layer: Name or number of the band in the file
+        """
+        return str(uri_to_local_path(url))
+
+    def open(self, filename):
+        """Context manager which returns the open file, shared by the bands read from it"""
+        raise NotImplementedError
+
+    def band_data_source(self, src, source):
+        """
+        The band of `source` in the open file `src`
+
+        :param DatasetSource source:
+        """
+        raise NotImplementedError
+
+
+class GDALReadDriver(ReadDriver):
+    """Reads any format GDAL can, from local files or URLs, through rasterio"""
+    def filename(self, url, fmt, layer):
+        return storage._url2rasterio(url, fmt, layer)  # pylint: disable=protected-access
+
+    def open(self, filename):
+        return storage._RASTERIO_FILES.open(filename)  # pylint: disable=protected-access
+
+    def band_data_source(self, src, source):
+        return storage._rasterio_band_data_source(src, source)  # pylint: disable=protected-access
+
+
+class NetCDFReadDriver(ReadDriver):
+    """
+    Reads local NetCDF files with netCDF4, a time slice of a variable at a time
+
+    Like GDAL, it falls back to the CRS and transform of the dataset for files without a CF grid mapping
+    or coordinate variables.
+    """
+    def open(self, filename):
+        return storage._NETCDF_FILES.open(filename)  # pylint: disable=protected-access
+
+    def band_data_source(self, src, source):
+        with storage._NETCDF_LOCK:  # pylint: disable=protected-access
+            variable = src[source.layer]
+            slab = {}
+            if 'time' in variable.dimensions:
+                slab['time'] = source.get_bandnumber(src) - 1
+            nodata = variable.getncattr('_FillValue') if '_FillValue' in variable.ncattrs() else source.nodata
+            grid_mapping = variable.getncattr('grid_mapping') if 'grid_mapping' in variable.ncattrs() else None
+            has_crs = grid_mapping in src.variables and 'crs_wkt' in src[grid_mapping].ncattrs()
+            band = NetCDFDataSource(src, source.layer, slab=slab, nodata=variable.dtype.type(nodata),
+                                    crs=None if has_crs else source.get_crs())
+            if not all(dim in src.variables for dim in band.spatial_dimensions):
+                band.transform = source.get_transform(band.shape)
+            return band
+
+
+class ZarrReadDriver(ReadDriver):
+    """Reads Zarr storage units, see :mod:`datacube.storage.zarr_storage`"""
+    def open(self, filename):
+        return open_storage_unit(filename)
+
+    def band_data_source(self, src, source):
+        return ZarrDataSource(src, source.layer, time=source.center_time, nodata=source.nodata)
+
+
+DEFAULT_READ_DRIVER = 'GDAL'
+
+READ_DRIVERS = {
+    'GDAL': GDALReadDriver,
+    'NetCDF': NetCDFReadDriver,
+    'Zarr': ZarrReadDriver,
+}
+
+#: Read driver for datasets by (lower case format, URL scheme), a scheme of None matches any scheme
+READ_DRIVER_FORMATS = {
+    ('netcdf', 'file'): 'NetCDF',
+    ('zarr', 'file'): 'Zarr',
+}
+
+
+def register_read_driver(name, driver_class, formats=(), schemes=(None,)):
+    """
+    Add a read driver, and make it the one for datasets of `formats` at URLs of `schemes`
+
+    :param str name: Name products pick the driver by
+    :param type driver_class: Subclass of :class:`ReadDriver`
+    :param formats: Dataset formats read by the driver by default
+    :param schemes: URL schemes it reads them from, or None for any
+    """
+    READ_DRIVERS[name] = driver_class
+    for fmt in formats:
+        for scheme in schemes:
+            READ_DRIVER_FORMATS[(fmt.lower(), scheme)] = name
+
+
+def read_driver(fmt, scheme, name=None):
+    """
+    Read driver for datasets of format `fmt` at URLs of `scheme`, see `READ_DRIVER_FORMATS`
+
+    :param str name: Name of the driver to use instead, see `READ_DRIVERS`
+    :rtype: ReadDriver
+    """
+    if name is None:
+        fmt = (fmt or '').lower()
+        name = READ_DRIVER_FORMATS.get((fmt, scheme), READ_DRIVER_FORMATS.get((fmt, None), DEFAULT_READ_DRIVER))
+    if not isinstance(name, string_types) or name not in READ_DRIVERS:
+        raise ValueError('Unknown read driver %r, expected one of: %s' % (name, ', '.join(sorted(READ_DRIVERS))))
+    return READ_DRIVERS[name]()
@@ -0,0 +1,258 @@
+"""
+Built-in fusers, for combining the data of several sources (eg. scenes grouped by solar day) into one array.
+
+A fuser can be asked for by name wherever a `fuse_func` is accepted, see `FUSERS` for the available names.
+Every fuser works incrementally, one source at a time, keeping at most a couple of extra arrays,
+or on a whole stack of sources at once with `reduce`.
+"""
+from __future__ import absolute_import, division
+
+import numpy
+
+from datacube.compat import string_types
+
+
+def _nodata_mask(data, nodata):
+    """
+    Mask of the pixels in `data` that are `nodata`, which may be NaN
+
+    >>> _nodata_mask(numpy.array([1, 0, 2]), 0).tolist()
+    [False, True, False]
+    >>> _nodata_mask(numpy.array([1.0, numpy.nan]), numpy.nan).tolist()
+    [False, True]
+    """
+    if numpy.isnan(nodata):
+        return numpy.isnan(data)
+    return data == nodata
+
+
+def _pick(stack, index):
+    """For every pixel, the value of the source at `index`"""
+    flat = stack.reshape((stack.shape[0], -1))
+    return flat[index.ravel(), numpy.arange(index.size)].reshape(index.shape)
+
+
+class Fuser(object):
+    """
+    Fuses the data of several sources into one array, ignoring `nodata` pixels
+
+    Create one per destination array, since some fusers keep state between calls.
+    Pixels with no valid data in any source are left as `nodata`.
+    """
+    #: Whether valid pixels are never changed by later sources, so reading can stop once every pixel is valid
+    stop_when_covered = False
+
+    #: Whether fusing into an all `nodata` array just copies the source, so the first source can be read in place
+    copies_into_empty = True
+
+    def __init__(self, nodata):
+        self.nodata = nodata
+
+    def __call__(self, dest, src):
+        self.fuse(dest, src)
+
+    def fuse(self, dest, src):
+        """
+        Fuse `src` into `dest`, which holds the result of the sources fused so far
+
+        :type dest: numpy.ndarray
+        :type src: numpy.ndarray
+        """
+        raise NotImplementedError
+
+    def reduce(self, stack):
+        """
+        Fuse a whole stack of sources at once
+
+        :param numpy.ndarray stack: the data of each source, stacked along the first axis
+        :rtype: numpy.ndarray
+        """
+        result = numpy.full(stack.shape[1:], self.nodata, dtype=stack.dtype)
+        for src in stack:
+            self.fuse(result, src)
+        return result
+
+
+class FirstValidFuser(Fuser):
+    """Take the value of the first source with valid data"""
+    stop_when_covered = True
+
+    def fuse(self, dest, src):
+        numpy.copyto(dest, src, where=_nodata_mask(dest, self.nodata))
+
+    def reduce(self, stack):
+        return _pick(stack, (~_nodata_mask(stack, self.nodata)).argmax(axis=0))
+
+
+class LastValidFuser(Fuser):
+    """Take the value of the last source with valid data"""
+    def fuse(self, dest, src):
+        numpy.copyto(dest, src, where=~_nodata_mask(src, self.nodata))
+
+    def reduce(self, stack):
+        last = (~_nodata_mask(stack[::-1], self.nodata)).argmax(axis=0)
+        return _pick(stack, stack.shape[0] - 1 - last)
+
+
+class _ExtremeFuser(Fuser):
+    ufunc = None
+
+    def fuse(self, dest, src):
+        valid = ~_nodata_mask(src, self.nodata)
+        take = _nodata_mask(dest, self.nodata)
+        take |= self.ufunc(src, dest) == src
+        take &= valid
+        numpy.copyto(dest, src, where=take)
+
+    def reduce(self, stack):
+        valid = ~_nodata_mask(stack, self.nodata)
+        if stack.dtype.kind == 'f':
+            identity = numpy.inf if self.ufunc is numpy.minimum else -numpy.inf
+        else:
+            info = numpy.iinfo(stack.dtype)
+            identity = info.max if self.ufunc is numpy.minimum else info.min
+        result = self.ufunc.reduce(numpy.where(valid, stack, identity), axis=0).astype(stack.dtype)
+        result[~valid.any(axis=0)] = self.nodata
+        return result
+
+
+class MinFuser(_ExtremeFuser):
+    """Take the smallest valid value"""
+    ufunc = numpy.minimum
+
+
+class MaxFuser(_ExtremeFuser):
+    """Take the largest valid value"""
+    ufunc = numpy.maximum
+
+
+class MeanFuser(Fuser):
+    """
+    Take the mean of the valid values, rounded for integer data
+
+    Keeps a running sum and count of the valid values.
+    """
+    def __init__(self, nodata):
+        super(MeanFuser, self).__init__(nodata)
+        self._sum = None
+        self._count = None
+
+    def fuse(self, dest, src):
+        if self._sum is None:
+            # `dest` may already hold the first source
+            valid = ~_nodata_mask(dest, self.nodata)
+            self._sum = numpy.where(valid, dest, 0).astype('float64')
+            self._count = valid.astype('uint32')
+        valid = ~_nodata_mask(src, self.nodata)
+        numpy.add(self._sum, src, out=self._sum, where=valid)
+        self._count += valid
+        self._store(dest, self._sum, self._count)
+
+    def reduce(self, stack):
+        valid = ~_nodata_mask(stack, self.nodata)
+        result = numpy.full(stack.shape[1:], self.nodata, dtype=stack.dtype)
+        self._store(result, numpy.where(valid, stack, 0).sum(axis=0, dtype='float64'), valid.sum(axis=0))
+        return result
+
+    @staticmethod
+    def _store(dest, total, count):
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+        if dest.dtype.kind != 'f':
+            mean = numpy.round(mean)
+        numpy.copyto(dest, mean, where=count > 0, casting='unsafe')
+
+
+class _BitwiseFuser(Fuser):
+    ufunc = None
+
+    def fuse(self, dest, src):
+        valid = ~_nodata_mask(src, self.nodata)
+        empty = _nodata_mask(dest, self.nodata)
+        numpy.copyto(dest, self.ufunc(dest, src), where=valid & ~empty)
+        numpy.copyto(dest, src, where=valid & empty)
+
+    def reduce(self, stack):
+        valid = ~_nodata_mask(stack, self.nodata)
+        identity = numpy.array(-1 if self.ufunc is numpy.bitwise_and else 0).astype(stack.dtype)
+        result = self.ufunc.reduce(numpy.where(valid, stack, identity), axis=0)
+        result[~valid.any(axis=0)] = self.nodata
+        return result
+
+
+class BitwiseAndFuser(_BitwiseFuser):
+    """Combine the valid values with bitwise AND, eg. to keep only the quality bits set in every source"""
+    ufunc = numpy.bitwise_and
+
+
+class BitwiseOrFuser(_BitwiseFuser):
+    """Combine the valid values with bitwise OR"""
+    ufunc = numpy.bitwise_or
+
+
+class GAPixelQualityFuser(Fuser):
+    """
+    Fuse Geoscience Australia Pixel Quality data, like :func:`datacube.helpers.ga_pq_fuser`
+
+    Pixels are valid when their contiguity bit (bit 8) is set, and valid pixels are combined with bitwise AND.
+    """
+    valid_val = 1 << 8
+
+    @property
+    def copies_into_empty(self):
+        """Only when `nodata` has the contiguity bit clear, otherwise an empty destination is ANDed into"""
+        return self.nodata is not None and not int(self.nodata) & self.valid_val
+
+    def fuse(self, dest, src):
+        dest_valid = (dest & self.valid_val).astype(bool)
+        both_valid = dest_valid & (src & self.valid_val).astype(bool)
+        numpy.copyto(dest, src, where=~dest_valid)
+        numpy.bitwise_and(dest, src, out=dest, where=both_valid)
+
+    def reduce(self, stack):
+        valid = (stack & self.valid_val).astype(bool)
+        identity = numpy.array(-1).astype(stack.dtype)
+        result = numpy.bitwise_and.reduce(numpy.where(valid, stack, identity), axis=0)
+        none_valid = ~valid.any(axis=0)
+        result[none_valid] = stack[-1][none_valid]
+        return result
+
+
+class _CallbackFuser(Fuser):
+    """A `fuse_func(dest, src)` function"""
+    copies_into_empty = False
+
+    def __init__(self, nodata, fuse_func):
+        super(_CallbackFuser, self).__init__(nodata)
+        self.fuse = fuse_func
+
+
+FUSERS = {
+    'first': FirstValidFuser,
+    'copy': FirstValidFuser,
+    'last': LastValidFuser,
+    'min': MinFuser,
+    'max': MaxFuser,
+    'mean': MeanFuser,
+    'and': BitwiseAndFuser,
+    'or': BitwiseOrFuser,
+    'ga_pq': GAPixelQualityFuser,
+}
+
+
+def make_fuser(fuse_func, nodata):
+    """
+    Fuser for one destination array
+
+    :param fuse_func: name of a built-in fuser (see `FUSERS`), a `fuse_func(dest, src)` function,
+        or None for the default, which takes the first valid value
+    :param nodata: nodata value of the destination
+    :rtype: Fuser
+    """
+    if fuse_func is None:
+        fuse_func = 'first'
+    if isinstance(fuse_func, string_types):
+        if fuse_func not in FUSERS:
+            raise ValueError('Unknown fuser %r, expected one of: %s' % (fuse_func, ', '.join(sorted(FUSERS))))
+        return FUSERS[fuse_func](nodata)
+    return _CallbackFuser(nodata, fuse_func)
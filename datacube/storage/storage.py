@@ -5,14 +5,21 @@ Create/store dataset data into storage units based on the provided storage mappi
 from __future__ import absolute_import, division, print_function
 
 import math
+import itertools
 import logging
+import os
+import re
+import threading
+from collections import deque
 from contextlib import contextmanager
 from pathlib import Path
 
-from datacube.storage import netcdf_writer
+from datacube.storage import netcdf_writer, chunk_compression, block_cache
+from datacube.storage.fusers import make_fuser, _nodata_mask
 from datacube.config import OPTIONS
+from datacube.executor import get_thread_executor
 from datacube.utils import clamp, data_resolution_and_offset, datetime_to_seconds_since_1970, DatacubeException
-from datacube.utils import is_url, uri_to_local_path
+from datacube.utils import is_url, uri_to_local_path, cached_property
 from datacube.utils import geometry
 from datacube.compat import urlparse, urljoin
 
@@ -20,6 +27,9 @@ try:
     from yaml import CSafeDumper as SafeDumper
 except ImportError:
     from yaml import SafeDumper
+import cachetools
+import dask.array
+import netCDF4
 import numpy
 
 from affine import Affine
@@ -45,9 +55,23 @@ RESAMPLING_METHODS = {
 }
 
 assert str(rasterio.__version__) >= '0.34.0', "rasterio version 0.34.0 or higher is required"
-GDAL_NETCDF_DIM = ('NETCDF_DIM_'
-                   if str(rasterio.__gdal_version__) >= '1.10.0' else
-                   'NETCDF_DIMENSION_')
+
+
+if hasattr(rasterio, 'Env'):
+    _GdalEnvironment = rasterio.Env
+else:
+    _GdalEnvironment = rasterio.drivers
+
+
+# Source pixels needed on each side of a destination pixel, before accounting for downsampling
+_RESAMPLING_RADIUS = {
+    Resampling.nearest: 1,
+    Resampling.bilinear: 1,
+    Resampling.cubic: 2,
+    Resampling.cubic_spline: 2,
+    Resampling.lanczos: 3,
+    Resampling.average: 1,
+}
 
 
 def _rasterio_resampling_method(resampling):
@@ -68,6 +92,11 @@ else:
     def _rasterio_transform(src):
         return src.affine
 
+# rasterio < 1.0 can't ask GDAL to resample while reading, or warp several bands at once
+_READ_RESAMPLING = (Resampling.average, Resampling.bilinear) if str(rasterio.__version__) >= '1.0' else ()
+_MULTIBAND_REPROJECT = str(rasterio.__version__) >= '1.0'
+_READ_INTO = str(rasterio.__version__) >= '1.0'
+
 
 def _calc_offsets_impl(off, scale, src_size, dst_size):
     assert scale >= 1-1e-5
@@ -101,22 +130,173 @@ def _calc_offsets2(off, scale, src_size, dst_size):
         return _calc_offsets_impl(off, scale, src_size, dst_size)
 
 
-def _read_decimated(array_transform, src, dest_shape):
+def _decimated_offsets(array_transform, src_shape, dest_shape):
     dy_dx = (array_transform.f, array_transform.c)
     sy_sx = (array_transform.e, array_transform.a)
-    read, write, read_shape, write_shape = zip(*map(_calc_offsets2, dy_dx, sy_sx, src.shape, dest_shape))
+    return zip(*map(_calc_offsets2, dy_dx, sy_sx, src_shape, dest_shape))
+
+
+def _read_decimated(array_transform, src, dest_shape, resampling=None):
+    sy_sx = (array_transform.e, array_transform.a)
+    read, write, read_shape, write_shape = _decimated_offsets(array_transform, src.shape, dest_shape)
     if all(write_shape):
         window = ((read[0], read[0] + read_shape[0]), (read[1], read[1] + read_shape[1]))
-        tmp = src.read(window=window, out_shape=write_shape)
+        if resampling is None:
+            tmp = src.read(window=window, out_shape=write_shape)
+        else:
+            tmp = src.read(window=window, out_shape=write_shape, resampling=resampling)
         scale = (read_shape[0]/write_shape[0] if sy_sx[0] > 0 else -read_shape[0]/write_shape[0],
                  read_shape[1]/write_shape[1] if sy_sx[1] > 0 else -read_shape[1]/write_shape[1])
         offset = (read[0] + (0 if sy_sx[0] > 0 else read_shape[0]),
                   read[1] + (0 if sy_sx[1] > 0 else read_shape[1]))
         transform = Affine(scale[1], 0, offset[1], 0, scale[0], offset[0])
-        return tmp[::(-1 if sy_sx[0] < 0 else 1), ::(-1 if sy_sx[1] < 0 else 1)], write, transform
+        return tmp[..., ::(-1 if sy_sx[0] < 0 else 1), ::(-1 if sy_sx[1] < 0 else 1)], write, transform
     return None, None, None
 
 
+def _read_direct(array_transform, src, dest, dst_nodata):
+    """
+    Read a 1:1 window of `src` straight into `dest`, without a temporary array
+
+    Flips are done by reading into a reversed view of `dest`, and `src.nodata` pixels are
+    replaced by `dst_nodata` in place.
+
+    :return: False, leaving `dest` alone, if rounding the window edges makes the read and write shapes differ
+    """
+    read, write, read_shape, write_shape = _decimated_offsets(array_transform, src.shape, dest.shape[-2:])
+    if tuple(read_shape) != tuple(write_shape):
+        return False
+    if tuple(write_shape) != dest.shape[-2:]:
+        dest.fill(dst_nodata)
+    if not all(write_shape):
+        return True
+    window = ((read[0], read[0] + read_shape[0]), (read[1], read[1] + read_shape[1]))
+    out = dest[..., write[0]:write[0] + write_shape[0], write[1]:write[1] + write_shape[1]]
+    out = out[..., ::(-1 if array_transform.e < 0 else 1), ::(-1 if array_transform.a < 0 else 1)]
+    src.read(window=window, out=out)
+    if not numpy.all(src.nodata == dst_nodata):
+        numpy.copyto(out, dst_nodata, where=(out == src.nodata))
+    return True
+
+
+def _source_window(source, dst_shape, dst_transform, dst_crs, resampling):
+    """
+    Pixel window of `source` that covers the destination grid, padded for `resampling`.
+
+    :return: window as ((row_start, row_stop), (col_start, col_stop)), or None if the destination doesn't
+             overlap `source`, and the number of source pixels per destination pixel
+    """
+    segment = 16 * max(abs(dst_transform.a), abs(dst_transform.e))
+    dst_poly = geometry.polygon_from_transform(dst_shape[1], dst_shape[0], dst_transform, geometry.CRS(dst_crs))
+    # overridden sources can have their CRS as a string
+    src_crs = source.crs if isinstance(source.crs, geometry.CRS) else geometry.CRS(str(source.crs))
+    bbox = dst_poly.to_crs(src_crs, resolution=segment).boundingbox
+
+    inverse = ~source.transform
+    cols, rows = zip(*[inverse * (x, y) for x in (bbox.left, bbox.right) for y in (bbox.bottom, bbox.top)])
+    if not numpy.isfinite(cols + rows).all():
+        return ((0, source.shape[0]), (0, source.shape[1])), 1.0
+
+    # downsampling widens the resampling kernel in source pixels
+    scale = max(1.0, (max(rows) - min(rows)) / dst_shape[0], (max(cols) - min(cols)) / dst_shape[1])
+    margin = int(math.ceil(_RESAMPLING_RADIUS.get(resampling, 3) * scale)) + 1
+
+    row_start = clamp(int(math.floor(min(rows))) - margin, 0, source.shape[0])
+    row_stop = clamp(int(math.ceil(max(rows))) + margin, 0, source.shape[0])
+    col_start = clamp(int(math.floor(min(cols))) - margin, 0, source.shape[1])
+    col_stop = clamp(int(math.ceil(max(cols))) + margin, 0, source.shape[1])
+    if row_start >= row_stop or col_start >= col_stop:
+        return None, scale
+    return ((row_start, row_stop), (col_start, col_stop)), scale
+
+
+def _overview_factor(source, scale):
+    """
+    Decimation factor of the coarsest overview of `source` that is still at least as fine as `scale`.
+    """
+    return max([1] + [factor for factor in getattr(source, 'overviews', None) or [] if factor <= scale])
+
+
+def _reproject_window(source, dest, dst_transform, dst_crs, dst_nodata, resampling, **kwargs):
+    """
+    Read only the part of `source` covering `dest` and warp it into `dest`.
+
+    When `dest` is much coarser than `source`, the window is read from the closest overview.
+    """
+    window, scale = _source_window(source, dest.shape[-2:], dst_transform, dst_crs, resampling)
+    if window is None:
+        dest.fill(dst_nodata)
+        return
+
+    (row_start, row_stop), (col_start, col_stop) = window
+    factor = _overview_factor(source, scale)
+    if factor > 1:
+        out_shape = (int(math.ceil((row_stop - row_start) / factor)), int(math.ceil((col_stop - col_start) / factor)))
+        data = source.read(window=window, out_shape=out_shape)
+    else:
+        data = source.read(window=window)
+    src_transform = (source.transform * Affine.translation(col_start, row_start) *
+                     Affine.scale((col_stop - col_start) / data.shape[-1], (row_stop - row_start) / data.shape[-2]))
+
+    if (resampling == Resampling.nearest and OPTIONS.get('reproject_map_cache_bytes') and
+            numpy.can_cast(data.dtype, dest.dtype)):
+        index = _reproject_map(data.shape[-2:], src_transform, str(source.crs),
+                               dest.shape[-2:], dst_transform, str(dst_crs), **kwargs)
+        values = data.reshape(data.shape[:-2] + (-1,))[..., numpy.maximum(index, 0).ravel()].reshape(dest.shape)
+        dest[...] = values
+        numpy.copyto(dest, dst_nodata, where=(index < 0) | _nodata_mask(values, source.nodata))
+        return
+
+    return rasterio.warp.reproject(data,
+                                   dest,
+                                   src_transform=src_transform,
+                                   src_crs=str(source.crs),
+                                   src_nodata=source.nodata,
+                                   dst_transform=dst_transform,
+                                   dst_crs=str(dst_crs),
+                                   dst_nodata=dst_nodata,
+                                   resampling=resampling,
+                                   **kwargs)
+
+
+_REPROJECT_MAPS = cachetools.LRUCache(maxsize=0)
+_REPROJECT_MAPS_LOCK = threading.Lock()
+
+
+def _reproject_map(src_shape, src_transform, src_crs, dst_shape, dst_transform, dst_crs, **kwargs):
+    """
+    Nearest neighbour reprojection between two grids, as the flat source index of each destination pixel
+
+    Destination pixels outside the source are -1. Maps are kept in an LRU cache of
+    ``OPTIONS['reproject_map_cache_bytes']``.
+    """
+    global _REPROJECT_MAPS  # pylint: disable=global-statement
+    key = (tuple(src_shape), tuple(src_transform)[:6], src_crs, tuple(dst_shape), tuple(dst_transform)[:6], dst_crs)
+    with _REPROJECT_MAPS_LOCK:
+        max_bytes = OPTIONS.get('reproject_map_cache_bytes', 0)
+        if _REPROJECT_MAPS.maxsize != max_bytes:
+            _REPROJECT_MAPS = cachetools.LRUCache(maxsize=max_bytes, getsizeof=lambda index: index.nbytes)
+        index = _REPROJECT_MAPS.get(key)
+    if index is not None:
+        return index
+
+    index = numpy.empty(dst_shape, dtype='int32')
+    rasterio.warp.reproject(numpy.arange(src_shape[0] * src_shape[1], dtype='int32').reshape(src_shape),
+                            index,
+                            src_transform=src_transform,
+                            src_crs=src_crs,
+                            src_nodata=-1,
+                            dst_transform=dst_transform,
+                            dst_crs=dst_crs,
+                            dst_nodata=-1,
+                            resampling=Resampling.nearest,
+                            **kwargs)
+    with _REPROJECT_MAPS_LOCK:
+        if index.nbytes <= _REPROJECT_MAPS.maxsize:
+            _REPROJECT_MAPS[key] = index
+    return index
+
+
 def _no_scale(affine, eps=1e-5):
     return abs(abs(affine.a) - 1.0) < eps and abs(abs(affine.e) - 1.0) < eps
 
@@ -125,6 +305,10 @@ def _no_fractional_translate(affine, eps=0.01):
     return abs(affine.c % 1.0) < eps and abs(affine.f % 1.0) < eps
 
 
+def _is_downsample(affine, eps=1e-5):
+    return abs(affine.b) < eps and abs(affine.d) < eps and abs(affine.a) > 1 + eps and abs(affine.e) > 1 + eps
+
+
 def read_from_source(source, dest, dst_transform, dst_nodata, dst_projection, resampling):
     """
     Read from `source` into `dest`, reprojecting if necessary.
@@ -133,26 +317,52 @@ def read_from_source(source, dest, dst_transform, dst_nodata, dst_projection, re
     :param numpy.ndarray dest: Data destination
     """
     with source.open() as src:
-        array_transform = ~src.transform * dst_transform
-        # if the CRS is the same use decimated reads if possible (NN or 1:1 scaling)
-        if src.crs == dst_projection and _no_scale(array_transform) and (resampling == Resampling.nearest or
-                                                                         _no_fractional_translate(array_transform)):
-            dest.fill(dst_nodata)
-            tmp, offset, _ = _read_decimated(array_transform, src, dest.shape)
-            if tmp is None:
-                return
-            dest = dest[offset[0]:offset[0] + tmp.shape[0], offset[1]:offset[1] + tmp.shape[1]]
-            numpy.copyto(dest, tmp, where=(tmp != src.nodata))
-        else:
-            if dest.dtype == numpy.dtype('int8'):
-                dest = dest.view(dtype='uint8')
-                dst_nodata = dst_nodata.astype('uint8')
-            src.reproject(dest,
-                          dst_transform=dst_transform,
-                          dst_crs=str(dst_projection),
-                          dst_nodata=dst_nodata,
-                          resampling=resampling,
-                          NUM_THREADS=OPTIONS['reproject_threads'])
+        _read_into(src, dest, dst_transform, dst_nodata, dst_projection, resampling)
+
+
+def read_bands_from_source(sources, dest, dst_transform, dst_nodata, dst_projection, resampling):
+    """
+    Read several bands of one file into `dest` with a single open, reprojecting if necessary.
+
+    :param List[BaseRasterDataSource] sources: Data sources for bands of the same file, one per band of `dest`
+    :param numpy.ndarray dest: 3D data destination, bands first
+    """
+    with _open_bands(sources) as bands:
+        _read_into(_MultiBandDataSource(bands), dest, dst_transform, dst_nodata, dst_projection, resampling)
+
+
+def _read_into(src, dest, dst_transform, dst_nodata, dst_projection, resampling):
+    array_transform = ~src.transform * dst_transform
+    # if the CRS is the same use decimated reads if possible (NN or 1:1 scaling)
+    if src.crs == dst_projection and _no_scale(array_transform) and (resampling == Resampling.nearest or
+                                                                     _no_fractional_translate(array_transform)):
+        read_resampling = None
+    # same CRS but coarser: let GDAL resample from the file's overviews while reading
+    elif (src.crs == dst_projection and resampling in _READ_RESAMPLING and _is_downsample(array_transform) and
+          getattr(src, 'overviews', None)):
+        read_resampling = resampling
+    else:
+        if dest.dtype == numpy.dtype('int8'):
+            dest = dest.view(dtype='uint8')
+            dst_nodata = dst_nodata.astype('uint8')
+        src.reproject(dest,
+                      dst_transform=dst_transform,
+                      dst_crs=str(dst_projection),
+                      dst_nodata=dst_nodata,
+                      resampling=resampling,
+                      NUM_THREADS=OPTIONS['reproject_threads'])
+        return
+
+    if _READ_INTO and read_resampling is None and src.dtype == dest.dtype and \
+            _read_direct(array_transform, src, dest, dst_nodata):
+        return
+
+    dest.fill(dst_nodata)
+    tmp, offset, _ = _read_decimated(array_transform, src, dest.shape[-2:], resampling=read_resampling)
+    if tmp is None:
+        return
+    dest = dest[..., offset[0]:offset[0] + tmp.shape[-2], offset[1]:offset[1] + tmp.shape[-1]]
+    numpy.copyto(dest, tmp, where=(tmp != src.nodata))
 
 
 @contextmanager
@@ -167,44 +377,164 @@ def ignore_if(ignore_errors):
         yield
 
 
+_SOURCE_READ_POOLS = {}
+_SOURCE_READ_POOLS_LOCK = threading.Lock()
+
+
+def _source_read_pool(threads):
+    """
+    Thread pool shared by all concurrent source reads with the same number of threads
+
+    :return: `concurrent.futures.ThreadPoolExecutor` or None if it isn't available
+    """
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+    except ImportError:
+        return None
+
+    with _SOURCE_READ_POOLS_LOCK:
+        if threads not in _SOURCE_READ_POOLS:
+            _SOURCE_READ_POOLS[threads] = ThreadPoolExecutor(threads)
+        return _SOURCE_READ_POOLS[threads]
+
+
+def _fuse_concurrently(pool, sources, destination, read, fuse_func, num_buffers, is_done=lambda: False):
+    """
+    Read `sources` in `pool`, fusing them into `destination` in source order
+
+    At most `num_buffers` sources are read ahead of the one being fused.
+
+    :param read: function(source, buffer) returning False if the read was skipped
+    :param is_done: function returning True once no more sources need to be read
+    """
+    free = [numpy.empty(destination.shape, dtype=destination.dtype)
+            for _ in range(min(num_buffers, len(sources)))]
+    pending = deque()
+
+    def fuse_next():
+        buffer_, future = pending.popleft()
+        if future.result():
+            fuse_func(destination, buffer_)
+        return buffer_
+
+    for source in sources:
+        if free:
+            buffer_ = free.pop()
+        else:
+            buffer_ = fuse_next()
+            if is_done():
+                break
+        pending.append((buffer_, pool.submit(read, source, buffer_)))
+    else:
+        while pending:
+            fuse_next()
+            if is_done():
+                break
+
+    for _, future in pending:
+        future.cancel()
+
+
 def reproject_and_fuse(sources, destination, dst_transform, dst_projection, dst_nodata,
-                       resampling='nearest', fuse_func=None, skip_broken_datasets=False):
+                       resampling='nearest', fuse_func=None, skip_broken_datasets=False, stop_when_covered=None):
     """
     Reproject and fuse `sources` into a 2D numpy array `destination`.
 
     :param List[BaseRasterDataSource] sources: Data sources to open and read from
     :param numpy.ndarray destination: ndarray of appropriate size to read data into
     :type resampling: str
-    :type fuse_func: callable or None
+    :param fuse_func: Name of a built-in fuser (see :data:`datacube.storage.fusers.FUSERS`),
+        a function(dest, src) fusing `src` into `dest` in place, or None to take the first valid value.
+    :type fuse_func: str or callable or None
     :param bool skip_broken_datasets: Carry on in the face of adversity and failing reads.
+    :param bool stop_when_covered: Stop reading sources once `destination` has no `dst_nodata` pixels left.
+        Defaults to True for fusers that can't change valid pixels, like the default, and False otherwise.
     """
     assert len(destination.shape) == 2
+    return _fuse_sources(read_from_source, sources, destination, dst_transform, dst_projection, dst_nodata,
+                         resampling, fuse_func, skip_broken_datasets, stop_when_covered)
+
+
+def reproject_and_fuse_bands(sources, destination, dst_transform, dst_projection, dst_nodata,
+                             resampling='nearest', fuse_func=None, skip_broken_datasets=False,
+                             stop_when_covered=None):
+    """
+    Reproject and fuse several bands at once into a 3D numpy array `destination`, bands first.
+
+    Each file is opened once and its bands are read (or warped) together.
+
+    :param List[List[BaseRasterDataSource]] sources: For each input, the data sources of its bands, in the order
+        of `destination`. The bands of an input must all be in the same file and have the same data type.
 
+    See :func:`reproject_and_fuse` for the other parameters.
+    """
+    assert len(destination.shape) == 3
+    return _fuse_sources(read_bands_from_source, sources, destination, dst_transform, dst_projection, dst_nodata,
+                         resampling, fuse_func, skip_broken_datasets, stop_when_covered)
+
+
+def _fuse_sources(read_func, sources, destination, dst_transform, dst_projection, dst_nodata,
+                  resampling, fuse_func, skip_broken_datasets, stop_when_covered):
+    with _gdal_environment():
+        return _fuse_sources_in_environment(read_func, sources, destination, dst_transform, dst_projection,
+                                            dst_nodata, resampling, fuse_func, skip_broken_datasets,
+                                            stop_when_covered)
+
+
+def _fuse_sources_in_environment(read_func, sources, destination, dst_transform, dst_projection, dst_nodata,
+                                 resampling, fuse_func, skip_broken_datasets, stop_when_covered):
     resampling = _rasterio_resampling_method(resampling)
 
-    def copyto_fuser(dest, src):
-        """
-        :type dest: numpy.ndarray
-        :type src: numpy.ndarray
-        """
-        numpy.copyto(dest, src, where=(dest == dst_nodata))
+    fuser = make_fuser(fuse_func, dst_nodata)
+    if stop_when_covered is None:
+        stop_when_covered = fuser.stop_when_covered
 
-    fuse_func = fuse_func or copyto_fuser
+    def is_covered():
+        return stop_when_covered and not _nodata_mask(destination, dst_nodata).any()
 
     destination.fill(dst_nodata)
     if len(sources) == 0:
         return destination
     elif len(sources) == 1:
         with ignore_if(skip_broken_datasets):
-            read_from_source(sources[0], destination, dst_transform, dst_nodata, dst_projection, resampling)
+            read_func(sources[0], destination, dst_transform, dst_nodata, dst_projection, resampling)
         return destination
     else:
         # Muitiple sources, we need to fuse them together into a single array
-        buffer_ = numpy.empty(destination.shape, dtype=destination.dtype)
-        for source in sources:
-            with ignore_if(skip_broken_datasets):
-                read_from_source(source, buffer_, dst_transform, dst_nodata, dst_projection, resampling)
-                fuse_func(destination, buffer_)
+        threads = OPTIONS.get('source_read_threads', 1)
+        pool = _source_read_pool(threads) if threads > 1 else None
+        if pool is None:
+            # built-in fusers just copy into an empty destination, so the first source can be read
+            # straight into it and the buffer is only needed after that
+            untouched = fuser.copies_into_empty
+            buffer_ = None
+            for source in sources:
+                with ignore_if(skip_broken_datasets):
+                    if untouched:
+                        read_func(source, destination, dst_transform, dst_nodata, dst_projection, resampling)
+                        untouched = False
+                    else:
+                        if buffer_ is None:
+                            buffer_ = numpy.empty(destination.shape, dtype=destination.dtype)
+                        read_func(source, buffer_, dst_transform, dst_nodata, dst_projection, resampling)
+                        fuser.fuse(destination, buffer_)
+                if not untouched and is_covered():
+                    break
+            if untouched:
+                # every read failed, don't leave a partial read behind
+                destination.fill(dst_nodata)
+        else:
+            def read(source, buffer_):
+                with _gdal_environment(), ignore_if(skip_broken_datasets):
+                    read_func(source, buffer_, dst_transform, dst_nodata, dst_projection, resampling)
+                    return True
+                return False
+
+            def fuse(dest, buffer_):
+                with ignore_if(skip_broken_datasets):
+                    fuser.fuse(dest, buffer_)
+
+            _fuse_concurrently(pool, sources, destination, read, fuse, threads, is_covered)
 
         return destination
 
@@ -233,82 +563,159 @@ class BandDataSource(object):
     def shape(self):
         return self.source.shape
 
-    def read(self, window=None, out_shape=None):
-        return self.source.ds.read(indexes=self.source.bidx, window=window, out_shape=out_shape)
+    @property
+    def chunking(self):
+        """Shape of the blocks the band is stored in"""
+        return self.source.ds.block_shapes[self.source.bidx - 1]
+
+    @property
+    def overviews(self):
+        return self.source.ds.overviews(self.source.bidx)
+
+    def read(self, window=None, out_shape=None, resampling=None, out=None):
+        kwargs = {} if resampling is None else {'resampling': resampling}
+        if out is not None:
+            kwargs['out'] = out
+        return self.source.ds.read(indexes=self.source.bidx, window=window, out_shape=out_shape, **kwargs)
 
     def reproject(self, dest, dst_transform, dst_crs, dst_nodata, resampling, **kwargs):
-        return rasterio.warp.reproject(self.source,
-                                       dest,
-                                       src_nodata=self.nodata,
-                                       dst_transform=dst_transform,
-                                       dst_crs=str(dst_crs),
-                                       dst_nodata=dst_nodata,
-                                       resampling=resampling,
-                                       **kwargs)
+        return _reproject_window(self, dest, dst_transform, dst_crs, dst_nodata, resampling, **kwargs)
+
+
+# netCDF/HDF5 are not thread safe, every call into them has to hold this
+_NETCDF_LOCK = threading.RLock()
 
 
 class NetCDFDataSource(object):
-    def __init__(self, dataset, variable, slab=None, nodata=None):
+    """
+    A variable of an open netCDF4 file, or a slab of it
+
+    :param crs: CRS to use instead of the variable's grid mapping, for files without one
+    :param transform: Transform to use instead of the coordinate variables, for files without them
+    """
+    def __init__(self, dataset, variable, slab=None, nodata=None, crs=None, transform=None):
         self.dataset = dataset
-        self.variable = self.dataset[variable]
         self.slab = slab or {}
-        if nodata is None:
-            nodata = self.variable.getncattr('_FillValue')
+        with _NETCDF_LOCK:
+            self.variable = self.dataset[variable]
+            self.name = self.variable.name
+            self.dimensions = self.variable.dimensions
+            self.dtype = self.variable.dtype
+            if nodata is None:
+                nodata = self.variable.getncattr('_FillValue')
         self.nodata = nodata
+        if crs is not None:
+            self.crs = crs
+        if transform is not None:
+            self.transform = transform
 
-    @property
+    @cached_property
     def crs(self):
-        crs_var_name = self.variable.grid_mapping
-        crs_var = self.dataset[crs_var_name]
-        return geometry.CRS(crs_var.crs_wkt)
+        with _NETCDF_LOCK:
+            crs_var_name = self.variable.grid_mapping
+            crs_var = self.dataset[crs_var_name]
+            crs_wkt = crs_var.crs_wkt
+        return geometry.CRS(crs_wkt)
+
+    @cached_property
+    def spatial_dimensions(self):
+        """Names of the (y, x) dimensions of the variable"""
+        dims = self.crs.dimensions
+        if all(dim in self.dimensions for dim in dims):
+            return dims
+        return self.dimensions[-2:]
 
-    @property
+    @cached_property
     def transform(self):
-        dims = self.crs.dimensions
-        xres, xoff = data_resolution_and_offset(self.dataset[dims[1]])
-        yres, yoff = data_resolution_and_offset(self.dataset[dims[0]])
+        dims = self.spatial_dimensions
+        with _NETCDF_LOCK:
+            xres, xoff = data_resolution_and_offset(self.dataset[dims[1]][:])
+            yres, yoff = data_resolution_and_offset(self.dataset[dims[0]][:])
         return Affine.translation(xoff, yoff) * Affine.scale(xres, yres)
 
-    @property
-    def dtype(self):
-        return self.variable.dtype
+    @cached_property
+    def shape(self):
+        """Spatial (y, x) shape of the variable"""
+        with _NETCDF_LOCK:
+            shape = self.variable.shape
+        return tuple(shape[self.dimensions.index(dim)] for dim in self.spatial_dimensions)
+
+    @cached_property
+    def chunking(self):
+        """Chunk size along each dimension of the variable, or None if it is stored contiguously"""
+        with _NETCDF_LOCK:
+            chunking = self.variable.chunking()
+        return None if chunking == 'contiguous' else chunking
 
     @property
-    def shape(self):
-        return self.variable.shape
+    def overviews(self):
+        return []
 
-    def read(self, window=None, out_shape=None):
-        data = self.variable
+    def read(self, window=None, out_shape=None, resampling=None, out=None):
         if window is None:
-            window = ((0, data.shape[0]), (0, data.shape[1]))
+            window = ((0, self.shape[0]), (0, self.shape[1]))
         data_shape = (window[0][1]-window[0][0]), (window[1][1]-window[1][0])
-        if out_shape is None:
-            out_shape = data_shape
-        xidx = window[0][0] + ((numpy.arange(out_shape[1])+0.5)*(data_shape[1]/out_shape[1])-0.5).round().astype('int')
-        yidx = window[1][0] + ((numpy.arange(out_shape[0])+0.5)*(data_shape[0]/out_shape[0])-0.5).round().astype('int')
-        slab = {self.crs.dimensions[1]: xidx, self.crs.dimensions[0]: yidx}
+        if out_shape is None or tuple(out_shape) == data_shape:
+            # plain hyperslab
+            xidx = slice(*window[1])
+            yidx = slice(*window[0])
+        else:
+            xidx = window[1][0] + ((numpy.arange(out_shape[1])+0.5)*(data_shape[1]/out_shape[1])-0.5).round()
+            yidx = window[0][0] + ((numpy.arange(out_shape[0])+0.5)*(data_shape[0]/out_shape[0])-0.5).round()
+            xidx = xidx.astype('int')
+            yidx = yidx.astype('int')
+        slab = {self.spatial_dimensions[1]: xidx, self.spatial_dimensions[0]: yidx}
         slab.update(self.slab)
-        return data[tuple(slab[d] for d in self.variable.dimensions)]
+        with _NETCDF_LOCK:
+            self._fit_chunk_cache(window)
+            data = self.variable[tuple(slab[d] for d in self.dimensions)]
+        if out is None:
+            return data
+        numpy.copyto(out, data)
+        return out
+
+    def _fit_chunk_cache(self, window):
+        """
+        Make the variable's chunk cache big enough for a row of chunks across `window`
+
+        Decimated reads walk the window a row at a time, so each chunk is decompressed only once.
+        """
+        chunking = self.chunking
+        if chunking is None:
+            return
+        x_chunk = chunking[self.dimensions.index(self.spatial_dimensions[1])]
+        chunks_across = (window[1][1] - window[1][0]) // x_chunk + 2
+        size = chunks_across * int(numpy.prod(chunking)) * self.dtype.itemsize
+        cache_size, nelems, preemption = self.variable.get_var_chunk_cache()
+        if cache_size < size:
+            self.variable.set_var_chunk_cache(size, nelems, preemption)
 
     def reproject(self, dest, dst_transform, dst_crs, dst_nodata, resampling, **kwargs):
-        dst_poly = geometry.polygon_from_transform(dest.shape[1], dest.shape[0],
-                                                   dst_transform, dst_crs).to_crs(self.crs)
-        src_poly = geometry.polygon_from_transform(self.shape[1], self.shape[0],
-                                                   self.transform, self.crs)
-        bounds = dst_poly.intersection(src_poly)
-        geobox = geometry.GeoBox.from_geopolygon(bounds, (self.transform.e, self.transform.a), crs=self.crs)
-        tmp, _, tmp_transform = _read_decimated(~self.transform * geobox.affine, self, geobox.shape)
-
-        return rasterio.warp.reproject(tmp,
-                                       dest,
-                                       src_transform=self.transform * tmp_transform,
-                                       src_crs=str(geobox.crs),
-                                       src_nodata=self.nodata,
-                                       dst_transform=dst_transform,
-                                       dst_crs=str(dst_crs),
-                                       dst_nodata=dst_nodata,
-                                       resampling=resampling,
-                                       **kwargs)
+        return _reproject_window(self, dest, dst_transform, dst_crs, dst_nodata, resampling, **kwargs)
+
+
+def _read_time_slices(sources, window, out_shape):
+    """
+    Read time slices of one stacked NetCDF variable with a single hyperslab read
+
+    :param List[NetCDFDataSource] sources: sources that differ only in their time slab
+    :return: 3D array, one slice per source, or None if `sources` aren't time slices of the same variable
+    """
+    first = sources[0]
+    if not all(isinstance(source, NetCDFDataSource) and source.dataset is first.dataset and
+               source.name == first.name and isinstance(source.slab.get('time'), integer_types) and
+               dict(source.slab, time=None) == dict(first.slab, time=None)
+               for source in sources):
+        return None
+
+    times = [source.slab['time'] for source in sources]
+    unique, inverse = numpy.unique(times, return_inverse=True)
+    stacked = NetCDFDataSource(first.dataset, first.name, slab=dict(first.slab, time=unique.tolist()),
+                               nodata=first.nodata)
+    data = stacked.read(window=window, out_shape=out_shape)
+    if len(unique) == len(times) and (unique == times).all():
+        return data
+    return data[inverse]
 
 
 class OverrideBandDataSource(object):
@@ -326,21 +733,219 @@ class OverrideBandDataSource(object):
     def shape(self):
         return self.source.shape
 
-    def read(self, window=None, out_shape=None):
-        return self.source.ds.read(indexes=self.source.bidx, window=window, out_shape=out_shape)
+    @property
+    def chunking(self):
+        """Shape of the blocks the band is stored in"""
+        return self.source.ds.block_shapes[self.source.bidx - 1]
+
+    @property
+    def overviews(self):
+        return self.source.ds.overviews(self.source.bidx)
+
+    def read(self, window=None, out_shape=None, resampling=None, out=None):
+        kwargs = {} if resampling is None else {'resampling': resampling}
+        if out is not None:
+            kwargs['out'] = out
+        return self.source.ds.read(indexes=self.source.bidx, window=window, out_shape=out_shape, **kwargs)
 
     def reproject(self, dest, dst_transform, dst_crs, dst_nodata, resampling, **kwargs):
-        source = self.read(self.source)  # TODO: read only the part the we care about
-        return rasterio.warp.reproject(source,
-                                       dest,
-                                       src_transform=self.transform,
-                                       src_crs=str(self.crs),
-                                       src_nodata=self.nodata,
-                                       dst_transform=dst_transform,
-                                       dst_crs=str(dst_crs),
-                                       dst_nodata=dst_nodata,
-                                       resampling=resampling,
-                                       **kwargs)
+        return _reproject_window(self, dest, dst_transform, dst_crs, dst_nodata, resampling, **kwargs)
+
+
+class _MultiBandDataSource(object):
+    """
+    Several bands of one open file, read and reprojected together as a 3D array (bands first)
+    """
+    def __init__(self, bands):
+        self.bands = bands
+        first = bands[0]
+        self.crs = first.crs
+        self.transform = first.transform
+        self.shape = first.shape
+        self.dtype = first.dtype
+        nodata = [band.nodata for band in bands]
+        if all(value == nodata[0] or (numpy.isnan(value) and numpy.isnan(nodata[0])) for value in nodata):
+            self.nodata = nodata[0]
+        else:
+            self.nodata = numpy.array(nodata, dtype=self.dtype).reshape((len(bands), 1, 1))
+
+    @property
+    def overviews(self):
+        return self.bands[0].overviews
+
+    def read(self, window=None, out_shape=None, resampling=None, out=None):
+        kwargs = {} if resampling is None else {'resampling': resampling}
+        first = self.bands[0]
+        if not hasattr(first, 'source'):
+            # not a GDAL band, e.g. NetCDF variables or time slices of the same file
+            stacked = _read_time_slices(self.bands, window, out_shape)
+            if stacked is None:
+                stacked = numpy.stack([band.read(window=window, out_shape=out_shape, **kwargs)
+                                       for band in self.bands])
+            if out is None:
+                return stacked
+            numpy.copyto(out, stacked)
+            return out
+        if out_shape is not None:
+            out_shape = (len(self.bands),) + tuple(out_shape)
+        if out is not None:
+            kwargs['out'] = out
+        return first.source.ds.read(indexes=[band.source.bidx for band in self.bands],
+                                    window=window, out_shape=out_shape, **kwargs)
+
+    def reproject(self, dest, dst_transform, dst_crs, dst_nodata, resampling, **kwargs):
+        if _MULTIBAND_REPROJECT and numpy.ndim(self.nodata) == 0:
+            return _reproject_window(self, dest, dst_transform, dst_crs, dst_nodata, resampling, **kwargs)
+        for band, band_dest in zip(self.bands, dest):
+            band.reproject(band_dest, dst_transform, dst_crs, dst_nodata, resampling, **kwargs)
+
+
+_THREAD_LOCAL = threading.local()
+
+
+@contextmanager
+def _gdal_environment():
+    """
+    Context manager which keeps one GDAL environment for all the reads of the current thread within it
+
+    Otherwise rasterio sets up (and tears down) a new environment on every open. Nested uses share the
+    outermost environment, which is left once it exits, so GDAL settings don't leak to the caller.
+    """
+    depth = getattr(_THREAD_LOCAL, 'gdal_env_depth', 0)
+    _THREAD_LOCAL.gdal_env_depth = depth + 1
+    try:
+        if depth:
+            yield
+        else:
+            with _GdalEnvironment():
+                yield
+    finally:
+        _THREAD_LOCAL.gdal_env_depth = depth
+
+
+def _rasterio_open(filename):
+    return rasterio.open(filename)
+
+
+def _file_version(filename):
+    """
+    Inode, modification time and size of a local file, or None for URLs and missing files
+
+    Understands GDAL subdataset names like ``NETCDF:"/path/to/file.nc":variable``.
+
+    >>> _file_version('http://example.com/file.tif') is None
+    True
+    """
+    match = re.match(r'^\w+:"(.+)":', filename)
+    try:
+        stat = os.stat(match.group(1) if match else filename)
+    except (OSError, ValueError):
+        return None
+    return stat.st_ino, stat.st_mtime, stat.st_size
+
+
+class _FileHandleCache(object):
+    """
+    Process-wide pool of open file handles, keyed by filename
+
+    A handle is lent to one reader at a time, so it is never used from two threads at once.
+    Concurrent readers of the same file get their own handles. Idle handles are closed in least
+    recently used order once more than ``OPTIONS['max_open_files']`` files are open. Local files are
+    checked on every open, and handles of files that have since been rewritten or replaced are closed.
+
+    :param opener: function(filename) returning an open handle
+    :param close_lock: Lock to hold while closing handles, for libraries that aren't thread safe
+    """
+    def __init__(self, opener, close_lock=None):
+        self._opener = opener
+        self._close_lock = close_lock
+        self._lock = threading.Lock()
+        #: idle ((filename, version), handle) pairs, least recently used first
+        self._idle = []
+        self._in_use = 0
+
+    @contextmanager
+    def open(self, filename):
+        key = (filename, _file_version(filename))
+        handle = self._take(key)
+        released = False
+        try:
+            yield handle
+            released = True
+        finally:
+            if released:
+                self._give_back(key, handle)
+            else:
+                # something went wrong while it was in use, don't lend it out again
+                self._discard(handle)
+
+    def clear(self):
+        """Close all idle handles"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for _, handle in idle:
+            self._close(handle)
+
+    def _take(self, key):
+        filename = key[0]
+        with self._lock:
+            self._in_use += 1
+            idle, stale = [], []
+            for idle_key, handle in self._idle:
+                (stale if idle_key[0] == filename and idle_key != key else idle).append((idle_key, handle))
+            self._idle = idle
+            for i in range(len(self._idle) - 1, -1, -1):
+                if self._idle[i][0] == key:
+                    handle = self._idle.pop(i)[1]
+                    break
+            else:
+                handle = None
+        for _, stale_handle in stale:
+            self._close(stale_handle)
+        if handle is not None:
+            return handle
+        try:
+            return self._opener(filename)
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+            raise
+
+    def _give_back(self, key, handle):
+        max_open = OPTIONS.get('max_open_files', 0)
+        with self._lock:
+            self._in_use -= 1
+            self._idle.append((key, handle))
+            evicted = []
+            while self._idle and len(self._idle) + self._in_use > max_open:
+                evicted.append(self._idle.pop(0)[1])
+        for old_handle in evicted:
+            self._close(old_handle)
+
+    def _discard(self, handle):
+        with self._lock:
+            self._in_use -= 1
+        self._close(handle)
+
+    def _close(self, handle):
+        if self._close_lock is None:
+            handle.close()
+            return
+        with self._close_lock:
+            handle.close()
+
+
+_RASTERIO_FILES = _FileHandleCache(_rasterio_open)
+
+
+def _netcdf_open(filename):
+    with _NETCDF_LOCK:
+        nco = netCDF4.Dataset(filename)
+        nco.set_auto_maskandscale(False)
+    return nco
+
+
+_NETCDF_FILES = _FileHandleCache(_netcdf_open, close_lock=_NETCDF_LOCK)
 
 
 class BaseRasterDataSource(object):
@@ -363,35 +968,63 @@ class BaseRasterDataSource(object):
     @contextmanager
     def open(self):
         """Context manager which returns a `BandDataSource`"""
-        try:
-            _LOG.debug("opening %s", self.filename)
-            with rasterio.open(self.filename) as src:
-                override = False
+        with _open_bands([self]) as bands:
+            yield bands[0]
+
+    def _open_file(self):
+        """Context manager which returns the open file to read bands from"""
+        return _RASTERIO_FILES.open(self.filename)
+
+    def _band_data_source(self, src):
+        return _rasterio_band_data_source(src, self)
+
+
+def _rasterio_band_data_source(src, source):
+    """
+    The band of `source` in the open rasterio file `src`
+
+    :param BaseRasterDataSource source: gives the band number, and the CRS and transform if the file has none
+    """
+    override = False
 
-                transform = _rasterio_transform(src)
-                if transform.is_identity:
-                    override = True
-                    transform = self.get_transform(src.shape)
+    transform = _rasterio_transform(src)
+    if transform.is_identity:
+        override = True
+        transform = source.get_transform(src.shape)
 
-                try:
-                    crs = geometry.CRS(_rasterio_crs_wkt(src))
-                except ValueError:
-                    override = True
-                    crs = self.get_crs()
+    try:
+        crs = geometry.CRS(_rasterio_crs_wkt(src))
+    except ValueError:
+        override = True
+        crs = source.get_crs()
+
+    bandnumber = source.get_bandnumber(src)
+    band = rasterio.band(src, bandnumber)
+    nodata = numpy.dtype(band.dtype).type(src.nodatavals[0] if src.nodatavals[0] is not None
+                                          else source.nodata)
+
+    if override:
+        return OverrideBandDataSource(band, nodata=nodata, crs=crs, transform=transform)
+    else:
+        return BandDataSource(band, nodata=nodata)
 
-                bandnumber = self.get_bandnumber(src)
-                band = rasterio.band(src, bandnumber)
-                nodata = numpy.dtype(band.dtype).type(src.nodatavals[0] if src.nodatavals[0] is not None
-                                                      else self.nodata)
 
-                if override:
-                    yield OverrideBandDataSource(band, nodata=nodata, crs=crs, transform=transform)
-                else:
-                    yield BandDataSource(band, nodata=nodata)
+@contextmanager
+def _open_bands(sources):
+    """
+    Context manager which returns a `BandDataSource` for each of `sources`, which all share a file
+
+    :param List[BaseRasterDataSource] sources:
+    """
+    filename = sources[0].filename
+    try:
+        _LOG.debug("opening %s", filename)
+        with _gdal_environment(), sources[0]._open_file() as src:  # pylint: disable=protected-access
+            yield [source._band_data_source(src) for source in sources]  # pylint: disable=protected-access
 
-        except Exception as e:
-            _LOG.error("Error opening source dataset: %s", self.filename)
-            raise e
+    except Exception as e:
+        _LOG.error("Error opening source dataset: %s", filename)
+        raise e
 
 
 class RasterFileDataSource(BaseRasterDataSource):
@@ -457,42 +1090,107 @@ def _url2rasterio(url_str, fmt, layer):
             return filename
 
     if url.scheme and url.scheme != 'file':
-        return url_str
+        return block_cache.cached_url(url_str)
 
     # if local path strip scheme and other gunk
     return str(uri_to_local_path(url_str))
 
 
+_NETCDF_TIMES = cachetools.LRUCache(maxsize=1024)
+_NETCDF_TIMES_LOCK = threading.Lock()
+
+
+def _netcdf_times(path):
+    """
+    Time coordinate of a stacked NetCDF file, cached until the file is modified
+
+    :return: (times, bands, variables): sorted raw time values, the band number of each, and the names of the
+             variables along time, or None if there is no time
+    """
+    mtime = os.path.getmtime(path)
+    with _NETCDF_TIMES_LOCK:
+        cached = _NETCDF_TIMES.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with _NETCDF_LOCK, netCDF4.Dataset(path) as nco:
+        if 'time' in nco.variables:
+            times = numpy.asarray(nco.variables['time'][:], dtype='float64')
+            order = numpy.argsort(times, kind='mergesort')
+            variables = frozenset(name for name, variable in nco.variables.items() if 'time' in variable.dimensions)
+            index = times[order], order + 1, variables
+        else:
+            index = None
+
+    with _NETCDF_TIMES_LOCK:
+        _NETCDF_TIMES[path] = (mtime, index)
+    return index
+
+
+def _netcdf_time_band(path, time, variable=None):
+    """
+    Band number of the time slice in a stacked NetCDF file closest to `time` (seconds since 1970)
+
+    Bands at the same distance resolve to the lower band number. Files without time, and variables
+    without a time dimension, have a single band.
+    """
+    index = _netcdf_times(path)
+    if index is None:
+        return 1
+    times, bands, variables = index
+    if variable is not None and variable not in variables:
+        return 1
+
+    i = numpy.searchsorted(times, time)
+    candidates = [j for j in (i - 1, i) if 0 <= j < len(times)]
+    nearest = min(candidates, key=lambda j: (abs(times[j] - time), bands[j]))
+    return int(bands[nearest])
+
+
+def _read_driver_name(product):
+    """Read driver chosen by a product with ``storage: read_driver:``, if any"""
+    definition = getattr(product, 'definition', None)
+    if not isinstance(definition, dict):
+        return None
+    return definition.get('storage', {}).get('read_driver')
+
+
 class DatasetSource(BaseRasterDataSource):
-    """Data source for reading from a Datacube Dataset"""
+    """Data source for reading from a Datacube Dataset
+
+    The band is read by the read driver for the format of the dataset and the scheme of its URL,
+    or the one chosen by its product, see :func:`datacube.storage.drivers.read_driver`.
+    """
     def __init__(self, dataset, measurement_id):
+        from datacube.storage.drivers import read_driver
+
         self._dataset = dataset
         self._measurement = dataset.measurements[measurement_id]
         url = _resolve_url(dataset.local_uri, self._measurement['path'])
-        filename = _url2rasterio(url, dataset.format, self._measurement.get('layer'))
+        self._url = url
+        #: Name of the band in the file, eg. the NetCDF variable
+        self.layer = self._measurement.get('layer', measurement_id)
+        self.driver = read_driver(dataset.format, urlparse(url).scheme, _read_driver_name(dataset.type))
         nodata = dataset.type.measurements[measurement_id].get('nodata')
-        super(DatasetSource, self).__init__(filename, nodata=nodata)
+        super(DatasetSource, self).__init__(self.driver.filename(url, dataset.format, self.layer), nodata=nodata)
+
+    @property
+    def center_time(self):
+        return self._dataset.center_time
+
+    def _open_file(self):
+        return self.driver.open(self.filename)
+
+    def _band_data_source(self, src):
+        return self.driver.band_data_source(src, self)
 
     def get_bandnumber(self, src):
         if 'netcdf' not in self._dataset.format.lower():
             layer_id = self._measurement.get('layer', 1)
             return layer_id if isinstance(layer_id, integer_types) else 1
 
-        tag_name = GDAL_NETCDF_DIM + 'time'
-        if tag_name not in src.tags(1):  # TODO: support time-less datasets properly
-            return 1
-
-        time = self._dataset.center_time
-        sec_since_1970 = datetime_to_seconds_since_1970(time)
-
-        idx = 0
-        dist = float('+inf')
-        for i in range(1, src.count + 1):
-            v = float(src.tags(i)[tag_name])
-            if abs(sec_since_1970 - v) < dist:
-                idx = i
-                dist = abs(sec_since_1970 - v)
-        return idx
+        sec_since_1970 = datetime_to_seconds_since_1970(self._dataset.center_time)
+        return _netcdf_time_band(str(uri_to_local_path(self._url)), sec_since_1970, self.layer)
 
     def get_transform(self, shape):
         return self._dataset.transform * Affine.scale(1/shape[1], 1/shape[0])
@@ -550,7 +1248,7 @@ def create_netcdf_storage_unit(filename,
 
 
 def write_dataset_to_netcdf(dataset, filename, global_attributes=None, variable_params=None,
-                            netcdfparams=None):
+                            netcdfparams=None, compress_threads=None):
     """
     Write a Data Cube style xarray Dataset to a NetCDF file
 
@@ -564,6 +1262,9 @@ def write_dataset_to_netcdf(dataset, filename, global_attributes=None, variable_
                             See the `netCDF4.Dataset.createVariable` for available
                             parameters.
     :param netcdfparams: Optional params affecting netCDF file creation
+    :param int compress_threads: Number of threads to compress the chunks of zlib compressed variables with,
+                                 or 0 for one per CPU. Needs `h5py` for more than one thread.
+                                 Defaults to ``OPTIONS['netcdf_compress_threads']``
     """
     global_attributes = global_attributes or {}
     variable_params = variable_params or {}
@@ -583,7 +1284,137 @@ def write_dataset_to_netcdf(dataset, filename, global_attributes=None, variable_
                                      global_attributes,
                                      netcdfparams)
 
-    for name, variable in dataset.data_vars.items():
-        nco[name][:] = netcdf_writer.netcdfy_data(variable.values)
+    if compress_threads is None:
+        compress_threads = OPTIONS['netcdf_compress_threads']
+    precompress = [name for name in dataset.data_vars
+                   if compress_threads != 1 and chunk_compression.can_precompress(nco[name])]
 
+    _write_variables(nco, dataset, [name for name in dataset.data_vars if name not in precompress])
     nco.close()
+
+    if precompress:
+        # the file is laid out, fill in the chunks of the compressed variables
+        executor = get_thread_executor(compress_threads)
+        written = {}
+        with chunk_compression.open_file(filename) as h5file:
+            for name in precompress:
+                writer = chunk_compression.ChunkWriter(h5file[name], executor)
+                _write_in_blocks(dataset[name].data, writer.chunks, writer.write)
+                written[name] = writer.written
+
+        failed = chunk_compression.unwritten(filename, written)
+        if failed:
+            _LOG.warning('Could not write compressed chunks of %s, writing them through NetCDF', failed)
+            nco = netcdf_writer.append_netcdf(str(filename))
+            _write_variables(nco, dataset, failed)
+            nco.close()
+
+
+def _write_variables(nco, dataset, names):
+    for name in names:
+        variable = dataset[name]
+        if isinstance(variable.data, dask.array.Array):
+            _stream_to_netcdf(nco[name], variable.data)
+        else:
+            nco[name][:] = netcdf_writer.netcdfy_data(variable.values)
+
+
+_WRITE_BLOCK_BYTES = 64 * 1024 ** 2
+
+
+def _write_blocks(shape, chunking, itemsize, block_bytes):
+    """
+    Split `shape` into blocks of whole NetCDF chunks of at most about `block_bytes`,
+    growing them along the last dimensions first
+
+    >>> [tuple((index.start, index.stop) for index in block) for block in _write_blocks((2, 4, 6), (1, 2, 3), 1, 12)]
+    [((0, 1), (0, 2), (0, 6)), ((0, 1), (2, 4), (0, 6)), ((1, 2), (0, 2), (0, 6)), ((1, 2), (2, 4), (0, 6))]
+    """
+    block = list(chunking)
+    for dim in reversed(range(len(shape))):
+        others = itemsize * int(numpy.prod(block[:dim] + block[dim + 1:]))
+        block[dim] = int(min(shape[dim], block[dim] * max(1, block_bytes // (others * block[dim]))))
+        if block[dim] < shape[dim]:
+            break
+    return itertools.product(*[[slice(start, min(start + size, length)) for start in range(0, length, size)]
+                               for length, size in zip(shape, block)])
+
+
+def _lcm(a, b):
+    """
+    Least common multiple
+
+    >>> _lcm(100, 256)
+    6400
+    """
+    x, y = a, b
+    while y:
+        x, y = y, x % y
+    return a * b // x
+
+
+def _aligned_chunking(chunking, data_chunks, shape):
+    """
+    Smallest blocks of whole storage chunks that are also whole dask chunks
+
+    Along dimensions with uneven dask chunks the block is the whole dimension.
+
+    >>> _aligned_chunking((1, 100, 100), ((1, 1), (200, 200, 100), (150, 150, 200)), (2, 500, 500))
+    (1, 200, 500)
+    """
+    aligned = []
+    for size, chunks, length in zip(chunking, data_chunks, shape):
+        if all(chunk == chunks[0] for chunk in chunks[:-1]) and chunks[-1] <= chunks[0]:
+            aligned.append(min(_lcm(size, chunks[0]), length))
+        else:
+            aligned.append(length)
+    return tuple(aligned)
+
+
+def _stream_to_netcdf(variable, data):
+    """
+    Write a dask array into a NetCDF variable a block of chunks at a time
+
+    :param netCDF4.Variable variable: Destination variable
+    :param dask.array.Array data: Data to write
+    """
+    def write(block, values):
+        with _NETCDF_LOCK:
+            variable[block] = netcdf_writer.netcdfy_data(values)
+
+    chunking = variable.chunking()
+    if chunking == 'contiguous':
+        chunking = [1] * data.ndim
+    _write_in_blocks(data, chunking, write)
+
+
+def _write_in_blocks(data, chunking, write):
+    """
+    Call `write(block, values)` for each block of whole chunks of `data`
+
+    The next block is computed in the background while the current one is compressed and written,
+    so at most two blocks are held in memory. Blocks of dask arrays are also made of whole dask chunks,
+    so no dask chunk is computed more than once.
+
+    :param data: Data to write, a :class:`dask.array.Array` or :class:`numpy.ndarray`
+    :param chunking: Chunk shape
+    """
+    if isinstance(data, dask.array.Array):
+        chunking = _aligned_chunking(chunking, data.chunks, data.shape)
+    blocks = list(_write_blocks(data.shape, chunking, data.dtype.itemsize, _WRITE_BLOCK_BYTES))
+    if not blocks:
+        return
+
+    def compute(block):
+        return numpy.asarray(data[block])
+
+    executor = get_thread_executor(1, shared=False)
+    try:
+        pending = executor.submit(compute, blocks[0])
+        for i, block in enumerate(blocks):
+            values = executor.result(pending)
+            if i + 1 < len(blocks):
+                pending = executor.submit(compute, blocks[i + 1])
+            write(block, values)
+    finally:
+        executor.shutdown()
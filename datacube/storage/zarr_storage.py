@@ -0,0 +1,262 @@
+"""
+Zarr storage units: a directory per storage unit, with an array per band chunked like the product's ``chunking``.
+
+Every chunk is a file of its own, so chunks are compressed and written in parallel without a lock, several
+writers can share a filesystem, and time slices can be appended to a storage unit without rewriting it.
+The layout follows the xarray conventions, so storage units can also be opened with :func:`xarray.open_zarr`.
+
+Requires the optional `zarr` package.
+"""
+from __future__ import absolute_import, division
+
+import itertools
+from contextlib import contextmanager
+
+import numpy
+from affine import Affine
+from pathlib import Path
+
+try:
+    import zarr
+    import numcodecs
+except ImportError:
+    zarr = None
+
+from datacube.executor import get_thread_executor
+from datacube.storage import netcdf_writer
+from datacube.storage.storage import _write_in_blocks, _reproject_window
+from datacube.utils import geometry, data_resolution_and_offset, datetime_to_seconds_since_1970, DatacubeException
+from datacube.utils import cached_property
+
+#: Attribute xarray records the dimensions of an array in
+_DIMENSIONS = '_ARRAY_DIMENSIONS'
+
+
+def _require_zarr():
+    if zarr is None:
+        raise DatacubeException('Zarr storage units need the zarr package')
+
+
+def _json_attrs(attrs):
+    """Attributes that can be stored, the CRS is stored once for the storage unit"""
+    return {key: numpy.asarray(value).tolist() if isinstance(value, (numpy.ndarray, numpy.generic)) else value
+            for key, value in attrs.items() if key != 'crs'}
+
+
+def _chunk_slices(block, chunks):
+    """
+    Split `block` into its intersections with the chunks of an array
+
+    >>> [tuple((index.start, index.stop) for index in piece) for piece in _chunk_slices((slice(3, 9),), (4,))]
+    [((3, 4),), ((4, 8),), ((8, 9),)]
+    """
+    def split(index, size):
+        starts = [index.start] + list(range((index.start // size + 1) * size, index.stop, size))
+        return [slice(start, min(stop, index.stop)) for start, stop in zip(starts, starts[1:] + [index.stop])]
+
+    return itertools.product(*[split(index, size) for index, size in zip(block, chunks)])
+
+
+def _write_array(array, data, executor, offset=None):
+    """
+    Write `data` into `array` starting at `offset`, a block of chunks at a time
+
+    Each chunk is compressed and written by one task, so no locking is needed.
+    """
+    offset = offset or (0,) * array.ndim
+
+    def write_piece(piece, values):
+        array[piece] = values
+
+    def write(block, values):
+        block = tuple(slice(index.start + start, index.stop + start) for index, start in zip(block, offset))
+        futures = []
+        for piece in _chunk_slices(block, array.chunks):
+            local = tuple(slice(index.start - outer.start, index.stop - outer.start)
+                          for index, outer in zip(piece, block))
+            futures.append(executor.submit(write_piece, piece, values[local]))
+        executor.results(futures)
+
+    _write_in_blocks(data, array.chunks, write)
+
+
+def _check_dataset(dataset):
+    if not dataset.data_vars.keys():
+        raise DatacubeException('Cannot save empty dataset to disk.')
+    if not hasattr(dataset, 'crs'):
+        raise DatacubeException('Dataset does not contain CRS, cannot write to Zarr storage unit.')
+
+
+def write_dataset_to_zarr(dataset, filename, global_attributes=None, variable_params=None, compress_threads=0):
+    """
+    Write a Data Cube style xarray Dataset to a Zarr storage unit
+
+    Requires a spatial Dataset, with attached coordinates and global crs attribute.
+
+    :param `xarray.Dataset` dataset:
+    :param filename: Output directory
+    :param global_attributes: Global attributes. dict of attr_name: attr_value
+    :param variable_params: dict of variable_name: {param_name: param_value, [...]}
+                            Supports ``chunksizes``, ``zlib`` and ``complevel``, like the NetCDF writer.
+    :param int compress_threads: Number of threads to compress and write chunks with, or 0 for one per CPU
+    """
+    _require_zarr()
+    _check_dataset(dataset)
+    variable_params = variable_params or {}
+    filename = Path(filename)
+    if filename.exists():
+        raise RuntimeError('Storage Unit already exists: %s' % filename)
+
+    group = zarr.open_group(str(filename), mode='w-')
+    group.attrs.update(_json_attrs(global_attributes or {}))
+    group.attrs['crs'] = dataset.crs.crs_str
+
+    for name, coord in dataset.coords.items():
+        array = group.create_dataset(name, data=netcdf_writer.netcdfy_coord(coord.values), chunks=(4096,))
+        array.attrs.update(_json_attrs(coord.attrs))
+        array.attrs[_DIMENSIONS] = [name]
+
+    executor = get_thread_executor(compress_threads or 0)
+    for name, variable in dataset.data_vars.items():
+        params = variable_params.get(name, {})
+        chunks = params.get('chunksizes') or tuple(1 if dim == 'time' else size
+                                                   for dim, size in zip(variable.dims, variable.shape))
+        compressor = numcodecs.Zlib(level=params.get('complevel', 4)) if params.get('zlib') else None
+        if variable.dtype.kind == 'S':
+            # eg. the dataset documents, which can get longer as time slices are appended
+            array = group.create_dataset(name, shape=variable.shape, chunks=tuple(chunks), dtype=object,
+                                         object_codec=numcodecs.VLenBytes(), compressor=compressor)
+        else:
+            array = group.create_dataset(name, shape=variable.shape, chunks=tuple(chunks), dtype=variable.dtype,
+                                         compressor=compressor, fill_value=variable.attrs.get('nodata'))
+        array.attrs.update(_json_attrs(variable.attrs))
+        array.attrs[_DIMENSIONS] = list(variable.dims)
+        _write_array(array, variable.data, executor)
+
+
+def append_dataset_to_zarr(dataset, filename, compress_threads=0):
+    """
+    Append the time slices of a Data Cube style xarray Dataset to a Zarr storage unit
+
+    Only the chunks of the new time slices are written. They are appended in time order, and must all be
+    later than those already in the storage unit, and cover the same area. Appending no time slices does
+    nothing.
+
+    :param `xarray.Dataset` dataset:
+    :param filename: The storage unit, written by :func:`write_dataset_to_zarr`
+    :param int compress_threads: Number of threads to compress and write chunks with, or 0 for one per CPU
+    """
+    _require_zarr()
+    _check_dataset(dataset)
+    group = zarr.open_group(str(filename), mode='r+')
+
+    order = numpy.argsort(dataset.time.values, kind='mergesort')
+    if not (order == numpy.arange(order.size)).all():
+        dataset = dataset.isel(time=order)
+    times = netcdf_writer.netcdfy_coord(dataset.time.values)
+    if not times.size:
+        return
+    if (numpy.diff(times) <= 0).any():
+        raise DatacubeException('Cannot append several time slices with the same time to %s' % filename)
+    stored = group['time']
+    if stored.shape[0] and times[0] <= stored[-1]:
+        raise DatacubeException('Can only append time slices later than those in %s' % filename)
+    for dim in dataset.crs.dimensions:
+        if group[dim].shape != dataset[dim].shape or not numpy.allclose(group[dim][:], dataset[dim].values):
+            raise DatacubeException('Cannot append data for a different area to %s' % filename)
+
+    start = stored.shape[0]
+    executor = get_thread_executor(compress_threads or 0)
+    for name, variable in dataset.data_vars.items():
+        array = group[name]
+        if variable.dims[0] != 'time':
+            raise DatacubeException('Cannot append %s without a time dimension' % name)
+        array.resize((start + variable.shape[0],) + array.shape[1:])
+        _write_array(array, variable.data, executor, offset=(start,) + (0,) * (array.ndim - 1))
+
+    # the time coordinate goes last, so readers never find a time slice that isn't written yet
+    stored.append(times)
+
+
+@contextmanager
+def open_storage_unit(filename):
+    """Context manager which returns the Zarr group of a storage unit"""
+    _require_zarr()
+    yield zarr.open_group(str(filename), mode='r')
+
+
+def _nearest_index(times, time):
+    """
+    Index of the value of the sorted `times` closest to `time`, the earlier one of two as close
+
+    >>> _nearest_index(numpy.array([10., 20., 30.]), 24), _nearest_index(numpy.array([10., 20., 30.]), 25)
+    (1, 1)
+    """
+    i = numpy.searchsorted(times, time)
+    candidates = [j for j in (i - 1, i) if 0 <= j < len(times)]
+    return int(min(candidates, key=lambda j: (abs(times[j] - time), j)))
+
+
+class ZarrDataSource(object):
+    """
+    A band of a Zarr storage unit, for one time slice
+
+    Reads touch only the chunks covering the requested window, and decimated reads only the rows and
+    columns needed from them.
+    """
+    def __init__(self, group, variable, time=None, nodata=None):
+        self.group = group
+        self.array = group[variable]
+        self.dimensions = self.array.attrs[_DIMENSIONS]
+        self.slab = ()
+        if 'time' in self.dimensions:
+            times = group['time'][:]
+            index = 0 if time is None else _nearest_index(times, datetime_to_seconds_since_1970(time))
+            self.slab = (index,)
+        self.nodata = self.array.fill_value if nodata is None else nodata
+
+    @cached_property
+    def crs(self):
+        return geometry.CRS(self.group.attrs['crs'])
+
+    @cached_property
+    def transform(self):
+        ydim, xdim = self.dimensions[-2:]
+        xres, xoff = data_resolution_and_offset(self.group[xdim][:])
+        yres, yoff = data_resolution_and_offset(self.group[ydim][:])
+        return Affine.translation(xoff, yoff) * Affine.scale(xres, yres)
+
+    @property
+    def dtype(self):
+        return self.array.dtype
+
+    @property
+    def shape(self):
+        return self.array.shape[-2:]
+
+    @property
+    def chunking(self):
+        return self.array.chunks
+
+    @property
+    def overviews(self):
+        return []
+
+    def read(self, window=None, out_shape=None, resampling=None, out=None):
+        # decimated reads take the nearest pixels, whatever the resampling
+        if window is None:
+            window = ((0, self.shape[0]), (0, self.shape[1]))
+        data_shape = (window[0][1] - window[0][0]), (window[1][1] - window[1][0])
+        if out_shape is None or tuple(out_shape) == data_shape:
+            data = self.array[self.slab + (slice(*window[0]), slice(*window[1]))]
+        else:
+            yidx = window[0][0] + ((numpy.arange(out_shape[0]) + 0.5) * (data_shape[0] / out_shape[0]) - 0.5).round()
+            xidx = window[1][0] + ((numpy.arange(out_shape[1]) + 0.5) * (data_shape[1] / out_shape[1]) - 0.5).round()
+            data = self.array.get_orthogonal_selection(self.slab + (yidx.astype('int'), xidx.astype('int')))
+        if out is None:
+            return data
+        numpy.copyto(out, data)
+        return out
+
+    def reproject(self, dest, dst_transform, dst_crs, dst_nodata, resampling, **kwargs):
+        return _reproject_window(self, dest, dst_transform, dst_crs, dst_nodata, resampling, **kwargs)
@@ -2,6 +2,7 @@ from __future__ import absolute_import, division
 
 import math
 import functools
+import threading
 from collections import namedtuple, OrderedDict
 
 import cachetools
@@ -46,6 +47,13 @@ class CRSProjProxy(object):
         return self._crs.GetProjParm(item)
 
 
+#: Number of reprojections of each geometry kept for reuse, eg. of the extent of a dataset onto the grids it's loaded on
+_REPROJECTIONS_KEPT = 4
+_REPROJECTIONS_LOCK = threading.Lock()
+
+_THREAD_LOCAL = threading.local()
+
+
 @cachetools.cached({})
 def _make_crs(crs_str):
     crs = osr.SpatialReference()
@@ -203,6 +211,8 @@ class CRS(object):
     def __eq__(self, other):
         if isinstance(other, compat.string_types):
             other = CRS(other)
+        if self.crs_str == other.crs_str:
+            return True
         canonical = lambda crs: set(crs.ExportToProj4().split() + ['+wktext'])
         return canonical(self._crs) == canonical(other._crs)  # pylint: disable=protected-access
 
@@ -275,6 +285,23 @@ def _get_coordinates(geom):
         return [_get_coordinates(geom.GetGeometryRef(i)) for i in range(geom.GetGeometryCount())]
 
 
+def _coordinate_transformation(src_crs, dst_crs):
+    """
+    Transformation from `src_crs` to `dst_crs`, kept for reuse by the current thread
+
+    They are costly to make, and can't be shared between threads.
+    """
+    transforms = getattr(_THREAD_LOCAL, 'transforms', None)
+    if transforms is None:
+        transforms = _THREAD_LOCAL.transforms = cachetools.LRUCache(maxsize=64)
+    key = (src_crs.crs_str, dst_crs.crs_str)
+    transform = transforms.get(key)
+    if transform is None:
+        transform = transforms[key] = osr.CoordinateTransformation(src_crs._crs,  # pylint: disable=protected-access
+                                                                   dst_crs._crs)  # pylint: disable=protected-access
+    return transform
+
+
 def _make_geom_from_ogr(geom, crs):
     result = Geometry.__new__(Geometry)
     result._geom = geom  # pylint: disable=protected-access
@@ -423,18 +450,34 @@ class Geometry(object):
         return _make_geom_from_ogr(self._geom.Simplify(tolerance), self.crs)
 
     def to_crs(self, crs, resolution=None):
+        """
+        The geometry in `crs`, segmented to `resolution` first so straight lines can bend
+
+        The last few reprojections are kept, so asking again for the same CRS is free.
+        """
         if self.crs == crs:
             return self
 
         if resolution is None:
             resolution = 1 if self.crs.geographic else 100000
 
-        transform = osr.CoordinateTransformation(self.crs._crs, crs._crs)  # pylint: disable=protected-access
+        key = (crs.crs_str, resolution)
+        with _REPROJECTIONS_LOCK:
+            reprojections = getattr(self, '_reprojections', None)
+            if reprojections is None:
+                reprojections = self._reprojections = cachetools.LRUCache(maxsize=_REPROJECTIONS_KEPT)
+            reprojected = reprojections.get(key)
+        if reprojected is not None:
+            return reprojected
+
         clone = self._geom.Clone()
         clone.Segmentize(resolution)
-        clone.Transform(transform)
+        clone.Transform(_coordinate_transformation(self.crs, crs))
+        reprojected = _make_geom_from_ogr(clone, crs)
 
-        return _make_geom_from_ogr(clone, crs)  # pylint: disable=protected-access
+        with _REPROJECTIONS_LOCK:
+            reprojections[key] = reprojected
+        return reprojected
 
     def __iter__(self):
         for i in range(self._geom.GetGeometryCount()):
@@ -10,8 +10,6 @@ import os
 from functools import partial
 
 import click
-import dask.array as da
-import dask
 import pandas as pd
 from pandas.tseries.offsets import YearBegin, YearEnd
 from pathlib import Path
@@ -19,8 +17,7 @@ from pathlib import Path
 import datacube
 from datacube.api import Tile
 from datacube.model.utils import make_dataset, xr_apply, datasets_to_doc
-from datacube.storage import netcdf_writer
-from datacube.storage.storage import create_netcdf_storage_unit
+from datacube.storage.drivers import writer_driver
 from datacube.ui import task_app
 from datacube.ui.click import to_pathlib
 
@@ -52,7 +49,7 @@ def _stacked_log_entry(stacked, unstacked):
 
 
 def make_stacker_tasks(index, config, **kwargs):
-    filename_timestamp_pattern = r'\/(?:\w+)_-?\d+_-?\d+_(\d+).nc$'  # TODO: Get from config?
+    filename_timestamp_pattern = r'\/(?:\w+)_-?\d+_-?\d+_(\d+)\.(?:nc|zarr)$'  # TODO: Get from config?
 
     product = config['product']
 
@@ -75,6 +72,8 @@ def make_stacker_tasks(index, config, **kwargs):
                            output_filename=output_filename,
                            global_attributes=config['global_attributes'],
                            variable_params=config['variable_params'],
+                           compress_threads=config.get('compress_threads'),
+                           storage_driver=config['storage'].get('driver'),
                            app_config_file=config['app_config_file']
                           )
 
@@ -141,15 +140,18 @@ def _is_pattern_match(path, pattern):
     return result.groups()[0]
 
 
-def make_datasets(tile, file_path, config):
+def make_datasets(tile, file_path, config, driver):
     def _make_dataset(labels, sources):
+        band_names = tile.product.measurements.keys()
+        location = driver.dataset_location(file_path, labels['time'], band_names)
         new_dataset = make_dataset(product=tile.product,
                                    sources=sources,
                                    extent=tile.geobox.extent,
                                    center_time=labels['time'],
-                                   uri=file_path.absolute().as_uri(),
+                                   uri=location.absolute().as_uri(),
                                    app_info=get_app_metadata(config),
-                                   valid_data=sources[0].extent)
+                                   valid_data=sources[0].extent,
+                                   bands=driver.band_documents(file_path, labels['time'], band_names))
         return new_dataset
 
     return xr_apply(tile.sources, _make_dataset, dtype='O')
@@ -184,8 +186,21 @@ def do_stack_task(task):
     output_filename = Path(task['output_filename'])
     tile = task['tile']
 
+    driver = writer_driver(task.get('storage_driver'))
+    append = driver.can_append and output_filename.exists()
+    if append:
+        # only the time slices that aren't in the storage unit yet are written, the rest is left alone
+        unstacked = [i for i, sources in enumerate(tile.sources.values)
+                     if sources[0].local_path != output_filename.absolute()]
+        if not unstacked:
+            _LOG.info('Nothing to append to %s', output_filename)
+            return [], [], []
+        # appended in time order, the storage driver rejects any earlier than those already stored
+        unstacked.sort(key=lambda i: tile.sources.time.values[i])
+        tile = Tile(sources=tile.sources.isel(time=unstacked), geobox=tile.geobox)
+
     if task.get('make_new_datasets', False):
-        datasets_to_add = make_datasets(tile, output_filename, task)
+        datasets_to_add = make_datasets(tile, output_filename, task, driver)
         datasets_to_archive = xr_apply(tile.sources, _single_dataset, dtype='O')
 
         output_datasets = datasets_to_add
@@ -194,25 +209,16 @@ def do_stack_task(task):
 
         output_datasets = datasets_to_update
 
-    data = datacube.api.GridWorkflow.load(tile, dask_chunks=dict(time=1))  # TODO: chunk along output NetCDF chunk?
+    data = datacube.api.GridWorkflow.load(tile, dask_chunks=dict(time=1))
     data['dataset'] = datasets_to_doc(output_datasets)
 
-    nco = create_netcdf_storage_unit(output_filename,
-                                     data.crs,
-                                     data.coords,
-                                     data.data_vars,
-                                     variable_params,
-                                     global_attributes)
-
-    for name, variable in data.data_vars.items():
-        try:
-            with dask.set_options(get=dask.async.get_sync):
-                da.store(variable.data, nco[name], lock=True)
-        except ValueError:
-            nco[name][:] = netcdf_writer.netcdfy_data(variable.values)
-        nco.sync()
-
-    nco.close()
+    # streams the dask arrays into storage a block of chunks at a time
+    if append:
+        driver.append_dataset_to_storage(data, output_filename, compress_threads=task.get('compress_threads'))
+    else:
+        driver.write_dataset_to_storage(data, output_filename, global_attributes, variable_params,
+                                        compress_threads=task.get('compress_threads'))
+
     return datasets_to_add, datasets_to_update, datasets_to_archive
 
 
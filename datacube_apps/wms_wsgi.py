@@ -21,6 +21,9 @@ from datetime import datetime, timedelta
 import datacube
 from datacube.utils import geometry
 
+#: Memory for caching tiles loaded from the same datasets onto the same grid, eg. when panning back
+CHUNK_CACHE_BYTES = 256 * 1024 ** 2
+
 
 INDEX_TEMPLATE = """<!DOCTYPE html>
 <html>
@@ -176,7 +179,7 @@ class RGBTileGenerator(TileGenerator):
 
         prod = datasets[0].type
         measurements = [self._set_resampling(prod.measurements[name]) for name in self._bands]
-        with datacube.set_options(reproject_threads=1, fast_load=True):
+        with datacube.set_options(reproject_threads=1, fast_load=True, chunk_cache_bytes=CHUNK_CACHE_BYTES):
             return datacube.Datacube.load_data(sources, self._geobox, measurements)
 
     def _set_resampling(self, measurement):
@@ -190,24 +193,25 @@ def _get_datasets(index, geobox, product, time_):
     datasets = index.datasets.search_eager(**query.search_terms)
     datasets.sort(key=lambda d: d.center_time)
     dataset_iter = iter(datasets)
+    extent = geobox.extent
     to_load = []
     for dataset in dataset_iter:
-        if dataset.extent.to_crs(geobox.crs).intersects(geobox.extent):
+        geom = dataset.extent.to_crs(geobox.crs)
+        if geom.intersects(extent):
             to_load.append(dataset)
             break
     else:
         return None
 
-    geom = to_load[0].extent.to_crs(geobox.crs)
     for dataset in dataset_iter:
-        if geom.contains(geobox.extent):
+        if geom.contains(extent):
             break
         ds_extent = dataset.extent.to_crs(geobox.crs)
         if geom.contains(ds_extent):
             continue
-        if ds_extent.intersects(geobox.extent):
+        if ds_extent.intersects(extent):
             to_load.append(dataset)
-            geom = geom.union(dataset.extent.to_crs(geobox.crs))
+            geom = geom.union(ds_extent)
     return to_load
 
 
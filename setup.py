@@ -6,10 +6,11 @@ from setuptools import setup, find_packages
 tests_require = ['pytest', 'pytest-cov', 'mock', 'pep8', 'pylint==1.6.4', 'hypothesis', 'compliance-checker']
 
 extras_require = {
-    'performance': ['ciso8601', 'bottleneck'],
+    'performance': ['ciso8601', 'bottleneck', 'h5py'],
     'interactive': ['matplotlib', 'fiona'],
     'distributed': ['distributed', 'dask[distributed]'],
     'analytics': ['scipy', 'pyparsing', 'numexpr'],
+    'zarr': ['zarr<3'],
     'doc': ['Sphinx', 'setuptools'],
     'test': tests_require,
 }
@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+
+import os
+
+import mock
+import numpy
+from affine import Affine
+
+import datacube
+from datacube.api.chunk_cache import ChunkCache
+from datacube.api.core import _fuse_measurement, fuse_lazy
+from datacube.utils import geometry
+
+CRS = geometry.CRS('EPSG:4326')
+GEOBOX = geometry.GeoBox(10, 10, Affine(0.1, 0, 0, 0, -0.1, 1), CRS)
+MEASUREMENT = {'name': 'band', 'nodata': -1, 'dtype': 'int16'}
+
+
+def _fake_dataset(name):
+    dataset = mock.MagicMock()
+    dataset.id = name
+    dataset.local_uri = 'file:///data/%s.nc' % name
+    dataset.extent = geometry.box(0, 0, 1, 1, crs=CRS)
+    return dataset
+
+
+def _fake_reproject_and_fuse(sources, dest, *args, **kwargs):
+    dest[:] = len(sources) + numpy.arange(dest.size).reshape(dest.shape)
+
+
+def _spilled(directory):
+    return [os.path.join(parent, name) for parent, _, names in os.walk(directory) for name in names]
+
+
+def test_chunk_cache_spills_to_disk(tmpdir):
+    # room for two chunks in memory, and four on disk
+    cache = ChunkCache(max_bytes=1000, directory=str(tmpdir), disk_bytes=2200)
+    arrays = [numpy.full(100, index, dtype='int32') for index in range(4)]
+    for index, array in enumerate(arrays):
+        cache.put('key%d' % index, array)
+    arrays[3][:] = 100
+
+    assert len(_spilled(str(tmpdir))) == 2
+    for index in range(4):
+        cached = cache.get('key%d' % index)
+        assert (cached == index).all()
+        assert not cached.flags.writeable
+    assert cache.get('missing') is None
+
+    for index in range(4, 8):
+        cache.put('key%d' % index, numpy.full(100, index, dtype='int32'))
+    assert sum(os.path.getsize(path) for path in _spilled(str(tmpdir))) <= 2200
+    assert (cache.get('key5') == 5).all()
+    assert cache.get('key0') is None
+
+    memory_only = ChunkCache(max_bytes=1000)
+    for index, array in enumerate(arrays):
+        memory_only.put('key%d' % index, array)
+    assert memory_only.get('key0') is None
+    assert (memory_only.get('key3') == 100).all()
+
+
+def test_fuse_measurement_reuses_cached_chunks():
+    datasets = [_fake_dataset('a'), _fake_dataset('b')]
+
+    def load(geobox=GEOBOX, measurement=MEASUREMENT, fuse_func=None, datasets=datasets, **kwargs):
+        dest = numpy.full(geobox.shape, -1, dtype='int16')
+        _fuse_measurement(dest, datasets, geobox, measurement, fuse_func=fuse_func, **kwargs)
+        return dest
+
+    with mock.patch('datacube.api.core.DatasetSource'), \
+            mock.patch('datacube.api.core.reproject_and_fuse', side_effect=_fake_reproject_and_fuse) as fuse:
+        load()
+        assert fuse.call_count == 1
+        with datacube.set_options(chunk_cache_bytes=10 ** 6):
+            first = load()
+            assert (load() == first).all()
+            assert fuse.call_count == 2
+            assert (fuse_lazy(datasets, GEOBOX, MEASUREMENT, prepend_dims=1)[0] == first).all()
+            assert fuse.call_count == 2
+
+            # anything that changes the pixels is a different chunk
+            load(geobox=GEOBOX[2:8, 2:8])
+            load(measurement=dict(MEASUREMENT, resampling_method='cubic'))
+            load(fuse_func='max')
+            load(datasets=datasets[::-1])
+            assert fuse.call_count == 6
+            load(fuse_func='max')
+            assert fuse.call_count == 6
+
+            # unless the fuser has no stable name, or some datasets might have failed to load
+            load(fuse_func=lambda dest, src: None)
+            load(fuse_func=lambda dest, src: None)
+            load(skip_broken_datasets=True)
+            assert fuse.call_count == 9
@@ -1,7 +1,20 @@
 from datacube.api.query import GroupBy
 
 from datacube import Datacube
+from datacube.api.core import _order_by_overlap, _group_by_file, _plan_reads
+from datacube.api.core import _dataset_footprint, _intersecting, fuse_lazy
+from datacube.storage import storage
+from datacube.storage.storage import write_dataset_to_netcdf
+from datacube.executor import get_thread_executor
+from datacube.utils import geometry
+from affine import Affine
+from pathlib import Path
 import datetime
+import threading
+import time
+import mock
+import numpy
+import xarray
 
 
 def test_grouping_datasets():
@@ -50,3 +63,206 @@ def _group_datasets_by_date(datasets):
 
     group_by = GroupBy(dimension, group_func, units, sort_key)
     return Datacube.group_datasets(datasets, group_by)
+
+
+def test_order_datasets_by_overlap():
+    def fake_dataset(name, overlap):
+        dataset = mock.MagicMock(name=name)
+        dataset.extent.to_crs.return_value.intersection.return_value.area = overlap
+        return dataset
+
+    datasets = [fake_dataset('a', 10), fake_dataset('b', 50), fake_dataset('c', 10), fake_dataset('d', 0)]
+    ordered = _order_by_overlap(datasets, mock.MagicMock())
+
+    assert ordered == [datasets[1], datasets[0], datasets[2], datasets[3]]
+
+
+def test_fuse_lazy_skips_datasets_outside_geobox():
+    crs = geometry.CRS('EPSG:4326')
+    geobox = geometry.GeoBox(10, 10, Affine(0.1, 0, 0, 0, -0.1, 1), crs)
+
+    def fake_dataset(left, bottom):
+        dataset = mock.MagicMock()
+        extent = geometry.box(left, bottom, left + 1, bottom + 1, crs=crs)
+        dataset.extent.to_crs.side_effect = extent.to_crs
+        return dataset
+
+    inside, touching, outside = fake_dataset(0.5, 0.5), fake_dataset(1, 0), fake_dataset(5, 5)
+    measurement = {'name': 'band', 'nodata': -1, 'dtype': 'int16'}
+
+    with mock.patch('datacube.api.core.DatasetSource') as dataset_source, \
+            mock.patch('datacube.api.core.reproject_and_fuse'):
+        fuse_lazy([inside, touching, outside], geobox, measurement)
+
+    assert [call[0][0] for call in dataset_source.call_args_list] == [inside]
+
+
+def test_dataset_footprints():
+    crs = geometry.CRS('EPSG:4326')
+    albers = geometry.CRS('EPSG:3577')
+    geobox = geometry.GeoBox(10, 10, Affine(0.1, 0, 0, 0, -0.1, 1), crs)
+    # not yet indexed, so without ids
+    first = mock.MagicMock(id=None, extent=geometry.box(148, -36, 149, -35, crs=crs))
+    second = mock.MagicMock(id=None, extent=geometry.box(140, -36, 141, -35, crs=crs))
+    no_extent = mock.MagicMock(extent=None)
+
+    # reprojected once per dataset and CRS
+    assert _dataset_footprint(first, albers) is _dataset_footprint(first, albers)
+    assert _dataset_footprint(second, albers) != _dataset_footprint(first, albers)
+
+    assert _dataset_footprint(no_extent, albers) is None
+    assert _intersecting([first, no_extent], geobox) == [no_extent]
+    assert _order_by_overlap([no_extent, first], geobox) == [no_extent, first]
+
+
+def test_group_measurements_by_file():
+    def fake_dataset_source(dataset, name):
+        return mock.MagicMock(filename=dataset[name])
+
+    datasets = [{'red': 'a.tif', 'green': 'a.tif', 'nir': 'a.tif', 'pq': 'a_pq.tif'},
+                {'red': 'b.tif', 'green': 'b.tif', 'nir': 'b.tif', 'pq': 'b_pq.tif'}]
+    measurements = [{'name': 'red', 'dtype': 'int16', 'nodata': -999},
+                    {'name': 'pq', 'dtype': 'int16', 'nodata': -999},
+                    {'name': 'green', 'dtype': 'int16', 'nodata': -999},
+                    {'name': 'nir', 'dtype': 'float32', 'nodata': -999}]
+
+    with mock.patch('datacube.api.core.DatasetSource', side_effect=fake_dataset_source):
+        groups = _group_by_file(datasets, measurements)
+
+    names = [[measurement['name'] for measurement in group] for group, _ in groups]
+    assert names == [['red', 'green'], ['pq'], ['nir']]
+    _, sources = groups[0]
+    filenames = [[source.filename for source in bands] for bands in sources]
+    assert filenames == [['a.tif', 'a.tif'], ['b.tif', 'b.tif']]
+
+
+def test_plan_reads_batches_consecutive_slices_of_one_file():
+    def fake_dataset_source(dataset, name):
+        return mock.MagicMock(filename=dataset)
+
+    intersecting = [('a',), ('a',), ('a',), ('b', 'c'), ('a',), (), ('a',)]
+
+    with mock.patch('datacube.api.core.DatasetSource', side_effect=fake_dataset_source):
+        plan = _plan_reads(intersecting, {'name': 'band'})
+
+    assert [(start, stop, batch is not None) for start, stop, batch in plan] == [(0, 3, True),
+                                                                                 (3, 4, False),
+                                                                                 (4, 5, False),
+                                                                                 (5, 6, False),
+                                                                                 (6, 7, False)]
+    assert [source.filename for source in plan[0][2]] == ['a', 'a', 'a']
+
+
+def test_load_stacked_netcdf_with_one_read(tmpnetcdf_filename):
+    geobox = geometry.GeoBox(30, 20, Affine(0.1, 0, 20, 0, -0.1, -30), geometry.CRS('EPSG:4326'))
+    times = numpy.array(['2016-01-01', '2016-01-17', '2016-02-02', '2016-02-18'], dtype='datetime64[ns]')
+    stacked = xarray.Dataset(attrs={'crs': geobox.crs})
+    stacked['time'] = ('time', times, {'units': 'seconds since 1970-01-01 00:00:00'})
+    for name, coord in geobox.coordinates.items():
+        stacked[name] = (name, coord.values, {'units': coord.units, 'crs': geobox.crs})
+    stacked['band'] = (('time',) + geobox.dimensions,
+                       numpy.arange(4 * 20 * 30, dtype='int16').reshape((4, 20, 30)),
+                       {'nodata': -1, 'units': '1', 'crs': geobox.crs})
+    write_dataset_to_netcdf(stacked, tmpnetcdf_filename)
+
+    def fake_dataset(time):
+        dataset = mock.MagicMock()
+        dataset.format = 'NetCDF'
+        dataset.local_uri = Path(tmpnetcdf_filename).absolute().as_uri()
+        dataset.center_time = time
+        dataset.extent = geobox.extent
+        dataset.measurements = {'band': {'path': '', 'layer': 'band'}}
+        dataset.type.measurements = {'band': {'nodata': -1}}
+        return dataset
+
+    # load the last three time slices, in reverse
+    sources = numpy.empty(3, dtype=object)
+    for i, time in enumerate(times[:0:-1]):
+        sources[i] = (fake_dataset(time.astype('datetime64[us]').item()),)
+    sources = xarray.DataArray(sources, dims=['time'], coords=[times[:0:-1]])
+    measurement = {'name': 'band', 'dtype': 'int16', 'nodata': -1, 'units': '1'}
+
+    storage._NETCDF_FILES.clear()  # pylint: disable=protected-access
+    netcdf_open = storage._NETCDF_FILES._opener  # pylint: disable=protected-access
+    read = storage.NetCDFDataSource.read
+    with mock.patch.object(storage._NETCDF_FILES, '_opener', side_effect=netcdf_open) as opened, \
+            mock.patch.object(storage.NetCDFDataSource, 'read', autospec=True, side_effect=read) as reads:
+        loaded = Datacube.load_data(sources, geobox, [measurement])
+
+    assert opened.call_count == 1
+    assert reads.call_count == 1
+    assert (loaded.band.values == stacked.band.values[:0:-1]).all()
+
+
+def test_load_data_with_workers():
+    geobox = geometry.GeoBox(4, 3, Affine(1, 0, 0, 0, -1, 0), geometry.CRS('EPSG:4326'))
+    sources = numpy.empty(6, dtype=object)
+    for i in range(6):
+        sources[i] = ('a%d' % i, 'b%d' % i)
+    sources = xarray.DataArray(sources, dims=['time'], coords=[numpy.arange(6)])
+    measurements = [{'name': name, 'dtype': 'int16', 'nodata': -1, 'units': '1'} for name in ('red', 'green')]
+
+    threads = set()
+
+    def fake_fuse_measurement(dest, datasets, geobox, measurement, **kwargs):
+        threads.add(threading.current_thread())
+        time.sleep(0.01)
+        dest[:] = int(datasets[0][1:]) + (10 if measurement['name'] == 'green' else 0)
+
+    with mock.patch('datacube.api.core._intersecting', side_effect=lambda datasets, geobox: datasets) as intersecting, \
+            mock.patch('datacube.api.core._fuse_measurement', side_effect=fake_fuse_measurement):
+        serial = Datacube.load_data(sources, geobox, measurements)
+        assert len(threads) == 1
+        threads.clear()
+        concurrent = Datacube.load_data(sources, geobox, measurements, workers=4)
+
+    # datasets are filtered by the geobox once per load, not once per measurement
+    assert intersecting.call_count == 2 * 6
+
+    assert len(threads) > 1
+    assert (serial.red.values[:, 0, 0] == numpy.arange(6)).all()
+    assert (serial.green.values[:, 2, 3] == numpy.arange(10, 16)).all()
+    assert serial.equals(concurrent)
+
+
+def test_load_data_iter_prefetches_into_reused_buffers():
+    geobox = geometry.GeoBox(4, 3, Affine(1, 0, 0, 0, -1, 0), geometry.CRS('EPSG:4326'))
+    sources = numpy.empty(5, dtype=object)
+    for i in range(5):
+        sources[i] = ('a%d' % i, 'b%d' % i)
+    sources = xarray.DataArray(sources, dims=['time'], coords=[numpy.arange(5)])
+    measurements = [{'name': 'red', 'dtype': 'int16', 'nodata': -1, 'units': '1'}]
+
+    second_batch_loaded = threading.Event()
+
+    def fake_fuse_measurement(dest, datasets, geobox, measurement, **kwargs):
+        dest[:] = int(datasets[0][1:])
+        if dest[0, 0] == 3:
+            second_batch_loaded.set()
+
+    executors = []
+
+    def get_executor(*args, **kwargs):
+        executors.append(get_thread_executor(*args, **kwargs))
+        return executors[-1]
+
+    with mock.patch('datacube.api.core._intersecting', side_effect=lambda datasets, geobox: datasets), \
+            mock.patch('datacube.api.core._fuse_measurement', side_effect=fake_fuse_measurement), \
+            mock.patch('datacube.api.core.get_thread_executor', side_effect=get_executor):
+        batches = Datacube.load_data_iter(sources, geobox, measurements, batch_size=2)
+        first = next(batches)
+        assert first.red.values[:, 0, 0].tolist() == [0, 1]
+        assert second_batch_loaded.wait(5)
+        rest = [batch.red.values[:, 0, 0].tolist() for batch in batches]
+
+        # the prefetching thread is stopped, also when the consumer stops early
+        abandoned = Datacube.load_data_iter(sources, geobox, measurements, batch_size=2)
+        next(abandoned)
+        abandoned.close()
+
+    assert rest == [[2, 3], [4]]
+    assert first.time.values.tolist() == [0, 1]
+    # the third batch went into the buffers of the first
+    assert first.red.values[:, 0, 0].tolist() == [4, 1]
+    assert len(executors) == 2
+    assert all(executor._pool._shutdown for executor in executors)  # pylint: disable=protected-access
@@ -0,0 +1,153 @@
+from __future__ import absolute_import, division
+
+import warnings
+import numpy
+import xarray
+import mock
+from affine import Affine
+
+from datacube import Datacube
+from datacube.api.reductions import PixelStatistics, accumulate_statistics, merge_statistics, statistics_to_dataset
+from datacube.api.reductions import P2Quantile, blocked_quantiles, approximate_quantiles
+from datacube.utils import geometry
+
+
+def _observations():
+    rng = numpy.random.RandomState(1)
+    data = rng.randint(0, 1000, size=(20, 3, 4)).astype('int16')
+    data[rng.rand(*data.shape) < 0.3] = -1
+    data[:, 0, 0] = -1
+    return data
+
+
+def _expected(data, statistic):
+    values = numpy.where(data == -1, numpy.nan, data.astype('float64'))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return {'count': (data != -1).sum(axis=0),
+                'sum': numpy.where((data != -1).any(axis=0), numpy.nansum(values, axis=0), numpy.nan),
+                'mean': numpy.nanmean(values, axis=0),
+                'var': numpy.nanvar(values, axis=0),
+                'std': numpy.nanstd(values, axis=0),
+                'min': numpy.nan_to_num(numpy.nanmin(values, axis=0) + 1) - 1,
+                'max': numpy.nan_to_num(numpy.nanmax(values, axis=0) + 1) - 1}[statistic]
+
+
+def test_pixel_statistics_match_numpy():
+    data = _observations()
+    accumulator = PixelStatistics(data.shape[1:], data.dtype, -1)
+    for start in range(0, data.shape[0], 3):
+        accumulator.update(data[start:start + 3])
+    accumulator.update(data[0])
+
+    data = numpy.concatenate([data, data[:1]])
+    for statistic in ('count', 'sum', 'mean', 'var', 'std', 'min', 'max'):
+        numpy.testing.assert_allclose(accumulator.result(statistic), _expected(data, statistic))
+
+
+def test_merged_time_blocks_match_single_pass():
+    data = _observations()
+    first = PixelStatistics(data.shape[1:], data.dtype, -1)
+    first.update(data[:7])
+    second = PixelStatistics(data.shape[1:], data.dtype, -1)
+    second.update(data[7:])
+
+    merged = merge_statistics({'band': first}, {'band': second})['band']
+    for statistic in ('count', 'mean', 'var', 'min', 'max'):
+        numpy.testing.assert_allclose(merged.result(statistic), _expected(data, statistic))
+
+
+def test_reduce_data_streams_time_slices():
+    geobox = geometry.GeoBox(4, 3, Affine(1, 0, 0, 0, -1, 0), geometry.CRS('EPSG:4326'))
+    data = _observations()
+    sources = numpy.empty(data.shape[0], dtype=object)
+    for i in range(data.shape[0]):
+        sources[i] = (i,)
+    sources = xarray.DataArray(sources, dims=['time'], coords=[numpy.arange(data.shape[0])])
+    measurements = [{'name': 'band', 'dtype': 'int16', 'nodata': -1, 'units': '1'}]
+
+    def fake_fuse_measurement(dest, datasets, geobox, measurement, **kwargs):
+        dest[:] = data[datasets[0]]
+
+    with mock.patch('datacube.api.core._intersecting', side_effect=lambda datasets, geobox: datasets), \
+            mock.patch('datacube.api.core._plan_reads',
+                       side_effect=lambda intersecting, measurement: [(i, i + 1, None)
+                                                                      for i in range(len(intersecting))]), \
+            mock.patch('datacube.api.core._fuse_measurement', side_effect=fake_fuse_measurement):
+        result = Datacube.reduce_data(sources, geobox, measurements, statistics=('count', 'mean', 'max'),
+                                      batch_size=6)
+
+    assert set(result.data_vars) == {'band_count', 'band_mean', 'band_max'}
+    assert result.band_mean.dims == geobox.dimensions
+    numpy.testing.assert_allclose(result.band_mean.values, _expected(data, 'mean'))
+    assert (result.band_max.values == _expected(data, 'max')).all()
+    assert result.band_count.values[0, 0] == 0
+
+
+def test_statistics_to_dataset_nodata():
+    geobox = geometry.GeoBox(4, 3, Affine(1, 0, 0, 0, -1, 0), geometry.CRS('EPSG:4326'))
+    batches = [xarray.Dataset({'band': (('time', 'y', 'x'), _observations())})]
+    accumulators = accumulate_statistics(batches, [{'name': 'band', 'dtype': 'int16', 'nodata': -1}])
+    result = statistics_to_dataset(accumulators, geobox, ('std', 'min'))
+
+    assert numpy.isnan(result.band_std.values[0, 0]) and numpy.isnan(result.band_std.nodata)
+    assert result.band_min.values[0, 0] == result.band_min.nodata == -1
+
+
+def test_blocked_quantiles_match_numpy():
+    geobox = geometry.GeoBox(4, 3, Affine(1, 0, 0, 0, -1, 0), geometry.CRS('EPSG:4326'))
+    data = _observations()
+    measurements = [{'name': 'band', 'dtype': 'int16', 'nodata': -1}]
+    blocks = []
+
+    def load_block(block_geobox):
+        rows, cols = [slice(int(round(start)), int(round(start)) + size)
+                      for start, size in zip(~geobox.affine * (block_geobox.affine.c, block_geobox.affine.f),
+                                             (block_geobox.width, block_geobox.height))][::-1]
+        blocks.append(block_geobox.shape)
+        return xarray.Dataset({'band': (('time', 'y', 'x'), data[:, rows, cols])})
+
+    # room for the time series of two pixels at a time
+    result = blocked_quantiles(load_block, geobox, data.shape[0], measurements, quantiles=(0.1, 0.5),
+                               block_bytes=2 * 20 * 18)
+
+    assert blocks == [(1, 2)] * 6
+    values = numpy.where(data == -1, numpy.nan, data)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        numpy.testing.assert_allclose(result.band_q50.values, numpy.nanmedian(values, axis=0))
+        numpy.testing.assert_allclose(result.band_q10.values, numpy.nanpercentile(values, 10, axis=0))
+
+
+def test_p2_quantile_estimates():
+    rng = numpy.random.RandomState(3)
+    data = rng.normal(100, 10, size=(2000, 2, 3))
+    data[:, 1, 2] = -1
+    data[3:, 1, 1] = -1
+    data[rng.rand(*data.shape) < 0.2] = -1
+
+    for quantile in (0.1, 0.5, 0.9):
+        estimator = P2Quantile((2, 3), quantile, -1)
+        for start in range(0, data.shape[0], 100):
+            estimator.update(data[start:start + 100])
+        result = estimator.result()
+
+        values = numpy.where(data == -1, numpy.nan, data)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            expected = numpy.nanpercentile(values, quantile * 100, axis=0)
+        assert abs(result - expected).ravel()[:4].max() < 1
+        # too few observations for the markers: exact
+        numpy.testing.assert_allclose(result[1, 1], expected[1, 1])
+        assert numpy.isnan(result[1, 2])
+
+
+def test_approximate_quantiles_dataset():
+    geobox = geometry.GeoBox(4, 3, Affine(1, 0, 0, 0, -1, 0), geometry.CRS('EPSG:4326'))
+    data = _observations()
+    batches = [xarray.Dataset({'band': (('time', 'y', 'x'), data[start:start + 4])}) for start in range(0, 20, 4)]
+    result = approximate_quantiles(batches, geobox, [{'name': 'band', 'dtype': 'int16', 'nodata': -1}], (0.5,))
+
+    assert list(result.data_vars) == ['band_q50']
+    assert numpy.isnan(result.band_q50.values[0, 0])
+    assert ((result.band_q50.values[1:] >= 0) & (result.band_q50.values[1:] < 1000)).all()
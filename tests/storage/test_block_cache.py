@@ -0,0 +1,231 @@
+from __future__ import absolute_import
+
+import multiprocessing
+import os
+import re
+
+import numpy
+import pytest
+import rasterio
+from affine import Affine
+
+import datacube
+from datacube.compat import BaseHTTPRequestHandler, HTTPServer, ThreadingMixIn, HTTPError, urlopen, quote
+from datacube.storage import block_cache
+from datacube.storage.block_cache import BlockCache, cached_url
+from datacube.storage.storage import DatasetSource
+from datacube.utils import geometry
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """Serves the files of the server's directory, with range requests"""
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        self._serve(body=False)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self._serve(body=True)
+
+    def _serve(self, body):
+        path = os.path.join(self.server.directory, self.path.lstrip('/'))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        match = re.match(r'bytes=(\d+)-(\d+)$', self.headers.get('Range', ''))
+        if body:
+            with open(self.server.log, 'a') as log:
+                log.write('%s\n' % self.headers.get('Range'))
+        if match:
+            start, stop = int(match.group(1)), int(match.group(2)) + 1
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, min(stop, len(data)) - 1, len(data)))
+            data = data[start:stop]
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', '"%d"' % os.path.getmtime(path))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _serve(directory, log, connection):
+    server = _Server(('127.0.0.1', 0), _RangeHandler)
+    server.directory, server.log = directory, log
+    connection.send(server.server_address[1])
+    server.serve_forever()
+
+
+class _Remote(object):
+    """A stand-in for a remote server, in another process as GDAL doesn't let go of the interpreter"""
+    def __init__(self, directory):
+        self.directory = directory
+        self.log = directory + '.log'
+        open(self.log, 'w').close()
+        parent, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve, args=(directory, self.log, child))
+        self.process.start()
+        self.url = 'http://127.0.0.1:%d/' % parent.recv()
+
+    @property
+    def fetched(self):
+        """Ranges fetched since the last call"""
+        with open(self.log) as log:
+            fetched = [line.strip() for line in log]
+        open(self.log, 'w').close()
+        return fetched
+
+    def close(self):
+        self.process.terminate()
+        self.process.join()
+
+
+@pytest.fixture
+def remote(tmpdir):
+    server = _Remote(str(tmpdir.mkdir('remote')))
+    yield server
+    server.close()
+
+
+def test_block_cache_reads_whole_blocks_once(tmpdir, remote):
+    content = os.urandom(10000)
+    with open(os.path.join(remote.directory, 'file.bin'), 'wb') as f:
+        f.write(content)
+    url = remote.url + 'file.bin'
+
+    cache = BlockCache(str(tmpdir.join('cache')), max_bytes=1000000, block_bytes=1024)
+    assert cache.read(url, 1500, 2500) == content[1500:2500]
+    assert remote.fetched == ['bytes=1024-3071']
+
+    # cached blocks are reused, the missing ones are fetched in one request
+    assert cache.read(url, 2000, 5000) == content[2000:5000]
+    assert remote.fetched == ['bytes=3072-5119']
+    assert cache.read(url, 9000, 20000) == content[9000:]
+    assert cache.read(url, 20000, 30000) == b''
+
+    # shared with other processes through the directory
+    other = BlockCache(str(tmpdir.join('cache')), max_bytes=1000000, block_bytes=1024)
+    assert remote.fetched == ['bytes=8192-9999']
+    assert other.read(url, 1024, 5120) == content[1024:5120]
+    assert remote.fetched == []
+
+    with pytest.raises(HTTPError):
+        cache.read(remote.url + 'missing.bin', 0, 10)
+
+
+def test_block_cache_evicts_least_recently_used(tmpdir, remote):
+    content = os.urandom(8192)
+    with open(os.path.join(remote.directory, 'file.bin'), 'wb') as f:
+        f.write(content)
+    url = remote.url + 'file.bin'
+
+    cache = BlockCache(str(tmpdir.join('cache')), max_bytes=4096, block_bytes=1024)
+    cache.read(url, 0, 4096)
+    os.utime(cache._block_path(url, cache.stat(url)[1], 0), (0, 0))  # pylint: disable=protected-access
+    cache.read(url, 4096, 5120)
+    assert len(remote.fetched) == 2
+
+    assert sum(os.path.getsize(os.path.join(directory, filename))
+               for directory, _, filenames in os.walk(cache.directory) for filename in filenames) <= 4096
+    assert cache.read(url, 1024, 2048) == content[1024:2048]
+    assert remote.fetched == []
+    assert cache.read(url, 0, 1024) == content[:1024]
+    assert remote.fetched == ['bytes=0-1023']
+
+
+def test_block_cache_only_stores_whole_blocks(tmpdir, remote):
+    content = os.urandom(3000)
+    with open(os.path.join(remote.directory, 'file.bin'), 'wb') as f:
+        f.write(content)
+    url = remote.url + 'file.bin'
+
+    cache = BlockCache(str(tmpdir.join('cache')), max_bytes=1000000, block_bytes=1024)
+    cache._fetch = lambda url, start, stop: content[start:stop - 10]  # pylint: disable=protected-access
+    with pytest.raises(IOError):
+        cache.read(url, 0, 3000)
+    # the whole blocks are kept, the short last one isn't
+    assert os.path.isfile(cache._block_path(url, cache.stat(url)[1], 1))  # pylint: disable=protected-access
+    assert not os.path.exists(cache._block_path(url, cache.stat(url)[1], 2))  # pylint: disable=protected-access
+
+    # the last block is as long as the rest of the file
+    del cache._fetch
+    assert cache.read(url, 2500, 3000) == content[2500:]
+    assert cache.read(url, 0, 3000) == content
+
+
+def test_block_cache_directory_is_private(tmpdir):
+    directory = str(tmpdir.join('cache'))
+    BlockCache(directory, max_bytes=1000000)
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+    assert block_cache._default_directory() != block_cache._default_directory().rstrip('0123456789')  # noqa
+
+    os.chmod(directory, 0o777)
+    with pytest.raises(IOError):
+        BlockCache(directory, max_bytes=1000000)
+    with datacube.set_options(block_cache_bytes=10 ** 6, block_cache_dir=directory):
+        with pytest.raises(IOError):
+            cached_url('http://example.com/file.bin')
+
+
+def test_cached_url_proxies_ranges(tmpdir, remote):
+    content = os.urandom(3000)
+    with open(os.path.join(remote.directory, 'file.bin'), 'wb') as f:
+        f.write(content)
+    url = remote.url + 'file.bin'
+
+    assert cached_url(url) == url
+    with datacube.set_options(block_cache_bytes=10 ** 6, block_cache_dir=str(tmpdir.join('cache'))):
+        proxied = cached_url(url)
+        assert proxied != url
+        assert cached_url('s3://bucket/file.bin') == 's3://bucket/file.bin'
+
+        response = urlopen(block_cache._Request(proxied, 'GET', {'Range': 'bytes=100-199'}))  # noqa
+        assert response.getcode() == 206
+        assert response.read() == content[100:200]
+        assert urlopen(block_cache._Request(proxied, 'HEAD')).info()['Content-Length'] == '3000'  # noqa
+        assert urlopen(proxied).read() == content
+        with pytest.raises(HTTPError) as error:
+            urlopen(cached_url(remote.url + 'missing.bin'))
+        assert error.value.code == 404
+
+        # only for us, and only for remote files
+        port, token = re.match(r'http://127.0.0.1:(\d+)/(\w+)/', proxied).groups()
+        for path in ['%s/%s' % ('0' * len(token), quote(url, safe='')), quote(url, safe=''),
+                     '%s/%s' % (token, quote('file://' + __file__, safe=''))]:
+            with pytest.raises(HTTPError) as error:
+                urlopen('http://127.0.0.1:%s/%s' % (port, path))
+            assert error.value.code == 403
+
+
+def test_read_dataset_through_block_cache(tmpdir, remote):
+    geobox = geometry.GeoBox(512, 512, Affine(25, 0, 1500000, 0, -25, -3900000), geometry.CRS('EPSG:3577'))
+    data = numpy.arange(512 * 512, dtype='int16').reshape((512, 512))
+    with rasterio.open(os.path.join(remote.directory, 'band.tif'), 'w', driver='GTiff', width=512, height=512,
+                       count=1, dtype='int16', crs=geobox.crs.crs_str, transform=geobox.affine, nodata=-1,
+                       tiled=True, blockxsize=256, blockysize=256) as dst:
+        dst.write(data, 1)
+
+    class FakeDataset(object):
+        local_uri = remote.url + 'band.tif'
+        format = 'GeoTIFF'
+        measurements = {'red': {'path': ''}}
+
+        class type(object):
+            measurements = {'red': {'nodata': -1}}
+
+    with datacube.set_options(block_cache_bytes=10 ** 6, block_cache_dir=str(tmpdir.join('cache'))):
+        source = DatasetSource(FakeDataset, 'red')
+        with source.open() as band:
+            assert band.chunking == (256, 256)
+            assert (band.read(window=((300, 400), (10, 20))) == data[300:400, 10:20]).all()
+    # whole blocks, from the start of one
+    starts = [int(re.match(r'bytes=(\d+)-', fetched).group(1)) for fetched in remote.fetched]
+    assert starts and all(start % block_cache.BLOCK_BYTES == 0 for start in starts)
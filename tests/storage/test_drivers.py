@@ -0,0 +1,171 @@
+from __future__ import absolute_import
+
+from contextlib import contextmanager
+
+import netCDF4
+import numpy
+import pytest
+import rasterio
+import xarray
+from affine import Affine
+from pathlib import Path
+
+from datacube.storage import drivers
+from datacube.storage.drivers import writer_driver, NetCDFWriterDriver, COGWriterDriver
+from datacube.storage.drivers import read_driver, register_read_driver, ReadDriver
+from datacube.storage.drivers import GDALReadDriver, NetCDFReadDriver, ZarrReadDriver
+from datacube.storage.storage import DatasetSource
+from datacube.utils import geometry
+
+
+def _tile_dataset():
+    geobox = geometry.GeoBox(300, 250, Affine(25, 0, 1500000, 0, -25, -3900000), geometry.CRS('EPSG:3577'))
+    times = numpy.array(['2017-01-01T10:00', '2017-01-17T10:00'], dtype='datetime64[ns]')
+    dataset = xarray.Dataset(attrs={'crs': geobox.crs})
+    dataset['time'] = ('time', times, {'units': 'seconds since 1970-01-01 00:00:00'})
+    for name, coord in geobox.coordinates.items():
+        dataset[name] = (name, coord.values, {'units': coord.units, 'crs': geobox.crs})
+    values = numpy.arange(2 * 250 * 300, dtype='int16').reshape((2, 250, 300)) % 1000
+    dataset['red'] = (('time',) + geobox.dimensions, values, {'nodata': -999, 'units': '1', 'crs': geobox.crs})
+    dataset['dataset'] = ('time', numpy.array(['doc', 'doc'], dtype='S3'))
+    return dataset
+
+
+def test_cog_driver_writes_tiled_overviews(tmpdir):
+    dataset = _tile_dataset()
+    filename = tmpdir.join('tiles', 'LS8_3577_60_-156.tif')
+    driver = writer_driver('COG')
+    driver.write_dataset_to_storage(dataset, str(filename), global_attributes={'title': 'Test'},
+                                    variable_params={'red': {'chunksizes': (1, 100, 100), 'zlib': True}})
+
+    for index, time in enumerate(dataset.time.values):
+        bands = driver.band_documents(str(filename), time, ['red'])
+        path = filename.dirpath().join(bands['red']['path'])
+        with rasterio.open(str(path)) as src:
+            assert src.block_shapes == [(112, 112)]
+            assert src.overviews(1) == [2, 4]
+            assert src.nodata == -999
+            assert src.tags()['title'] == 'Test'
+            assert src.compression.value == 'DEFLATE'
+            assert (src.read(1) == dataset.red.values[index]).all()
+    assert sorted(path.basename for path in filename.dirpath().listdir()) == [
+        'LS8_3577_60_-156_20170101100000000000_red.tif', 'LS8_3577_60_-156_20170117100000000000_red.tif']
+
+
+def test_datasets_read_back_from_cog(tmpdir):
+    dataset = _tile_dataset()
+    filename = tmpdir.join('unit.tif')
+    driver = COGWriterDriver()
+    driver.write_dataset_to_storage(dataset, str(filename), variable_params={'red': {'chunksizes': (1, 64, 64)}})
+
+    location = driver.dataset_location(str(filename), dataset.time.values[1], ['red'])
+    assert location.exists()
+
+    class FakeDataset(object):
+        local_uri = location.as_uri()
+        format = driver.format
+        center_time = dataset.time.values[1]
+        crs = dataset.crs
+        transform = dataset.affine * Affine.scale(300, 250)
+        measurements = driver.band_documents(str(filename), dataset.time.values[1], ['red'])
+
+        class type(object):
+            measurements = {'red': {'nodata': -999}}
+
+    source = DatasetSource(FakeDataset, 'red')
+    assert isinstance(source.driver, GDALReadDriver)
+    with source.open() as src:
+        assert src.chunking == (64, 64)
+        assert (src.read() == dataset.red.values[1]).all()
+
+
+def test_writer_drivers():
+    assert isinstance(writer_driver(None), NetCDFWriterDriver)
+    assert writer_driver('NetCDF CF').format == 'NetCDF'
+    assert writer_driver('COG').format == 'GeoTIFF'
+    assert writer_driver('Zarr').format == 'Zarr' and writer_driver('Zarr').can_append
+    assert writer_driver(None).band_documents('unit.nc', None, ['red']) == {'red': {'path': '', 'layer': 'red'}}
+    assert writer_driver(None).dataset_location('unit.nc', None, ['red']) == Path('unit.nc')
+    with pytest.raises(ValueError):
+        writer_driver('HDF4')
+
+
+def test_read_drivers():
+    assert isinstance(read_driver('NetCDF', 'file'), NetCDFReadDriver)
+    assert isinstance(read_driver('NetCDF', 'http'), GDALReadDriver)
+    assert isinstance(read_driver('GeoTIFF', 'file'), GDALReadDriver)
+    assert isinstance(read_driver('zarr', 'file'), ZarrReadDriver)
+    assert isinstance(read_driver('NetCDF', 'file', name='GDAL'), GDALReadDriver)
+    with pytest.raises(ValueError):
+        read_driver('NetCDF', 'file', name='HDF4')
+
+
+def test_netcdf_read_driver_without_grid_mapping(tmpdir):
+    filename = str(tmpdir.join('plain.nc'))
+    data = numpy.arange(30 * 40, dtype='int16').reshape((30, 40))
+    with netCDF4.Dataset(filename, 'w') as nco:
+        nco.createDimension('y', 30)
+        nco.createDimension('x', 40)
+        nco.createVariable('red', 'int16', ('y', 'x'), fill_value=-999)[:] = data
+
+    class FakeDataset(object):
+        local_uri = Path(filename).as_uri()
+        format = 'NetCDF'
+        crs = geometry.CRS('EPSG:3577')
+        transform = Affine(1000, 0, 1500000, 0, -750, -3900000)
+        measurements = {'red': {'path': '', 'layer': 'red'}}
+
+        class type(object):
+            measurements = {'red': {'nodata': -999}}
+
+    source = DatasetSource(FakeDataset, 'red')
+    assert isinstance(source.driver, NetCDFReadDriver)
+    with source.open() as band:
+        assert band.crs == FakeDataset.crs
+        assert band.transform == Affine(25, 0, 1500000, 0, -25, -3900000)
+        assert (band.read(window=((5, 10), (20, 30))) == data[5:10, 20:30]).all()
+
+
+class _MemoryMappedBand(object):
+    def __init__(self, array):
+        self.array = array
+
+    def read(self, window=None, out_shape=None, resampling=None, out=None):
+        return self.array[slice(*window[0]), slice(*window[1])] if window else self.array[:]
+
+
+class _NumpyReadDriver(ReadDriver):
+    @contextmanager
+    def open(self, filename):
+        yield numpy.load(filename, mmap_mode='r')
+
+    def band_data_source(self, src, source):
+        return _MemoryMappedBand(src)
+
+
+def test_register_read_driver(tmpdir, monkeypatch):
+    monkeypatch.setattr(drivers, 'READ_DRIVERS', dict(drivers.READ_DRIVERS))
+    monkeypatch.setattr(drivers, 'READ_DRIVER_FORMATS', dict(drivers.READ_DRIVER_FORMATS))
+    register_read_driver('npy', _NumpyReadDriver, formats=['NPY'], schemes=['file'])
+
+    filename = tmpdir.join('band.npy')
+    numpy.save(str(filename), numpy.arange(20, dtype='int16').reshape((4, 5)))
+
+    class FakeDataset(object):
+        local_uri = Path(str(filename)).as_uri()
+        format = 'npy'
+        measurements = {'red': {'path': ''}}
+
+        class type(object):
+            measurements = {'red': {'nodata': -1}}
+            definition = {'storage': {}}
+
+    source = DatasetSource(FakeDataset, 'red')
+    assert isinstance(source.driver, _NumpyReadDriver)
+    with source.open() as band:
+        assert (band.read(((1, 3), (2, 4))) == [[7, 8], [12, 13]]).all()
+
+    # products can pick a driver by name
+    FakeDataset.format = 'GeoTIFF'
+    FakeDataset.type.definition = {'storage': {'read_driver': 'npy'}}
+    assert isinstance(DatasetSource(FakeDataset, 'red').driver, _NumpyReadDriver)
@@ -0,0 +1,98 @@
+from __future__ import absolute_import, division
+
+import numpy
+import pytest
+
+from datacube.storage.fusers import FUSERS, make_fuser
+from datacube.helpers import ga_pq_fuser
+
+
+NODATA = -1
+
+
+def _stack():
+    stack = numpy.array([[[1, 5, NODATA], [NODATA, 12, 3]],
+                         [[4, NODATA, NODATA], [7, 10, 6]],
+                         [[2, 6, NODATA], [NODATA, 3, 8]]], dtype='int16')
+    return stack
+
+
+def _fuse_incrementally(name, stack):
+    fuser = make_fuser(name, NODATA)
+    dest = numpy.full(stack.shape[1:], NODATA, dtype=stack.dtype)
+    for src in stack:
+        fuser.fuse(dest, src)
+    return dest
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('first', [[1, 5, NODATA], [7, 12, 3]]),
+    ('last', [[2, 6, NODATA], [7, 3, 8]]),
+    ('min', [[1, 5, NODATA], [7, 3, 3]]),
+    ('max', [[4, 6, NODATA], [7, 12, 8]]),
+    ('mean', [[2, 6, NODATA], [7, 8, 6]]),
+    ('and', [[0, 4, NODATA], [7, 0, 0]]),
+    ('or', [[7, 7, NODATA], [7, 15, 15]]),
+])
+def test_builtin_fusers(name, expected):
+    stack = _stack()
+    assert _fuse_incrementally(name, stack).tolist() == expected
+    assert make_fuser(name, NODATA).reduce(stack).tolist() == expected
+
+
+def test_fusers_with_nan_nodata():
+    stack = _stack().astype('float32')
+    stack[stack == NODATA] = numpy.nan
+    for name in ('first', 'last', 'min', 'max', 'mean'):
+        if name == 'mean':
+            expected = numpy.array([[7 / 3, 5.5, numpy.nan], [7, 25 / 3, 17 / 3]], dtype='float32')
+        else:
+            expected = _fuse_incrementally(name, _stack()).astype('float32')
+            expected[expected == NODATA] = numpy.nan
+        fuser = make_fuser(name, numpy.nan)
+        dest = numpy.full(stack.shape[1:], numpy.nan, dtype='float32')
+        for src in stack:
+            fuser.fuse(dest, src)
+        numpy.testing.assert_allclose(dest, expected)
+        numpy.testing.assert_allclose(make_fuser(name, numpy.nan).reduce(stack), expected)
+
+
+def test_ga_pq_fuser_matches_helper():
+    valid = 1 << 8
+    stack = numpy.array([[0x0ff, valid | 0x0f0, valid | 0x0ff, 0],
+                         [valid | 0x00f, valid | 0x0cc, 0x0ff, 0x001],
+                         [valid | 0x0f0, 0, valid | 0x00f, 0x002]], dtype='int16')
+
+    expected = stack[0].copy()
+    for src in stack[1:]:
+        ga_pq_fuser(expected, src)
+
+    fuser = FUSERS['ga_pq'](None)
+    dest = stack[0].copy()
+    for src in stack[1:]:
+        fuser.fuse(dest, src)
+    assert dest.tolist() == expected.tolist()
+    assert fuser.reduce(stack).tolist() == expected.tolist()
+
+
+@pytest.mark.parametrize('nodata', [0, 0x1ff, -1])
+def test_ga_pq_fuser_copies_into_empty(nodata):
+    src = numpy.array([0x1f0, 0x00f], dtype='int16')
+    dest = numpy.full(src.shape, nodata, dtype='int16')
+    fuser = FUSERS['ga_pq'](numpy.int16(nodata))
+    fuser.fuse(dest, src)
+    # the shortcut of reading the first source straight into the destination must give the same result
+    assert fuser.copies_into_empty == (dest.tolist() == src.tolist())
+    assert fuser.copies_into_empty == (nodata == 0)
+
+
+def test_make_fuser():
+    def fuse_func(dest, src):
+        pass
+
+    assert make_fuser(None, 0).stop_when_covered
+    assert not make_fuser('max', 0).stop_when_covered
+    assert make_fuser(fuse_func, 0).fuse is fuse_func
+    assert not make_fuser(fuse_func, 0).copies_into_empty
+    with pytest.raises(ValueError):
+        make_fuser('median', 0)
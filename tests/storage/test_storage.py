@@ -1,19 +1,27 @@
 from __future__ import absolute_import, division, print_function
 
+import datetime
 import numpy
 import netCDF4
 from affine import Affine, identity
 import xarray
 import mock
+import os
 import pytest
+from pathlib import Path
 from contextlib import contextmanager
 
 import rasterio.warp
+import dask.array
 
 import datacube
 from datacube.utils import geometry
 from datacube.storage.storage import write_dataset_to_netcdf, reproject_and_fuse, read_from_source, Resampling
-from datacube.storage.storage import NetCDFDataSource
+from datacube.storage.storage import NetCDFDataSource, _FileHandleCache, _reproject_window
+from datacube.storage.storage import BandDataSource, RasterFileDataSource, reproject_and_fuse_bands
+from datacube.storage.storage import _netcdf_time_band, DatasetSource
+from datacube.storage import storage, chunk_compression
+from datacube.executor import get_thread_executor
 
 GEO_PROJ = 'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563,AUTHORITY["EPSG","7030"]],' \
            'AUTHORITY["EPSG","6326"]],PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433],' \
@@ -47,6 +55,87 @@ def test_write_dataset_to_netcdf(tmpnetcdf_filename):
         assert var.getncattr('abc') == 'xyz'
 
 
+def test_write_dask_dataset_to_netcdf_in_blocks(tmpnetcdf_filename):
+    affine = Affine.scale(0.1, 0.1) * Affine.translation(20, 30)
+    geobox = geometry.GeoBox(100, 100, affine, geometry.CRS(GEO_PROJ))
+    dataset = xarray.Dataset(attrs={'extent': geobox.extent, 'crs': geobox.crs})
+    for name, coord in geobox.coordinates.items():
+        dataset[name] = (name, coord.values, {'units': coord.units, 'crs': geobox.crs})
+
+    values = numpy.arange(10000, dtype='int16').reshape(geobox.shape)
+    dataset['B10'] = (geobox.dimensions,
+                      dask.array.from_array(values, chunks=(30, 100)),
+                      {'nodata': 0, 'units': '1', 'crs': geobox.crs})
+
+    executors = []
+
+    def get_executor(*args, **kwargs):
+        executors.append(get_thread_executor(*args, **kwargs))
+        return executors[-1]
+
+    # room for 20 rows, but blocks are grown to whole dask chunks of 30, so none is computed twice
+    with mock.patch('datacube.storage.storage._WRITE_BLOCK_BYTES', 2 * 20 * 100), \
+            mock.patch('datacube.storage.storage._write_blocks', wraps=storage._write_blocks) as write_blocks, \
+            mock.patch('datacube.storage.storage.get_thread_executor', side_effect=get_executor):
+        write_dataset_to_netcdf(dataset, tmpnetcdf_filename,
+                                variable_params={'B10': {'chunksizes': (10, 50), 'zlib': True}})
+    blocks = list(storage._write_blocks(*write_blocks.call_args[0]))
+    assert [(rows.start, rows.stop) for rows, _ in blocks] == [(0, 30), (30, 60), (60, 90), (90, 100)]
+    # the background thread computing the next block is stopped
+    assert executors and all(executor._pool._shutdown for executor in executors)  # pylint: disable=protected-access
+
+    with netCDF4.Dataset(tmpnetcdf_filename) as nco:
+        nco.set_auto_mask(False)
+        assert nco.variables['B10'].chunking() == [10, 50]
+        assert (nco.variables['B10'][:] == values).all()
+
+
+@pytest.mark.parametrize('shuffle', [True, False])
+def test_write_dataset_to_netcdf_with_compress_threads(tmpdir, shuffle):
+    pytest.importorskip('h5py')
+    affine = Affine.scale(0.1, 0.1) * Affine.translation(20, 30)
+    geobox = geometry.GeoBox(100, 90, affine, geometry.CRS(GEO_PROJ))
+    dataset = xarray.Dataset(attrs={'extent': geobox.extent, 'crs': geobox.crs})
+    for name, coord in geobox.coordinates.items():
+        dataset[name] = (name, coord.values, {'units': coord.units, 'crs': geobox.crs})
+
+    values = numpy.arange(9000, dtype='int16').reshape(geobox.shape)
+    dataset['B10'] = (geobox.dimensions, values, {'nodata': -1, 'units': '1', 'crs': geobox.crs})
+    dataset['B20'] = (geobox.dimensions, dask.array.from_array(values * 0.5, chunks=(45, 50)),
+                      {'nodata': -1, 'units': '1', 'crs': geobox.crs})
+    variable_params = {'B10': {'chunksizes': (40, 30), 'zlib': True, 'complevel': 6, 'shuffle': shuffle},
+                       'B20': {'chunksizes': (40, 30), 'zlib': True, 'shuffle': shuffle}}
+
+    filenames = [str(tmpdir.join('%d.nc' % threads)) for threads in (1, 3)]
+    for filename, threads in zip(filenames, (1, 3)):
+        write_dataset_to_netcdf(dataset, filename, variable_params=variable_params, compress_threads=threads)
+
+    with netCDF4.Dataset(filenames[0]) as expected, netCDF4.Dataset(filenames[1]) as nco:
+        for name in ('B10', 'B20'):
+            assert nco[name].filters() == expected[name].filters()
+            assert nco[name].chunking() == expected[name].chunking()
+            assert (nco[name][:] == dataset[name].values).all()
+
+
+def test_unwritten_chunks(tmpdir):
+    h5py = pytest.importorskip('h5py')
+    filename = str(tmpdir.join('chunks.h5'))
+    with h5py.File(filename, 'w') as h5file:
+        for name in ('written', 'missing'):
+            h5file.create_dataset(name, (4, 6), chunks=(2, 3), dtype='int16', compression='gzip')
+        writer = chunk_compression.ChunkWriter(h5file['written'], get_thread_executor(2))
+        writer.write((slice(0, 4), slice(0, 6)), numpy.arange(24).reshape((4, 6)))
+
+    assert sorted(writer.written) == [(0, 0), (0, 3), (2, 0), (2, 3)]
+    failed = chunk_compression.unwritten(filename, {'written': writer.written, 'missing': writer.written})
+    assert 'missing' in failed
+
+    # chunks written through a different HDF5 library than h5py's are lost, and must be reported
+    with h5py.File(filename, 'r') as h5file:
+        stored = (h5file['written'][:] == numpy.arange(24).reshape((4, 6))).all()
+    assert sorted(failed) == (['missing'] if stored else ['missing', 'written'])
+
+
 def test_netcdf_source(tmpnetcdf_filename):
     affine = Affine.scale(0.1, 0.1) * Affine.translation(20, 30)
     geobox = geometry.GeoBox(110, 100, affine, geometry.CRS(GEO_PROJ))
@@ -145,6 +234,53 @@ def test_mixed_result_when_first_source_partially_empty():
     assert (output_data == [[1, 1], [2, 2]]).all()
 
 
+def test_reproject_and_fuse_with_named_fuser():
+    crs = mock.MagicMock()
+    shape = (2, 2)
+    no_data = -1
+
+    source1 = _mock_datasetsource([[1, 5], [no_data, no_data]], crs=crs, shape=shape)
+    source2 = _mock_datasetsource([[2, 2], [2, no_data]], crs=crs, shape=shape)
+    sources = [source1, source2]
+
+    output_data = numpy.full(shape, fill_value=no_data, dtype='int16')
+    reproject_and_fuse(sources, output_data, dst_transform=identity, dst_projection=crs, dst_nodata=no_data,
+                       fuse_func='max')
+
+    assert (output_data == [[2, 5], [2, no_data]]).all()
+
+
+def test_stop_reading_sources_once_covered():
+    crs = mock.MagicMock()
+    shape = (2, 2)
+    no_data = -1
+
+    source1 = _mock_datasetsource([[1, 1], [no_data, no_data]], crs=crs, shape=shape)
+    source2 = _mock_datasetsource([[2, 2], [2, 2]], crs=crs, shape=shape)
+    source3 = _mock_datasetsource([[3, 3], [3, 3]], crs=crs, shape=shape)
+    sources = [source1, source2, source3]
+
+    output_data = numpy.full(shape, fill_value=no_data, dtype='int16')
+    reproject_and_fuse(sources, output_data, dst_transform=identity, dst_projection=crs, dst_nodata=no_data)
+
+    assert (output_data == [[1, 1], [2, 2]]).all()
+    assert source2.open.called
+    assert not source3.open.called
+
+    # fusers that need every source opt out
+    def max_fuser(dest, src):
+        numpy.maximum(dest, src, out=dest)
+
+    reproject_and_fuse(sources, output_data, dst_transform=identity, dst_projection=crs, dst_nodata=no_data,
+                       fuse_func=max_fuser)
+    assert (output_data == 3).all()
+
+    source3.reset_mock()
+    reproject_and_fuse(sources, output_data, dst_transform=identity, dst_projection=crs, dst_nodata=no_data,
+                       stop_when_covered=False)
+    assert source3.open.called
+
+
 def _mock_datasetsource(value, crs=None, shape=(2, 2)):
     crs = crs or mock.MagicMock()
     dataset_source = mock.MagicMock()
@@ -153,6 +289,7 @@ def _mock_datasetsource(value, crs=None, shape=(2, 2)):
     rio_reader.transform = identity
     rio_reader.shape = shape
     rio_reader.read.return_value = numpy.array(value)
+    rio_reader.dtype = rio_reader.read.return_value.dtype
 
     # Use the following if a reproject were to be required
     # def fill_array(dest, *args, **kwargs):
@@ -187,6 +324,145 @@ def test_read_from_broken_source():
     assert (output_data == [[2, 2], [2, 2]]).all()
 
 
+def _mock_opener():
+    opened = []
+
+    def opener(filename):
+        handle = mock.MagicMock(name=filename)
+        opened.append(handle)
+        return handle
+    return opener, opened
+
+
+def test_file_handle_cache_reuses_idle_handles():
+    opener, opened = _mock_opener()
+    cache = _FileHandleCache(opener)
+
+    with datacube.set_options(max_open_files=2):
+        with cache.open('a.tif') as first:
+            pass
+        with cache.open('a.tif') as second:
+            assert second is first
+
+            # a concurrent reader of the same file gets its own handle
+            with cache.open('a.tif') as third:
+                assert third is not first
+        assert len(opened) == 2
+
+        # least recently used handles are closed once the limit is reached
+        with cache.open('b.tif'):
+            pass
+        assert opened[1].close.called
+        assert not opened[0].close.called
+
+        cache.clear()
+        assert all(handle.close.called for handle in opened)
+
+
+def test_file_handle_cache_discards_broken_handles():
+    opener, opened = _mock_opener()
+    cache = _FileHandleCache(opener)
+
+    with pytest.raises(OSError):
+        with cache.open('a.tif'):
+            raise OSError('Read or write failed')
+    assert opened[0].close.called
+
+    with cache.open('a.tif') as handle:
+        assert handle is opened[1]
+
+
+def test_file_handle_cache_reopens_changed_files(tmpdir):
+    filename = str(tmpdir.join('a.tif'))
+    with open(filename, 'w') as f:
+        f.write('first')
+    opener, opened = _mock_opener()
+    cache = _FileHandleCache(opener)
+
+    with datacube.set_options(max_open_files=2):
+        with cache.open(filename):
+            pass
+        with cache.open(filename) as handle:
+            assert handle is opened[0]
+
+        # replaced by a new file of a different size
+        os.remove(filename)
+        with open(filename, 'w') as f:
+            f.write('second version')
+        with cache.open('NETCDF:"%s":red' % filename):
+            pass
+        with cache.open(filename) as handle:
+            assert handle is opened[2]
+        assert opened[0].close.called
+        assert not opened[1].close.called
+
+
+def test_file_handle_cache_closes_under_lock():
+    lock = mock.MagicMock()
+    opener, opened = _mock_opener()
+    cache = _FileHandleCache(opener, close_lock=lock)
+    held = []
+    with datacube.set_options(max_open_files=0):
+        with cache.open('a.tif') as handle:
+            handle.close.side_effect = lambda: held.append(lock.__enter__.call_count - lock.__exit__.call_count)
+    assert held == [1]
+    assert storage._NETCDF_FILES._close_lock is storage._NETCDF_LOCK  # pylint: disable=protected-access
+
+
+def test_file_handle_cache_disabled():
+    opener, opened = _mock_opener()
+    cache = _FileHandleCache(opener)
+
+    with datacube.set_options(max_open_files=0):
+        with cache.open('a.tif'):
+            pass
+        with cache.open('a.tif'):
+            pass
+    assert len(opened) == 2
+    assert all(handle.close.called for handle in opened)
+
+
+def test_concurrent_reads_fuse_in_source_order():
+    crs = mock.MagicMock()
+    shape = (2, 2)
+    no_data = -1
+
+    sources = [_mock_datasetsource([[no_data, no_data], [no_data, 1]], crs=crs, shape=shape),
+               _mock_datasetsource([[no_data, 2], [2, 2]], crs=crs, shape=shape),
+               _mock_datasetsource([[3, 3], [3, 3]], crs=crs, shape=shape),
+               _mock_datasetsource([[4, 4], [4, 4]], crs=crs, shape=shape)]
+
+    output_data = numpy.full(shape, fill_value=no_data, dtype='int16')
+    with datacube.set_options(source_read_threads=2):
+        reproject_and_fuse(sources, output_data, dst_transform=identity, dst_projection=crs, dst_nodata=no_data)
+
+    assert (output_data == [[3, 2], [2, 1]]).all()
+
+
+def test_concurrent_reads_from_broken_source():
+    crs = mock.MagicMock()
+    shape = (2, 2)
+    no_data = -1
+
+    source1 = _mock_datasetsource([[1, 1], [no_data, no_data]], crs=crs, shape=shape)
+    source2 = _mock_datasetsource([[2, 2], [2, 2]], crs=crs, shape=shape)
+    sources = [source1, source2]
+
+    rio_reader = source1.open.return_value.__enter__.return_value
+    rio_reader.read.side_effect = OSError('Read or write failed')
+
+    output_data = numpy.full(shape, fill_value=no_data, dtype='int16')
+    with datacube.set_options(source_read_threads=2):
+        with pytest.raises(OSError):
+            reproject_and_fuse(sources, output_data, dst_transform=identity,
+                               dst_projection=crs, dst_nodata=no_data)
+
+        reproject_and_fuse(sources, output_data, dst_transform=identity,
+                           dst_projection=crs, dst_nodata=no_data, skip_broken_datasets=True)
+
+    assert (output_data == [[2, 2], [2, 2]]).all()
+
+
 def _create_broken_netcdf(tmpdir):
     import os
     output_path = str(tmpdir / 'broken_netcdf_file.nc')
@@ -212,8 +488,9 @@ class FakeDataSource(object):
 
         self.data = numpy.full(self.shape, self.nodata, dtype='int16')
         self.data[:512, :512] = numpy.arange(512) + numpy.arange(512).reshape((512, 1))
+        self.dtype = self.data.dtype
 
-    def read(self, window=None, out_shape=None):
+    def read(self, window=None, out_shape=None, out=None):
         data = self.data
         if window:
             data = self.data[slice(*window[0]), slice(*window[1])]
@@ -221,6 +498,9 @@ class FakeDataSource(object):
             xidx = ((numpy.arange(out_shape[1])+0.5)*(data.shape[1]/out_shape[1])-0.5).round().astype('int')
             yidx = ((numpy.arange(out_shape[0])+0.5)*(data.shape[0]/out_shape[0])-0.5).round().astype('int')
             data = data[numpy.meshgrid(yidx, xidx, indexing='ij')]
+        if out is not None:
+            out[...] = data
+            return out
         return data
 
     def reproject(self, dest, dst_transform, dst_crs, dst_nodata, resampling, **kwargs):
@@ -236,6 +516,291 @@ class FakeDataSource(object):
                                        **kwargs)
 
 
+def test_reproject_reads_only_covering_window():
+    data_source = FakeDataSource()
+    windows = []
+    read = data_source.read
+
+    def recording_read(window=None, out_shape=None):
+        windows.append(window)
+        return read(window=window, out_shape=out_shape)
+    data_source.read = recording_read
+
+    dst_crs = geometry.CRS('EPSG:32647')
+    dst_transform = Affine(10000, 0, 610000, 0, -10000, -3350000)
+    for resampling in (Resampling.nearest, Resampling.bilinear, Resampling.cubic):
+        expected = numpy.empty((8, 8), dtype='float32')
+        data_source.reproject(expected, dst_transform, dst_crs, numpy.nan, resampling)
+        result = numpy.empty((8, 8), dtype='float32')
+        _reproject_window(data_source, result, dst_transform, str(dst_crs), numpy.nan, resampling)
+
+        assert numpy.isclose(result, expected, equal_nan=True).all()
+        (row_start, row_stop), (col_start, col_stop) = windows.pop()
+        assert (row_stop - row_start) * (col_stop - col_start) < data_source.data.size / 100
+
+    # destination doesn't overlap the source at all
+    result = numpy.zeros((8, 8), dtype='float32')
+    _reproject_window(data_source, result, dst_transform * Affine.translation(1000, 0), dst_crs, numpy.nan,
+                      Resampling.nearest)
+    assert numpy.isnan(result).all()
+    assert not windows
+
+    # the CRS of an overridden source can be a string
+    data_source.crs = 'EPSG:4326'
+    result = numpy.empty((8, 8), dtype='float32')
+    _reproject_window(data_source, result, dst_transform, dst_crs, numpy.nan, Resampling.nearest)
+    data_source.reproject(expected, dst_transform, dst_crs, numpy.nan, Resampling.nearest)
+    assert numpy.isclose(result, expected, equal_nan=True).all()
+
+
+def test_cached_reproject_map_matches_warp():
+    data_source = FakeDataSource()
+    dst_crs = geometry.CRS('EPSG:32647')
+    dst_transform = Affine(5000, 0, 590000, 0, -5000, -3340000)
+
+    expected = numpy.empty((20, 20), dtype='float32')
+    _reproject_window(data_source, expected, dst_transform, str(dst_crs), numpy.nan, Resampling.nearest)
+
+    warp = rasterio.warp.reproject
+    with datacube.set_options(reproject_map_cache_bytes=2 ** 20), \
+            mock.patch('rasterio.warp.reproject', side_effect=warp) as warps:
+        for _ in range(3):
+            result = numpy.empty((20, 20), dtype='float32')
+            _reproject_window(data_source, result, dst_transform, str(dst_crs), numpy.nan, Resampling.nearest)
+            assert numpy.isclose(result, expected, equal_nan=True).all()
+
+    # only the index map was warped
+    assert warps.call_count == 1
+    assert numpy.isnan(expected).any() and not numpy.isnan(expected).all()
+
+
+def _write_tiff_with_overviews(filename):
+    # 8x8 blocks of constant value, so every overview level averages to the same numbers
+    data = numpy.kron(numpy.arange(32 * 32, dtype='float32').reshape((32, 32)), numpy.ones((8, 8), dtype='float32'))
+    transform = Affine(0.001, 0, 149, 0, -0.001, -35)
+    with rasterio.open(filename, 'w', driver='GTiff', width=256, height=256, count=1, dtype='float32',
+                       crs='EPSG:4326', transform=transform, nodata=-1) as dst:
+        dst.write(data, 1)
+        dst.build_overviews([2, 4, 8], Resampling.average)
+    return data, transform
+
+
+@pytest.mark.skipif(str(rasterio.__version__) < '1.0', reason='requires resampling on read')
+def test_coarse_reads_use_overviews(tmpdir):
+    filename = str(tmpdir.join('overviews.tif'))
+    data, transform = _write_tiff_with_overviews(filename)
+    source = RasterFileDataSource(filename, 1)
+
+    with source.open() as src:
+        assert src.overviews == [2, 4, 8]
+
+    read = BandDataSource.read
+    with mock.patch.object(BandDataSource, 'read', autospec=True, side_effect=read) as spy, \
+            mock.patch.object(BandDataSource, 'reproject', autospec=True) as reproject:
+        # same CRS: GDAL averages while reading, no warping
+        result = numpy.empty((32, 32), dtype='float32')
+        read_from_source(source, result, transform * Affine.scale(8, 8), numpy.float32(-1),
+                         geometry.CRS('EPSG:4326'), Resampling.average)
+        assert not reproject.called
+        assert spy.call_args[1]['resampling'] == Resampling.average
+        assert (result == data[::8, ::8]).all()
+
+    with mock.patch.object(BandDataSource, 'read', autospec=True, side_effect=read) as spy:
+        # different CRS: warp from the overview level closest to the output resolution
+        result = numpy.empty((16, 16), dtype='float32')
+        read_from_source(source, result, Affine(1000, 0, 1545000, 0, -1000, -3927000), numpy.float32(-1),
+                         geometry.CRS('EPSG:3577'), Resampling.nearest)
+        (row_start, row_stop), (col_start, col_stop) = spy.call_args[1]['window']
+        out_shape = spy.call_args[1]['out_shape']
+        assert (out_shape[0] - 1) * 8 < row_stop - row_start <= out_shape[0] * 8
+        assert (out_shape[1] - 1) * 8 < col_stop - col_start <= out_shape[1] * 8
+        assert (result != -1).any()
+
+
+def _write_multiband_tiff(filename, offset):
+    data = (numpy.arange(3 * 64 * 64, dtype='int16').reshape((3, 64, 64)) + offset) % 1000
+    data[:, :10, :10] = -1
+    transform = Affine(0.01, 0, 149 + offset / 100, 0, -0.01, -35)
+    with rasterio.open(filename, 'w', driver='GTiff', width=64, height=64, count=3, dtype='int16',
+                       crs='EPSG:4326', transform=transform, nodata=-1) as dst:
+        dst.write(data)
+    return transform
+
+
+def test_reproject_and_fuse_bands_matches_single_band_reads(tmpdir):
+    filenames = [str(tmpdir.join('bands_%d.tif' % i)) for i in range(2)]
+    transform = _write_multiband_tiff(filenames[0], 0)
+    _write_multiband_tiff(filenames[1], 20)
+
+    destinations = [
+        (transform * Affine.translation(-5, 3), geometry.CRS('EPSG:4326')),  # decimated read
+        (Affine(500, 0, 1543000, 0, -500, -3924900), geometry.CRS('EPSG:3577')),  # warp
+    ]
+    for dst_transform, dst_crs in destinations:
+        sources = [[RasterFileDataSource(filename, band) for band in (1, 2, 3)] for filename in filenames]
+        expected = numpy.empty((3, 50, 70), dtype='int16')
+        for band in range(3):
+            reproject_and_fuse([bands[band] for bands in sources], expected[band], dst_transform, dst_crs,
+                               numpy.int16(-1), stop_when_covered=False)
+
+        result = numpy.empty((3, 50, 70), dtype='int16')
+        files = storage._RASTERIO_FILES  # pylint: disable=protected-access
+        files.clear()
+        with datacube.set_options(max_open_files=0), \
+                mock.patch.object(files, '_opener', side_effect=files._opener) as opener:
+            reproject_and_fuse_bands(sources, result, dst_transform, dst_crs, numpy.int16(-1),
+                                     stop_when_covered=False)
+
+        assert (result == expected).all()
+        assert (result != -1).any()
+        assert opener.call_count == 2
+
+
+def test_gdal_environment_is_left_after_reading(tmpdir):
+    filenames = [str(tmpdir.join('bands%d.tif' % i)) for i in range(2)]
+    transform = _write_multiband_tiff(filenames[0], 0)
+    _write_multiband_tiff(filenames[1], 10)
+    crs = geometry.CRS('EPSG:4326')
+
+    def check_environment(*args, **kwargs):
+        assert rasterio.env.hasenv()
+        return read_from_source(*args, **kwargs)
+
+    for threads in (1, 2):
+        with datacube.set_options(source_read_threads=threads), \
+                mock.patch('datacube.storage.storage.read_from_source', side_effect=check_environment):
+            reproject_and_fuse([RasterFileDataSource(filename, 1) for filename in filenames],
+                               numpy.empty((64, 64), dtype='int16'), transform, crs, numpy.int16(-1))
+        assert not rasterio.env.hasenv()
+
+
+def test_decimated_reads_go_straight_into_destination(tmpdir):
+    filename = str(tmpdir.join('bands.tif'))
+    transform = _write_multiband_tiff(filename, 0)
+    crs = geometry.CRS('EPSG:4326')
+    source = RasterFileDataSource(filename, 1)
+    with rasterio.open(filename) as src:
+        data = src.read(1)
+
+    # upside down and hanging off the top left corner of the file
+    for dst_transform in (transform * Affine.translation(-5, 70) * Affine.scale(1, -1),
+                          transform * Affine.translation(75, -3) * Affine.scale(-1, 1)):
+        expected = numpy.empty((80, 70), dtype='int16')
+        rasterio.warp.reproject(data, expected, src_transform=transform, src_crs=str(crs), src_nodata=-1,
+                                dst_transform=dst_transform, dst_crs=str(crs), dst_nodata=-999)
+
+        result = numpy.empty((80, 70), dtype='int16')
+        with mock.patch.object(storage, '_read_decimated') as read_decimated:
+            reproject_and_fuse([source, source], result, dst_transform, crs, numpy.int16(-999))
+
+        assert read_decimated.call_count == 0
+        assert (result == expected).all()
+        assert (result == -999).any() and not (result == -1).any()
+
+
+def _write_stacked_times(filename, times):
+    with netCDF4.Dataset(filename, 'w') as nco:
+        nco.createDimension('time', len(times))
+        nco.createDimension('x', 2)
+        nco.createVariable('time', 'f8', ('time',))[:] = times
+        nco.createVariable('timed', 'i2', ('time', 'x'))
+        nco.createVariable('timeless', 'i2', ('x',))
+
+
+def test_netcdf_time_band_lookup_is_cached(tmpnetcdf_filename):
+    _write_stacked_times(tmpnetcdf_filename, [100, 200, 300, 400])
+
+    with mock.patch('netCDF4.Dataset', side_effect=netCDF4.Dataset) as opened:
+        assert _netcdf_time_band(tmpnetcdf_filename, 200) == 2
+        assert _netcdf_time_band(tmpnetcdf_filename, 0) == 1
+        assert _netcdf_time_band(tmpnetcdf_filename, 349) == 3
+        assert _netcdf_time_band(tmpnetcdf_filename, 350) == 3
+        assert _netcdf_time_band(tmpnetcdf_filename, 351) == 4
+        assert _netcdf_time_band(tmpnetcdf_filename, 1000) == 4
+        assert _netcdf_time_band(tmpnetcdf_filename, 200, 'timed') == 2
+        assert _netcdf_time_band(tmpnetcdf_filename, 200, 'timeless') == 1
+        assert opened.call_count == 1
+
+    # rewriting the file invalidates the cached times
+    os.remove(tmpnetcdf_filename)
+    _write_stacked_times(tmpnetcdf_filename, [400, 300, 200])
+    mtime = os.path.getmtime(tmpnetcdf_filename) + 10
+    os.utime(tmpnetcdf_filename, (mtime, mtime))
+    assert _netcdf_time_band(tmpnetcdf_filename, 200) == 3
+    assert _netcdf_time_band(tmpnetcdf_filename, 390) == 1
+
+
+def _write_stacked_netcdf(filename, times):
+    affine = Affine.scale(0.1, -0.1) * Affine.translation(20, -30)
+    geobox = geometry.GeoBox(110, 100, affine, geometry.CRS(GEO_PROJ))
+    dataset = xarray.Dataset(attrs={'extent': geobox.extent, 'crs': geobox.crs})
+    dataset['time'] = ('time', numpy.array(times, dtype='datetime64[ns]'),
+                       {'units': 'seconds since 1970-01-01 00:00:00'})
+    for name, coord in geobox.coordinates.items():
+        dataset[name] = (name, coord.values, {'units': coord.units, 'crs': geobox.crs})
+
+    shape = (len(times),) + geobox.shape
+    for offset, name in enumerate(['B10', 'B20']):
+        dataset[name] = (('time',) + geobox.dimensions,
+                         numpy.arange(numpy.prod(shape), dtype='int16').reshape(shape) + offset,
+                         {'nodata': -1, 'units': '1', 'crs': geobox.crs})
+    write_dataset_to_netcdf(dataset, filename, variable_params={'B10': {'chunksizes': (1, 20, 20)},
+                                                                'B20': {'chunksizes': (1, 20, 20)}})
+    return dataset, geobox
+
+
+def _mock_netcdf_dataset(filename, center_time):
+    dataset = mock.MagicMock()
+    dataset.format = 'NetCDF'
+    dataset.local_uri = Path(filename).absolute().as_uri()
+    dataset.center_time = center_time
+    dataset.measurements = {name: {'path': '', 'layer': name} for name in ('B10', 'B20')}
+    dataset.type.measurements = {name: {'nodata': -1} for name in ('B10', 'B20')}
+    return dataset
+
+
+def test_read_ingested_netcdf_natively(tmpnetcdf_filename):
+    times = ['2016-01-01T00:00:00', '2016-01-17T00:00:00', '2016-02-02T00:00:00']
+    data, geobox = _write_stacked_netcdf(tmpnetcdf_filename, times)
+    dataset = _mock_netcdf_dataset(tmpnetcdf_filename, datetime.datetime(2016, 1, 17))
+
+    source = DatasetSource(dataset, 'B10')
+    assert source.filename == str(Path(tmpnetcdf_filename).absolute())
+
+    rasterio_files = storage._RASTERIO_FILES  # pylint: disable=protected-access
+    with mock.patch.object(rasterio_files, '_opener') as rasterio_open:
+        with source.open() as src:
+            assert isinstance(src, NetCDFDataSource)
+            assert src.shape == geobox.shape
+            assert src.chunking == [1, 20, 20]
+            assert src.transform.almost_equals(geobox.affine)
+
+        # same grid: plain hyperslab of the second time slice
+        dest = numpy.empty((50, 60), dtype='int16')
+        read_from_source(source, dest, geobox.affine * Affine.translation(10, 20), numpy.int16(-1), geobox.crs,
+                         Resampling.nearest)
+        assert (dest == data.B10.values[1, 20:70, 10:70]).all()
+
+        # decimated
+        dest = numpy.empty((50, 55), dtype='int16')
+        read_from_source(source, dest, geobox.affine * Affine.scale(2, 2), numpy.int16(-1), geobox.crs,
+                         Resampling.nearest)
+        assert (dest == data.B10.values[1, 1::2, 1::2]).all()
+
+        # bands of one file share the open file
+        storage._NETCDF_FILES.clear()  # pylint: disable=protected-access
+        netcdf_open = storage._NETCDF_FILES._opener  # pylint: disable=protected-access
+        with mock.patch.object(storage._NETCDF_FILES, '_opener', side_effect=netcdf_open) as opened:
+            dest = numpy.empty((2,) + geobox.shape, dtype='int16')
+            reproject_and_fuse_bands([[DatasetSource(dataset, 'B10'), DatasetSource(dataset, 'B20')]],
+                                     dest, geobox.affine, geobox.crs, numpy.int16(-1))
+        assert opened.call_count == 1
+        assert (dest[0] == data.B10.values[1]).all()
+        assert (dest[1] == data.B20.values[1]).all()
+
+    assert not rasterio_open.called
+
+
 def _test_helper(source, dst_shape, dst_dtype, dst_transform, dst_nodata, dst_projection, resampling):
     expected = numpy.empty(dst_shape, dtype=dst_dtype)
     with source.open() as src:
@@ -262,6 +827,29 @@ def _test_helper(source, dst_shape, dst_dtype, dst_transform, dst_nodata, dst_pr
     return result
 
 
+def test_read_from_source_near_unit_scale():
+    data_source = FakeDataSource()
+    data_source.shape = (2000, 2000)
+    data_source.data = numpy.arange(2000 * 2000, dtype='int16').reshape(data_source.shape)
+
+    @contextmanager
+    def fake_open():
+        yield data_source
+    source = mock.Mock()
+    source.open = fake_open
+
+    # rounding the window edges reads one row and column fewer than are written
+    dst_transform = data_source.transform * Affine(1 - 9.9e-6, 0, 0.51, 0, 1 - 9.9e-6, 0.51)
+    result = numpy.empty(data_source.shape, dtype='int16')
+    read_from_source(source, result, dst_transform, numpy.int16(-999), data_source.crs, Resampling.nearest)
+
+    expected = numpy.empty(data_source.shape, dtype='int16')
+    with mock.patch.object(storage, '_READ_INTO', False):
+        read_from_source(source, expected, dst_transform, numpy.int16(-999), data_source.crs, Resampling.nearest)
+    assert (result == expected).all()
+    assert (result[:100, :100] == data_source.data[1:101, 1:101]).all()
+
+
 def test_read_from_source():
     data_source = FakeDataSource()
 
@@ -0,0 +1,101 @@
+from __future__ import absolute_import
+
+import numpy
+import pytest
+import xarray
+from affine import Affine
+from rasterio.warp import Resampling
+from pathlib import Path
+
+from datacube.storage.storage import DatasetSource
+from datacube.utils import geometry, DatacubeException
+
+zarr = pytest.importorskip('zarr')
+
+from datacube.storage.zarr_storage import write_dataset_to_zarr, append_dataset_to_zarr  # noqa: E402
+
+GEOBOX = geometry.GeoBox(90, 70, Affine(25, 0, 1500000, 0, -25, -3900000), geometry.CRS('EPSG:3577'))
+
+
+def _dataset(times, seed):
+    dataset = xarray.Dataset(attrs={'crs': GEOBOX.crs})
+    dataset['time'] = ('time', numpy.array(times, dtype='datetime64[ns]'), {'units': 'seconds since 1970-01-01'})
+    for name, coord in GEOBOX.coordinates.items():
+        dataset[name] = (name, coord.values, {'units': coord.units, 'crs': GEOBOX.crs})
+    values = numpy.random.RandomState(seed).randint(0, 1000, size=(len(times),) + GEOBOX.shape).astype('int16')
+    dataset['red'] = (('time',) + GEOBOX.dimensions, values, {'nodata': -999, 'units': '1', 'crs': GEOBOX.crs})
+    dataset['dataset'] = ('time', numpy.array([b'doc' * (seed + 1)] * len(times)))
+    return dataset
+
+
+def _source(filename, time):
+    class FakeDataset(object):
+        local_uri = Path(str(filename)).as_uri()
+        format = 'Zarr'
+        center_time = numpy.datetime64(time, 'us').astype(object)
+        measurements = {'red': {'path': '', 'layer': 'red'}}
+
+        class type(object):
+            measurements = {'red': {'nodata': -999}}
+
+    return DatasetSource(FakeDataset, 'red')
+
+
+def test_write_and_append_zarr(tmpdir):
+    filename = tmpdir.join('LS8_3577_60_-156_2017.zarr')
+    first = _dataset(['2017-01-01T10:00', '2017-01-17T10:00'], 0)
+    write_dataset_to_zarr(first, str(filename), global_attributes={'title': 'Test'},
+                          variable_params={'red': {'chunksizes': (1, 32, 32), 'zlib': True}}, compress_threads=3)
+
+    group = zarr.open_group(str(filename), mode='r')
+    assert group.attrs['title'] == 'Test'
+    assert group['red'].chunks == (1, 32, 32)
+    assert group['red'].attrs['_ARRAY_DIMENSIONS'] == ['time', 'y', 'x']
+    mtime = Path(str(filename), 'red', '0.0.0').stat().st_mtime
+
+    second = _dataset(['2017-02-02T10:00'], 1)
+    append_dataset_to_zarr(second, str(filename))
+    assert zarr.open_group(str(filename), mode='r')['red'].shape == (3, 70, 90)
+    assert Path(str(filename), 'red', '0.0.0').stat().st_mtime == mtime
+    assert list(zarr.open_group(str(filename), mode='r')['dataset'][:]) == [b'doc', b'doc', b'docdoc']
+
+    with pytest.raises(DatacubeException):
+        append_dataset_to_zarr(_dataset(['2017-01-20T10:00'], 2), str(filename))
+    with pytest.raises(DatacubeException):
+        append_dataset_to_zarr(_dataset(['2017-03-01T10:00', '2017-03-01T10:00'], 2), str(filename))
+    append_dataset_to_zarr(_dataset([], 2), str(filename))
+    assert zarr.open_group(str(filename), mode='r')['red'].shape == (3, 70, 90)
+
+    # slices out of order are appended in time order
+    third = _dataset(['2017-03-18T10:00', '2017-03-02T10:00'], 3)
+    append_dataset_to_zarr(third, str(filename))
+    assert (numpy.diff(zarr.open_group(str(filename), mode='r')['time'][:]) > 0).all()
+
+    expected = numpy.concatenate([first.red.values, second.red.values, third.red.values[::-1]])
+    for index, time in enumerate(['2017-01-01T10:00', '2017-01-17T10:00', '2017-02-02T10:00',
+                                  '2017-03-02T10:00', '2017-03-18T10:00']):
+        with _source(filename, time).open() as band:
+            assert band.crs == GEOBOX.crs
+            assert band.transform.almost_equals(GEOBOX.affine)
+            assert (band.read() == expected[index]).all()
+            assert (band.read(window=((10, 50), (20, 80)), out_shape=(20, 30)) ==
+                    expected[index, 10:50:2, 20:80:2]).all()
+
+
+def test_zarr_reprojected_and_decimated_read(tmpdir):
+    filename = tmpdir.join('unit.zarr')
+    dataset = _dataset(['2017-01-01T10:00'], 0)
+    write_dataset_to_zarr(dataset, str(filename), variable_params={'red': {'chunksizes': (1, 16, 16)}})
+
+    dest = numpy.empty((30, 40), dtype='int16')
+    with _source(filename, '2017-01-01T10:00').open() as band:
+        band.reproject(dest, GEOBOX.affine * Affine.translation(10, 5), GEOBOX.crs, -999, Resampling.nearest)
+    assert (dest == dataset.red.values[0, 5:35, 10:50]).all()
+
+    dest = numpy.empty((35, 45), dtype='int16')
+    with _source(filename, '2017-01-01T10:00').open() as band:
+        band.reproject(dest, GEOBOX.affine * Affine.scale(2), GEOBOX.crs, -999, Resampling.nearest)
+        # the georeferencing is read from the store once, not for every window
+        assert band.transform is band.transform
+        assert band.crs is band.crs
+    assert (dest == dataset.red.values[0, 1::2, 1::2]).all()
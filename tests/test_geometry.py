@@ -1,6 +1,8 @@
 
 from __future__ import absolute_import
 
+import threading
+
 try:
     import cPickle as pickle
 except ImportError:
@@ -184,6 +186,32 @@ def test_crs_equality():
     assert b == c
 
 
+def test_to_crs_reuses_reprojections():
+    box = geometry.box(148, -36, 149, -35, crs=geometry.CRS('EPSG:4326'))
+    albers = geometry.CRS('EPSG:3577')
+    projected = box.to_crs(albers)
+    assert box.to_crs(albers) is projected
+    assert box.to_crs(geometry.CRS('EPSG:3577')) is projected
+    assert box.to_crs(albers, resolution=0.5) is not projected
+    assert box.to_crs(box.crs) is box
+
+    other = geometry.box(148, -36, 149, -35, crs=geometry.CRS('EPSG:4326')).to_crs(albers)
+    assert other is not projected
+    assert other == projected
+
+    unpickled = pickle.loads(pickle.dumps(box, pickle.HIGHEST_PROTOCOL))
+    assert unpickled.to_crs(albers) == projected
+
+    # transformations are made once per thread
+    transform = geometry._coordinate_transformation(box.crs, albers)  # pylint: disable=protected-access
+    assert geometry._coordinate_transformation(box.crs, albers) is transform  # pylint: disable=protected-access
+    others = []
+    thread = threading.Thread(target=lambda: others.append(geometry._coordinate_transformation(box.crs, albers)))
+    thread.start()
+    thread.join()
+    assert others[0] is not transform
+
+
 def test_geobox():
     points_list = [
         [(148.2697, -35.20111), (149.31254, -35.20111), (149.31254, -36.331431), (148.2697, -36.331431)],